@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the video pipeline.
+
+Generates synthetic inputs (test-pattern backgrounds, sine voice tracks,
+fake stories and captions) and times the pipeline stages against them.
+Nothing talks to the network: caption generation runs with a local
+aligner instead of ElevenLabs.
+
+Usage: python benchmarks/run_benchmarks.py [--stages compose,captions] [--words 40,120,240] [--repeat 3] [--output results.json]
+       python benchmarks/run_benchmarks.py --compare base.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(benchmarks_dir)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+from synthetic_media import prepare_case, align_words
+
+STAGES = ['subtitles_filter', 'ass_captions', 'sprite_captions', 'media_info', 'captions', 'render_image', 'compose', 'compose_stacked', 'compose_proxy', 'compose_draft', 'compose_segments']
+DEFAULT_WORD_COUNTS = [40, 120, 240]
+DEFAULT_MEDIA_DIR = os.path.join(benchmarks_dir, ".media")
+DEFAULT_RESULTS_DIR = os.path.join(benchmarks_dir, "results")
+
+# Stdout marker of the result line printed by a child run
+RESULT_MARKER = "BENCHMARK_RESULT "
+
+# The caption builders take milliseconds, so time them in a loop
+SUBTITLE_FILTER_ITERATIONS = 50
+
+def get_peak_rss():
+    """
+    Peak resident memory of this process and of its finished child
+    processes (FFmpeg, Chromium).
+
+    Returns:
+        dict: {'python': bytes, 'children': bytes}; values are None where
+              the platform does not report them.
+    """
+    try:
+        import resource
+    except ImportError:
+        return {'python': _get_windows_peak_working_set(), 'children': None}
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        'python': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    }
+
+def _get_windows_peak_working_set():
+    """Peak working set of this process on Windows, or None."""
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return int(counters.PeakWorkingSetSize)
+    except (OSError, AttributeError):
+        pass
+    return None
+
+def count_video_frames(ffprobe_path, video_path):
+    """Count the frames of the first video stream, or None on error."""
+    try:
+        result = subprocess.run([
+            ffprobe_path, "-v", "error", "-select_streams", "v:0", "-count_packets",
+            "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", video_path
+        ], capture_output=True, text=True, check=True)
+        return int(result.stdout.strip())
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return None
+
+def _remove_files(*paths):
+    """Delete benchmark outputs and cache entries, ignoring missing files."""
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+class LocalAligner:
+    """
+    Stand-in for the ElevenLabs client used by generate_captions. Returns
+    evenly spaced word timings instead of calling the forced alignment API.
+    """
+
+    duration = None
+
+    def __init__(self, api_key=None):
+        self.forced_alignment = self
+
+    def create(self, file, text):
+        # Read the upload like the real client does
+        file.read()
+        words = align_words(text, LocalAligner.duration)
+        return SimpleNamespace(words=[
+            SimpleNamespace(text=word['word'], start=word['start'], end=word['end']) for word in words
+        ])
+
+# --- Stages (run inside a child process) ----------------------------------
+
+def bench_subtitles_filter(case, workdir):
+    from compose_video import create_animated_subtitles_filter
+
+    start = time.perf_counter()
+    for _ in range(SUBTITLE_FILTER_ITERATIONS):
+        filter_string = create_animated_subtitles_filter(case['captions'], 0.0)
+    wall = (time.perf_counter() - start) / SUBTITLE_FILTER_ITERATIONS
+    return {'wall_seconds': wall, 'iterations': SUBTITLE_FILTER_ITERATIONS,
+            'filters': filter_string.count("drawtext=")}
+
+def bench_ass_captions(case, workdir):
+    from ass_captions import write_ass_captions
+
+    ass_path = os.path.join(workdir, "captions.ass")
+    start = time.perf_counter()
+    for _ in range(SUBTITLE_FILTER_ITERATIONS):
+        events = write_ass_captions(case['captions'], ass_path, 0.0)
+    wall = (time.perf_counter() - start) / SUBTITLE_FILTER_ITERATIONS
+    return {'wall_seconds': wall, 'iterations': SUBTITLE_FILTER_ITERATIONS, 'events': events}
+
+def bench_sprite_captions(case, workdir):
+    from caption_sprites import write_sprite_captions
+
+    # The first call rasterizes the sprites, the others reuse the cached PNGs
+    sprites_path = os.path.join(workdir, "captions.sprites.txt")
+    start = time.perf_counter()
+    write_sprite_captions(case['captions'], sprites_path, 0.0)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(SUBTITLE_FILTER_ITERATIONS):
+        captions = write_sprite_captions(case['captions'], sprites_path, 0.0)
+    wall = (time.perf_counter() - start) / SUBTITLE_FILTER_ITERATIONS
+    return {'wall_seconds': wall, 'first_seconds': first, 'iterations': SUBTITLE_FILTER_ITERATIONS, 'captions': captions}
+
+def bench_media_info(case, workdir):
+    from media_info import read_header_info
+
+    # Header parsing only: get_media_info would answer from its cache
+    start = time.perf_counter()
+    for _ in range(SUBTITLE_FILTER_ITERATIONS):
+        info = read_header_info(case['voice'])
+    wall = (time.perf_counter() - start) / SUBTITLE_FILTER_ITERATIONS
+    return {'wall_seconds': wall, 'iterations': SUBTITLE_FILTER_ITERATIONS,
+            'ok': bool(info and abs(info['duration'] - case['duration']) < 0.1)}
+
+def bench_captions(case, workdir):
+    import generate_captions
+    from cache_manager import get_story_cache_key, get_cache_paths
+
+    with open(case['story_path'], 'r', encoding='utf-8') as f:
+        story_data = json.load(f)
+
+    generate_captions.create_alignment_client = LocalAligner
+    LocalAligner.duration = case['duration']
+    os.environ.setdefault("ELEVENLABS_API_KEY", "offline-benchmark")
+
+    # Unique voice name, because the SRT is named after it in captions/
+    voice_path = os.path.join(workdir, f"benchmark_{case['name']}_{os.getpid()}.mp3")
+    shutil.copy2(case['voice'], voice_path)
+    cache_path = get_cache_paths(project_root, get_story_cache_key(story_data), "captions")
+    _remove_files(cache_path)
+
+    start = time.perf_counter()
+    captions = generate_captions.generate_captions(story_data, voice_path, words_per_chunk=2)
+    wall = time.perf_counter() - start
+    srt_path = captions.path if captions else None
+
+    _remove_files(srt_path, cache_path)
+    return {'wall_seconds': wall, 'ok': srt_path is not None}
+
+def bench_render_image(case, workdir):
+    from render_post_image import render_post_image
+    from cache_manager import get_story_cache_key, get_cache_paths
+
+    with open(case['story_path'], 'r', encoding='utf-8') as f:
+        story_data = json.load(f)
+
+    cache_path = get_cache_paths(project_root, get_story_cache_key(story_data), "image")
+    _remove_files(cache_path)
+
+    start = time.perf_counter()
+    image_path = render_post_image(story_data, job_id=f"benchmark_{case['name']}_{os.getpid()}")
+    wall = time.perf_counter() - start
+
+    _remove_files(image_path, cache_path)
+    return {'wall_seconds': wall, 'ok': image_path is not None}
+
+def _bench_compose(case, workdir, stacked, use_proxies=False, profile='final', segments=1):
+    from compose_video import compose_final_video, find_ffmpeg_path
+    from background_proxy import get_background_proxy, FULL_FRAME
+    from tracing import enable_tracing, finalize_trace
+
+    with open(case['story_path'], 'r', encoding='utf-8') as f:
+        story_data = json.load(f)
+
+    # Proxies are made once per background and kept in the media cache, so
+    # build a missing one before the clock starts
+    if use_proxies:
+        get_background_proxy(find_ffmpeg_path()[0], case['background'], *FULL_FRAME)
+
+    output_path = os.path.join(workdir, f"compose_{case['name']}.mp4")
+    trace_path = os.path.join(workdir, "trace.json")
+    enable_tracing(trace_path)
+
+    start = time.perf_counter()
+    success = compose_final_video(
+        case['background'], case['image'], case['voice'], case['voice'], case['captions'],
+        output_path, 3.0, story_data, case['background_2'] if stacked else None,
+        use_proxies=use_proxies, profile=profile, segments=segments
+    )
+    wall = time.perf_counter() - start
+    finalize_trace(trace_path)
+
+    # The compose command encodes the whole video, so fps = frames / time
+    _, ffprobe_path = find_ffmpeg_path()
+    frames = count_video_frames(ffprobe_path, output_path) if success else None
+    events = []
+    if os.path.exists(trace_path):
+        with open(trace_path, 'r', encoding='utf-8') as f:
+            events = json.load(f)['traceEvents']
+    ffmpeg_runs = []
+    for event in events:
+        if event.get('cat') == 'ffmpeg' and event.get('ph') == 'X':
+            seconds = event['dur'] / 1_000_000
+            ffmpeg_runs.append({
+                'name': event['name'],
+                'seconds': seconds,
+                'fps': round(frames / seconds, 2) if frames and seconds and event['name'] == 'ffmpeg compose' else None
+            })
+
+    _remove_files(output_path, trace_path)
+    return {'wall_seconds': wall, 'ok': success, 'frames': frames, 'ffmpeg': ffmpeg_runs}
+
+def bench_compose(case, workdir):
+    return _bench_compose(case, workdir, stacked=False)
+
+def bench_compose_stacked(case, workdir):
+    return _bench_compose(case, workdir, stacked=True)
+
+def bench_compose_proxy(case, workdir):
+    return _bench_compose(case, workdir, stacked=False, use_proxies=True)
+
+def bench_compose_draft(case, workdir):
+    return _bench_compose(case, workdir, stacked=False, profile='draft')
+
+def bench_compose_segments(case, workdir):
+    return _bench_compose(case, workdir, stacked=False, segments=4)
+
+STAGE_FUNCTIONS = {
+    'subtitles_filter': bench_subtitles_filter,
+    'ass_captions': bench_ass_captions,
+    'sprite_captions': bench_sprite_captions,
+    'media_info': bench_media_info,
+    'captions': bench_captions,
+    'render_image': bench_render_image,
+    'compose': bench_compose,
+    'compose_stacked': bench_compose_stacked,
+    'compose_proxy': bench_compose_proxy,
+    'compose_draft': bench_compose_draft,
+    'compose_segments': bench_compose_segments,
+}
+
+def run_child(spec):
+    """
+    Run one stage once and print its measurements. Each run gets a fresh
+    process, so imports are cold and peak RSS belongs to this stage only.
+    """
+    workdir = tempfile.mkdtemp(prefix="reels-benchmark-")
+    try:
+        try:
+            result = STAGE_FUNCTIONS[spec['stage']](spec['case'], workdir)
+        except ImportError as e:
+            result = {'skipped': f"missing dependency: {e}"}
+        result['peak_rss'] = get_peak_rss()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+# --- Orchestration --------------------------------------------------------
+
+def run_stage(stage, case, timeout=900):
+    """
+    Run a stage in a child process.
+
+    Returns:
+        dict: The child's measurements, or {'error': ...} if it failed.
+    """
+    spec = json.dumps({'stage': stage, 'case': case})
+    try:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", spec],
+                                   capture_output=True, text=True, timeout=timeout, cwd=project_root)
+    except subprocess.TimeoutExpired:
+        return {'error': f"timed out after {timeout}s"}
+
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+
+    output_tail = (completed.stdout + completed.stderr).strip().splitlines()[-10:]
+    return {'error': f"exit code {completed.returncode}", 'output_tail': output_tail}
+
+def summarize_runs(stage, case, runs):
+    """Aggregate the repeated runs of one stage/case."""
+    summary = {'stage': stage, 'case': case['name'], 'word_count': case['word_count'],
+               'audio_seconds': case['duration'], 'runs': runs}
+
+    measured = [run for run in runs if 'wall_seconds' in run]
+    if not measured:
+        first = runs[0] if runs else {}
+        summary['status'] = 'skipped' if 'skipped' in first else 'error'
+        summary['reason'] = first.get('skipped') or first.get('error')
+        return summary
+
+    walls = [run['wall_seconds'] for run in measured]
+    summary['status'] = 'ok' if all(run.get('ok', True) for run in measured) else 'failed'
+    summary['wall_seconds'] = {'median': statistics.median(walls), 'min': min(walls), 'max': max(walls)}
+
+    peaks = [run['peak_rss'] for run in measured]
+    summary['peak_rss_bytes'] = {
+        key: max((peak[key] for peak in peaks if peak.get(key) is not None), default=None)
+        for key in ('python', 'children')
+    }
+
+    # Median fps per FFmpeg command, in command order
+    ffmpeg_names = []
+    for run in measured:
+        for ffmpeg_run in run.get('ffmpeg', []):
+            if ffmpeg_run['name'] not in ffmpeg_names:
+                ffmpeg_names.append(ffmpeg_run['name'])
+    if ffmpeg_names:
+        summary['ffmpeg'] = []
+        for name in ffmpeg_names:
+            matching = [r for run in measured for r in run.get('ffmpeg', []) if r['name'] == name]
+            fps_values = [r['fps'] for r in matching if r['fps'] is not None]
+            summary['ffmpeg'].append({
+                'name': name,
+                'seconds': statistics.median(r['seconds'] for r in matching),
+                'fps': statistics.median(fps_values) if fps_values else None
+            })
+    return summary
+
+def get_environment(ffmpeg_path):
+    """Describe the machine and code version the benchmarks ran on."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True, cwd=project_root).stdout.strip()
+        except (subprocess.CalledProcessError, OSError):
+            return None
+
+    try:
+        ffmpeg_version = subprocess.run([ffmpeg_path, "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg_version = None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        'commit': git("rev-parse", "--short", "HEAD"),
+        'dirty': bool(status) if status is not None else None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg_version
+    }
+
+def print_summary(results):
+    """Print one line per stage/case."""
+    print(f"\n{'stage':<18} {'case':<7} {'status':<8} {'median s':>9} {'peak RSS py/child MB':>21}  ffmpeg fps")
+    for result in results:
+        line = f"{result['stage']:<18} {result['case']:<7} {result['status']:<8}"
+        if 'wall_seconds' in result:
+            peak = result['peak_rss_bytes']
+            memory = "/".join(f"{peak[key] / 1e6:.0f}" if peak[key] is not None else "-" for key in ('python', 'children'))
+            fps = ", ".join(f"{f['fps']:.1f}" for f in result.get('ffmpeg', []) if f['fps'] is not None)
+            line += f" {result['wall_seconds']['median']:>9.3f} {memory:>21}  {fps}"
+        else:
+            line += f" {result.get('reason') or ''}"
+        print(line)
+
+def compare_reports(base_path, new_path):
+    """Print the median wall time and fps change of each stage/case between two reports."""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    base_results = {(r['stage'], r['case']): r for r in base['results']}
+    print(f"Base: {base['environment'].get('commit')}   New: {new['environment'].get('commit')}")
+    print(f"\n{'stage':<18} {'case':<7} {'base s':>9} {'new s':>9} {'change':>8}  ffmpeg fps base -> new")
+
+    for result in new['results']:
+        base_result = base_results.get((result['stage'], result['case']))
+        if not base_result or 'wall_seconds' not in result or 'wall_seconds' not in base_result:
+            continue
+        before = base_result['wall_seconds']['median']
+        after = result['wall_seconds']['median']
+        change = (after - before) / before * 100 if before else 0.0
+        fps = "  ".join(
+            f"{b['fps'] or 0:.1f} -> {n['fps'] or 0:.1f}"
+            for b, n in zip(base_result.get('ffmpeg', []), result.get('ffmpeg', []))
+        )
+        print(f"{result['stage']:<18} {result['case']:<7} {before:>9.3f} {after:>9.3f} {change:>+7.1f}%  {fps}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline pipeline benchmarks")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Comma-separated stages to run (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--words", default=",".join(str(n) for n in DEFAULT_WORD_COUNTS),
+                        help="Comma-separated story lengths in words (default: 40,120,240)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage and story length (default: 3)")
+    parser.add_argument("--media-dir", default=DEFAULT_MEDIA_DIR, help="Where to keep the generated inputs")
+    parser.add_argument("--output", help="Report path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two reports and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+    if args.compare:
+        compare_reports(*args.compare)
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    word_counts = [int(n) for n in args.words.split(",") if n.strip()]
+
+    from compose_video import find_ffmpeg_path
+    ffmpeg_path, ffprobe_path = find_ffmpeg_path()
+    if not ffmpeg_path:
+        print("❌ FFmpeg not found. Please install FFmpeg.")
+        sys.exit(1)
+
+    print("🎞️  Preparing synthetic media...")
+    cases = [prepare_case(ffmpeg_path, args.media_dir, word_count) for word_count in word_counts]
+
+    results = []
+    for stage in stages:
+        for case in cases:
+            print(f"⏱️  {stage} ({case['name']}, {case['duration']:.1f}s audio)")
+            runs = [run_stage(stage, case) for _ in range(args.repeat)]
+            results.append(summarize_runs(stage, case, runs))
+
+    environment = get_environment(ffmpeg_path)
+    report = {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'environment': environment,
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs(DEFAULT_RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(DEFAULT_RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{environment['commit'] or 'nogit'}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+
+    print_summary(results)
+    print(f"\n📄 Report saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
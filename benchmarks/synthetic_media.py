@@ -0,0 +1,184 @@
+import os
+import json
+import random
+import subprocess
+
+# Words used to build fake stories. Only the word count and length
+# distribution matter for the benchmarks, not the meaning.
+_WORDS = (
+    "i my me we the a an and but so then when after before because never always "
+    "friend sister brother roommate boss neighbor teacher mom dad wife husband girlfriend "
+    "boyfriend wedding party apartment office car dog cat money rent birthday dinner "
+    "told asked found said laughed yelled refused decided noticed realized texted "
+    "cancelled moved bought stole broke promised ignored forgot remembered left "
+    "really completely suddenly quietly finally honestly literally basically"
+).split()
+
+# Typical narration speed of the TTS voices
+WORDS_PER_SECOND = 2.6
+
+def _run_ffmpeg(ffmpeg_path, args):
+    """Run FFmpeg quietly, raising CalledProcessError with its stderr on failure."""
+    subprocess.run([ffmpeg_path, "-y", "-hide_banner", "-loglevel", "error", *args],
+                   capture_output=True, text=True, check=True)
+
+def make_background_clip(ffmpeg_path, output_path, seconds, size="1920x1080", rate=30):
+    """
+    Generates a landscape test-pattern clip standing in for Minecraft footage.
+
+    Args:
+        ffmpeg_path (str): FFmpeg executable.
+        output_path (str): Path of the MP4 to write.
+        seconds (float): Clip length.
+        size (str): Frame size (WxH).
+        rate (int): Frame rate.
+
+    Returns:
+        str: output_path.
+    """
+    if not os.path.exists(output_path):
+        _run_ffmpeg(ffmpeg_path, [
+            "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={rate}:duration={seconds}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-g", str(rate * 2),
+            "-pix_fmt", "yuv420p", output_path
+        ])
+    return output_path
+
+def make_voice_track(ffmpeg_path, output_path, seconds):
+    """
+    Generates an MP3 tone standing in for the voiceover.
+
+    Returns:
+        str: output_path.
+    """
+    if not os.path.exists(output_path):
+        _run_ffmpeg(ffmpeg_path, [
+            "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+            "-c:a", "libmp3lame", "-b:a", "128k", output_path
+        ])
+    return output_path
+
+def make_post_image(ffmpeg_path, output_path, size="1000x640"):
+    """
+    Generates a flat PNG standing in for the rendered Reddit post, so the
+    compose benchmark does not depend on Playwright.
+
+    Returns:
+        str: output_path.
+    """
+    if not os.path.exists(output_path):
+        _run_ffmpeg(ffmpeg_path, [
+            "-f", "lavfi", "-i", f"color=c=white:s={size}", "-frames:v", "1", output_path
+        ])
+    return output_path
+
+def make_story(word_count, seed=0, title_words=10):
+    """
+    Builds a fake story with the fields the pipeline expects.
+
+    Args:
+        word_count (int): Number of words in the story body.
+        seed (int): Seed for the word choice, so runs are reproducible.
+        title_words (int): Number of words in the title.
+
+    Returns:
+        dict: Story data (title, story, subreddit, username, upvotes).
+    """
+    rng = random.Random(f"{word_count}-{seed}")
+    title = " ".join(rng.choice(_WORDS) for _ in range(title_words)).capitalize() + "?"
+    sentences = []
+    remaining = word_count
+    while remaining > 0:
+        length = min(remaining, rng.randint(6, 16))
+        sentences.append(" ".join(rng.choice(_WORDS) for _ in range(length)).capitalize() + ".")
+        remaining -= length
+
+    return {
+        "title": f"AITA: {title}",
+        "story": " ".join(sentences),
+        "subreddit": "AmItheAsshole",
+        "username": f"benchmark_user_{seed}",
+        "upvotes": 1000 + word_count
+    }
+
+def story_duration(story_data):
+    """Narration length of a story at WORDS_PER_SECOND."""
+    words = len(f"{story_data['title']}. {story_data['story']}".split())
+    return round(words / WORDS_PER_SECOND, 2)
+
+def align_words(text, duration):
+    """
+    Spreads the words of a text evenly over the audio, like a forced
+    alignment of steady narration would.
+
+    Returns:
+        list: Dicts with 'word', 'start' and 'end' in seconds.
+    """
+    words = text.split()
+    slot = duration / max(1, len(words))
+    return [
+        {'word': word, 'start': round(i * slot, 3), 'end': round(i * slot + slot * 0.9, 3)}
+        for i, word in enumerate(words)
+    ]
+
+def _srt_time(seconds):
+    """Format seconds as HH:MM:SS,mmm."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+def make_captions(story_data, duration, output_path, words_per_chunk=2):
+    """
+    Writes an SRT file in the format generate_captions produces.
+
+    Returns:
+        str: output_path.
+    """
+    words = align_words(f"{story_data['title']}. {story_data['story']}", duration)
+    blocks = []
+    for index, first in enumerate(range(0, len(words), words_per_chunk)):
+        chunk = words[first:first + words_per_chunk]
+        blocks.append(f"{index + 1}\n{_srt_time(chunk[0]['start'])} --> {_srt_time(chunk[-1]['end'])}\n"
+                      f"{' '.join(w['word'] for w in chunk)}\n")
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(blocks))
+    return output_path
+
+def prepare_case(ffmpeg_path, media_dir, word_count, words_per_chunk=2):
+    """
+    Creates (or reuses) all inputs of one benchmark case.
+
+    Args:
+        ffmpeg_path (str): FFmpeg executable.
+        media_dir (str): Directory holding the generated media.
+        word_count (int): Story length in words.
+        words_per_chunk (int): Caption chunk size.
+
+    Returns:
+        dict: Paths and metadata of the case inputs.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    story_data = make_story(word_count)
+    duration = story_duration(story_data)
+    name = f"{word_count}w"
+
+    story_path = os.path.join(media_dir, f"story_{name}.json")
+    with open(story_path, 'w', encoding='utf-8') as f:
+        json.dump(story_data, f, indent=4)
+
+    # Backgrounds are a bit longer than the audio, like real footage
+    background_seconds = int(duration) + 5
+    return {
+        'name': name,
+        'word_count': word_count,
+        'duration': duration,
+        'story_path': story_path,
+        'background': make_background_clip(ffmpeg_path, os.path.join(media_dir, f"background_{background_seconds}s.mp4"), background_seconds),
+        'background_2': make_background_clip(ffmpeg_path, os.path.join(media_dir, f"background_{background_seconds}s_b.mp4"), background_seconds, size="1280x720"),
+        'voice': make_voice_track(ffmpeg_path, os.path.join(media_dir, f"voice_{name}.mp3"), duration),
+        'image': make_post_image(ffmpeg_path, os.path.join(media_dir, "post.png")),
+        'captions': make_captions(story_data, duration, os.path.join(media_dir, f"captions_{name}.srt"), words_per_chunk)
+    }
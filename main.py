@@ -3,7 +3,11 @@
 Minecraft Reddit Story Reels Generator - Main Pipeline
 Automated pipeline that generates Reddit story videos with Minecraft parkour footage.
 
-Usage: python main.py --count <number_of_videos> --background <background_video_filename> [--background2 <second_background_video_filename>]
+Usage: python main.py --count <number_of_videos> --background <background_video_filename> [--background2 <second_background_video_filename>] [--jobs <n>] [--encode-workers <n>]
+       python main.py queue --count <number_of_videos> --background <background_video_filename>
+       python main.py worker [--exit-when-empty]
+       python main.py serve [--port <port> | --socket <path>]
+       python main.py prepare-backgrounds [--prune]
 """
 
 import argparse
@@ -17,14 +21,33 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.join(script_dir, "src")
 sys.path.insert(0, src_dir)
 
-# Import pipeline modules
+# Import pipeline modules. These only load the standard library; SDKs such as
+# elevenlabs and playwright are imported by the step that uses them.
 try:
     from generate_story import generate_story
     from save_story_to_database import save_story_to_database, get_latest_story_file
-    from render_post_image import render_post_image
+    from render_post_image import render_post_image, start_warm_browser, stop_warm_browser, load_post_template
     from generate_voiceover import generate_voiceover
     from generate_captions import generate_captions
     from compose_video import compose_final_video, get_audio_duration
+    from toolchain import get_toolchain, find_ffmpeg_path, CAPTION_ENGINES
+    from render_profiles import RENDER_PROFILES, DEFAULT_PROFILE, get_render_profile
+    from export_variants import EXPORT_VARIANTS, parse_variant_names
+    from batch_scheduler import PipelineStage, run_staged_batch
+    from resource_governor import PARALLELISM_ENV
+    from step_graph import PipelineStep, run_step_graph
+    from cache_manager import generate_job_id
+    from background_proxy import prepare_background_proxies, remove_stale_proxies, list_background_videos, PROXY_FPS
+    from background_index import load_background_index, next_background_file, ROTATE_BACKGROUNDS
+    from media_info import get_media_info
+    from ffmpeg_runner import progress_printer
+    from scratch_workspace import remove_stale_workspaces
+    from environment import load_environment
+    from tracing import enable_tracing, finalize_trace, set_trace_context, trace_span
+    from job_queue import (DEFAULT_QUEUE_DB, default_worker_id, enqueue_jobs, claim_job, heartbeat,
+                           set_job_manifest, complete_job, fail_job, get_queue_stats)
+    from job_manifest import (create_manifest, compute_input_hash, get_completed_output, record_step,
+                              set_manifest_status, find_unfinished_manifests, job_from_manifest)
 except ImportError as e:
     print(f"Error importing pipeline modules: {e}")
     print("Please ensure all required modules are in the 'src/' directory.")
@@ -73,10 +96,12 @@ def validate_background_video(background_filename):
     Validate that the specified background video exists.
     
     Args:
-        background_filename (str): Name of the background video file.
+        background_filename (str): Name of the background video file, or
+                                   'rotate' to use every file in turn.
     
     Returns:
-        str: Full path to the background video, or None if not found.
+        str: Full path to the background video ('rotate' is returned as is),
+             or None if not found.
     """
     background_dir = "background"
     
@@ -85,6 +110,12 @@ def validate_background_video(background_filename):
         print("Please create the directory and add Minecraft parkour videos.")
         return None
     
+    if background_filename == ROTATE_BACKGROUNDS:
+        if not list_background_videos(background_dir):
+            print(f"❌ No video files found in '{background_dir}' directory to rotate through.")
+            return None
+        return ROTATE_BACKGROUNDS
+    
     background_path = os.path.join(background_dir, background_filename)
     
     if not os.path.exists(background_path):
@@ -103,6 +134,14 @@ def validate_background_video(background_filename):
         
         return None
     
+    # Read from the container headers, without starting ffprobe
+    info = get_media_info(background_path)
+    if info is None or not info.get('duration'):
+        print(f"❌ Background video '{background_filename}' could not be read.")
+        return None
+    if info.get('width'):
+        print(f"🎞️  Background: {background_filename} ({info['width']}x{info['height']}, {info['duration']:.0f}s, {info['codec']})")
+    
     return background_path
 
 def run_pipeline_step(step_name, step_function, *args, **kwargs):
@@ -121,51 +160,105 @@ def run_pipeline_step(step_name, step_function, *args, **kwargs):
     print(f"\n🔄 Starting: {step_name}")
     start_time = time.time()
     
-    try:
-        result = step_function(*args, **kwargs)
-        elapsed = time.time() - start_time
-        
-        if result is not None:
-            print(f"✅ Completed: {step_name} ({elapsed:.2f}s)")
-            return result
-        else:
-            print(f"❌ Failed: {step_name} - Function returned None")
-            return None
+    with trace_span(step_name, "step") as span:
+        try:
+            result = step_function(*args, **kwargs)
+            elapsed = time.time() - start_time
             
-    except Exception as e:
-        elapsed = time.time() - start_time
-        print(f"❌ Failed: {step_name} ({elapsed:.2f}s)")
-        print(f"   Error: {str(e)}")
-        return None
+            if result is not None:
+                print(f"✅ Completed: {step_name} ({elapsed:.2f}s)")
+                span['status'] = 'ok'
+                return result
+            else:
+                print(f"❌ Failed: {step_name} - Function returned None")
+                span['status'] = 'failed'
+                return None
+                
+        except Exception as e:
+            elapsed = time.time() - start_time
+            print(f"❌ Failed: {step_name} ({elapsed:.2f}s)")
+            print(f"   Error: {str(e)}")
+            span['status'] = 'error'
+            span['error'] = str(e)
+            return None
 
-def generate_single_video(background_video_path, video_number, total_videos, background_video_path_2=None):
+def create_video_job(video_number, total_videos, background_video_path, background_video_path_2=None, words_per_chunk=2, story_data=None, karaoke=False, profile=DEFAULT_PROFILE, segments=1, caption_engine=None, variants=None):
     """
-    Generate a single video through the complete pipeline.
+    Create the job dict that is passed between the pipeline stages of one video.
     
     Args:
-        background_video_path (str): Path to the first background video.
         video_number (int): Current video number (for display).
         total_videos (int): Total number of videos being generated.
-        background_video_path_2 (str): Optional path to the second background video.
+        background_video_path (str): Path to the first background video, or
+                                     'rotate' for the least used one.
+        background_video_path_2 (str): Optional path to the second background video
+                                       (or 'rotate').
+        words_per_chunk (int): Number of words per caption chunk.
+        story_data (dict): Optional story to use instead of generating one.
+        karaoke (bool): Highlight each caption word while it is spoken.
+        profile (str): Render profile: 'draft', 'final' or 'hq'.
+        segments (int): Number of segments encoded in parallel.
+        caption_engine (str): 'ass', 'drawtext' or 'sprites' (default: the
+                              best one the FFmpeg build supports).
+        variants (list): Export variant names, encoded from one composition.
     
     Returns:
-        bool: True if successful, False otherwise.
+        dict: The job dict.
     """
-    print(f"\n{'='*60}")
-    print(f"🎬 GENERATING VIDEO {video_number}/{total_videos}")
-    print(f"{'='*60}")
+    # Rotation is resolved here, so the manifest records the actual file
+    if background_video_path == ROTATE_BACKGROUNDS:
+        background_video_path = next_background_file()
+    if background_video_path_2 == ROTATE_BACKGROUNDS:
+        background_video_path_2 = next_background_file(exclude=background_video_path)
     
-    pipeline_start = time.time()
+    job = {
+        'video_number': video_number,
+        'total_videos': total_videos,
+        'background_video_path': background_video_path,
+        'background_video_path_2': background_video_path_2,
+        'words_per_chunk': words_per_chunk,
+        'karaoke': karaoke,
+        'profile': profile,
+        'segments': segments,
+        'caption_engine': caption_engine,
+        'variants': variants
+    }
+    if story_data:
+        job['story_data'] = story_data
+    return job
+
+def story_stage(job):
+    """
+    Steps 0-2: generate the story, check and update the idea database.
     
-    # Step 1: Generate Story
-    story_data = run_pipeline_step(
-        "Step 1: Generate Story",
-        generate_story
-    )
-    if not story_data:
-        return False
+    Args:
+        job (dict): Job dict created by create_video_job.
+    
+    Returns:
+        dict: The job with 'story_data', 'job_id' and 'story_file_path', or None if failed.
+    """
+    set_trace_context(video=job['video_number'])
+    # The total time reported at the end starts here, not while the job waits
+    job['started_at'] = time.time()
     
-    print(f"📖 Generated story: '{story_data.get('title', 'Unknown Title')}'")
+    if job.get('manifest_path'):
+        print(f"⏭️  Resuming job {job['job_id']}: '{job['story_data'].get('title', 'Unknown Title')}'")
+        return job
+    
+    if job.get('story_data'):
+        # Story was supplied with the job (e.g. queued from a story file)
+        story_data = job['story_data']
+        print(f"📖 Using provided story: '{story_data.get('title', 'Unknown Title')}'")
+    else:
+        # Step 1: Generate Story
+        story_data = run_pipeline_step(
+            "Step 1: Generate Story",
+            generate_story
+        )
+        if not story_data:
+            return None
+        
+        print(f"📖 Generated story: '{story_data.get('title', 'Unknown Title')}'")
     
     # Step 0: Check Idea Database (after generating story)
     is_duplicate = run_pipeline_step(
@@ -178,14 +271,16 @@ def generate_single_video(background_video_path, video_number, total_videos, bac
         print("⚠️  Duplicate idea detected. Consider regenerating with different parameters.")
         # For now, continue anyway. In future, could regenerate automatically.
     
+    # One ID per video names every artifact, so parallel jobs never collide
+    job_id = generate_job_id(story_data)
+    
     # Step 2: Save Story to Database
     # First save the story to a file
-    timestamp = int(time.time())
     stories_dir = "stories"
     if not os.path.exists(stories_dir):
-        os.makedirs(stories_dir)
+        os.makedirs(stories_dir, exist_ok=True)
     
-    story_file_path = os.path.join(stories_dir, f"{timestamp}.json")
+    story_file_path = os.path.join(stories_dir, f"{job_id}.json")
     with open(story_file_path, 'w', encoding='utf-8') as f:
         import json
         json.dump(story_data, f, indent=4)
@@ -199,85 +294,793 @@ def generate_single_video(background_video_path, video_number, total_videos, bac
     if database_result is None:
         print("⚠️  Warning: Failed to save to idea database, but continuing...")
     
-    # Step 3: Render Opening Reddit Post Image
-    image_path = run_pipeline_step(
-        "Step 3: Render Opening Reddit Post Image",
-        render_post_image,
-        story_data
-    )
-    if not image_path:
-        return False
+    job['story_data'] = story_data
+    job['job_id'] = job_id
+    job['story_file_path'] = story_file_path
     
-    # Step 4: Generate Voiceover (title, story, and combined)
-    voiceover_paths = run_pipeline_step(
-        "Step 4: Generate Voiceover",
-        generate_voiceover,
-        story_data
-    )
+    # Record the job so an interrupted run can continue with --resume
+    job['manifest_path'] = create_manifest(job)
+    record_step(job['manifest_path'], 'story', story_file_path, compute_input_hash(job, ['story_data']))
+    return job
+
+def resumable_step(step_key, step_function, input_keys):
+    """
+    Wrap a step so that it is skipped when the job manifest already records
+    its output for the same inputs, and recorded in the manifest when it succeeds.
+    
+    Args:
+        step_key (str): Short step identifier used in the manifest.
+        step_function (callable): Step function taking the job dict.
+        input_keys (list): Job keys whose values determine the step output.
+    
+    Returns:
+        callable: The wrapped step function.
+    """
+    def run(job):
+        manifest_path = job.get('manifest_path')
+        input_hash = compute_input_hash(job, input_keys)
+        
+        output = get_completed_output(manifest_path, step_key, input_hash)
+        if output is not None:
+            print(f"⏭️  Skipping {step_key}: already completed in a previous run")
+            return output
+        
+        output = step_function(job)
+        if output:
+            record_step(manifest_path, step_key, output, input_hash)
+        return output
+    
+    return run
+
+def render_image_step(job):
+    """Step 3: Render the opening Reddit post image."""
+    return render_post_image(job['story_data'], job['job_id'])
+
+def voiceover_step(job):
+    """Step 4: Generate the voiceover (title, story, and combined)."""
+    # The delivery AAC is encoded at the bitrate of the job's render profile
+    audio_bitrate = get_render_profile(job.get('profile', DEFAULT_PROFILE))['audio_bitrate']
+    voiceover_paths = generate_voiceover(job['story_data'], job['job_id'], audio_bitrate)
     if not voiceover_paths:
-        return False
+        return None
     
     print(f"🔊 Generated audio files:")
     print(f"   Title: {os.path.basename(voiceover_paths.get('title', 'Not found'))}")
     print(f"   Story: {os.path.basename(voiceover_paths.get('story', 'Not found'))}")
     print(f"   Combined: {os.path.basename(voiceover_paths.get('combined', 'Not found'))}")
-    
-    # Step 5: Generate Timed Captions
-    captions_path = run_pipeline_step(
-        "Step 5: Generate Timed Captions",
-        generate_captions,
-        story_data,
-        voiceover_paths['combined'],  # Use combined audio for caption timing
-        2  # words per chunk for engagement
+    if voiceover_paths.get('delivery'):
+        print(f"   Delivery (AAC): {os.path.basename(voiceover_paths['delivery'])}")
+    return voiceover_paths
+
+def captions_step(job):
+    """
+    Step 5: Generate timed captions from the combined voiceover. The
+    manifest records the SRT path; the parsed timeline travels with the job
+    (to the encode process too), so compose_final_video does not read the
+    file again. Resumed jobs only have the path and parse it once.
+    """
+    captions = generate_captions(
+        job['story_data'],
+        job['voiceover_paths']['combined'],  # Use combined audio for caption timing
+        job.get('words_per_chunk', 2)  # words per chunk for engagement
     )
-    if not captions_path:
-        return False
+    if not captions:
+        return None
+    job['caption_timeline'] = captions
+    return captions.path
+
+def compose_step(job):
+    """
+    Step 6: Compose the final video with FFmpeg.
     
-    # Step 6: Compose Final Video
+    Returns:
+        str: Path to the final video, or None if failed. With export
+             variants, a dict of {variant name: path}.
+    """
     exports_dir = "exports"
     if not os.path.exists(exports_dir):
-        os.makedirs(exports_dir)
+        os.makedirs(exports_dir, exist_ok=True)
     
-    output_filename = f"final_{timestamp}.mp4"
+    # Drafts and hero renders never overwrite the regular export
+    profile = job.get('profile', DEFAULT_PROFILE)
+    suffix = "" if profile == DEFAULT_PROFILE else f"_{profile}"
+    output_filename = f"final_{job['job_id']}{suffix}.mp4"
     output_path = os.path.join(exports_dir, output_filename)
     
-    video_success = run_pipeline_step(
-        "Step 6: Compose Final Video",
-        compose_final_video,
-        background_video_path,
-        image_path,
-        voiceover_paths['title'],
-        voiceover_paths['story'],
-        captions_path,
+    video_success = compose_final_video(
+        job['background_video_path'],
+        job['image_path'],
+        job['voiceover_paths']['title'],
+        job['voiceover_paths']['story'],
+        job.get('caption_timeline') or job['captions_path'],
         output_path,
         3.0,  # opening_duration
-        story_data,  # Add story_data parameter
-        background_video_path_2  # Add second background video parameter
+        job['story_data'],  # Add story_data parameter
+        job['background_video_path_2'],  # Add second background video parameter
+        karaoke=job.get('karaoke', False),
+        profile=profile,
+        segments=job.get('segments') or 1,
+        caption_engine=job.get('caption_engine'),
+        variants=job.get('variants'),
+        on_progress=progress_printer(f"Video {job['video_number']}/{job['total_videos']} "),
+        delivery_audio_path=job['voiceover_paths'].get('delivery')
     )
+    if isinstance(video_success, dict):
+        return video_success
+    return output_path if video_success else None
+
+# Everything that changes the encoded video
+COMPOSE_INPUT_KEYS = [
+    'story_data', 'image_path', 'voiceover_paths', 'captions_path',
+    'background_video_path', 'background_video_path_2', 'karaoke', 'profile', 'caption_engine', 'variants'
+]
+
+def build_video_steps(include_encode=True):
+    """
+    Build the step graph of one video after the story exists.
     
-    if video_success:
-        pipeline_elapsed = time.time() - pipeline_start
-        print(f"\n🎉 SUCCESS! Video {video_number}/{total_videos} completed!")
-        print(f"📁 Output: {output_path}")
-        print(f"⏱️  Total time: {pipeline_elapsed:.2f} seconds")
-        
-        # Get video duration for summary
+    The image render and the voiceover only need the story, so they run in
+    parallel; captions wait for the audio and the encode waits for everything.
+    New steps only need to declare what they require and provide.
+    
+    Args:
+        include_encode (bool): Include Step 6 (the batch scheduler runs it separately).
+    
+    Returns:
+        list: PipelineStep objects.
+    """
+    steps = [
+        PipelineStep("Step 3: Render Opening Reddit Post Image",
+                     resumable_step('image', render_image_step, ['story_data']),
+                     requires=['story_data'], provides='image_path'),
+        PipelineStep("Step 4: Generate Voiceover",
+                     resumable_step('voiceover', voiceover_step, ['story_data', 'profile']),
+                     requires=['story_data'], provides='voiceover_paths'),
+        PipelineStep("Step 5: Generate Timed Captions",
+                     resumable_step('captions', captions_step, ['story_data', 'voiceover_paths', 'words_per_chunk']),
+                     requires=['story_data', 'voiceover_paths'], provides='captions_path'),
+    ]
+    if include_encode:
+        steps.append(
+            PipelineStep("Step 6: Compose Final Video",
+                         resumable_step('compose', compose_step, COMPOSE_INPUT_KEYS),
+                         requires=['story_data', 'image_path', 'voiceover_paths', 'captions_path'],
+                         provides='output_path')
+        )
+    return steps
+
+def assets_stage(job):
+    """
+    Steps 3-5: render the post image, generate the voiceover and the timed captions.
+    These steps mostly wait on Chromium and the TTS/alignment APIs.
+    
+    Args:
+        job (dict): Job dict after story_stage.
+    
+    Returns:
+        dict: The job with 'image_path', 'voiceover_paths' and 'captions_path', or None if failed.
+    """
+    set_trace_context(video=job['video_number'])
+    return run_step_graph(build_video_steps(include_encode=False), job, run_pipeline_step)
+
+def encode_stage(job):
+    """
+    Step 6: compose the final video with FFmpeg.
+    Runs in a worker process when used by the batch scheduler, so it only
+    relies on the data stored in the job dict.
+    
+    Args:
+        job (dict): Job dict after assets_stage.
+    
+    Returns:
+        dict: The job with 'output_path', or None if failed.
+    """
+    set_trace_context(video=job['video_number'])
+    output_path = run_pipeline_step(
+        "Step 6: Compose Final Video",
+        resumable_step('compose', compose_step, COMPOSE_INPUT_KEYS),
+        job
+    )
+    if not output_path:
+        return None
+    
+    job['output_path'] = output_path
+    return job
+
+def report_video_result(job, success):
+    """
+    Print the per-video success/failure summary.
+    
+    Args:
+        job (dict): The job dict of the video.
+        success (bool): Whether the video was generated.
+    """
+    video_number = job['video_number']
+    total_videos = job['total_videos']
+    set_manifest_status(job.get('manifest_path'), 'completed' if success else 'failed')
+    
+    if not success:
+        print(f"❌ Failed to generate video {video_number}/{total_videos}")
+        return
+    
+    pipeline_elapsed = time.time() - job['started_at']
+    print(f"\n🎉 SUCCESS! Video {video_number}/{total_videos} completed!")
+    if isinstance(job['output_path'], dict):
+        for name, path in job['output_path'].items():
+            print(f"📁 Output ({name}): {path}")
+    else:
+        print(f"📁 Output: {job['output_path']}")
+    print(f"⏱️  Total time: {pipeline_elapsed:.2f} seconds")
+    
+    # Get video duration for summary
+    try:
+        duration = get_audio_duration(job['voiceover_paths']['combined'])
+        if duration:
+            print(f"🎬 Video duration: {duration:.2f} seconds")
+    except:
+        pass
+
+def generate_single_video(background_video_path, video_number, total_videos, background_video_path_2=None, words_per_chunk=2, karaoke=False, profile=DEFAULT_PROFILE, segments=1, caption_engine=None, variants=None):
+    """
+    Generate a single video through the complete pipeline.
+    
+    Args:
+        background_video_path (str): Path to the first background video.
+        video_number (int): Current video number (for display).
+        total_videos (int): Total number of videos being generated.
+        background_video_path_2 (str): Optional path to the second background video.
+        words_per_chunk (int): Number of words per caption chunk.
+        karaoke (bool): Highlight each caption word while it is spoken.
+        profile (str): Render profile: 'draft', 'final' or 'hq'.
+        segments (int): Number of segments encoded in parallel.
+        caption_engine (str): 'ass', 'drawtext' or 'sprites' (default: automatic).
+        variants (list): Export variant names (default: a single export).
+    
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    job = create_video_job(video_number, total_videos, background_video_path, background_video_path_2, words_per_chunk,
+                           karaoke=karaoke, profile=profile, segments=segments, caption_engine=caption_engine,
+                           variants=variants)
+    return run_single_video_job(job)
+
+def run_single_video_job(job, on_story_ready=None):
+    """
+    Run one job (new or resumed) through all steps in the current process.
+    
+    Args:
+        job (dict): Job dict from create_video_job or job_from_manifest.
+        on_story_ready (callable): Optional callback receiving the job once
+                                   its story and manifest exist.
+    
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    print(f"\n{'='*60}")
+    print(f"🎬 GENERATING VIDEO {job['video_number']}/{job['total_videos']}")
+    print(f"{'='*60}")
+    
+    if not story_stage(job):
+        report_video_result(job, False)
+        return False
+    
+    if on_story_ready:
+        on_story_ready(job)
+    
+    if not run_step_graph(build_video_steps(), job, run_pipeline_step):
+        report_video_result(job, False)
+        return False
+    
+    report_video_result(job, True)
+    return True
+
+def generate_video_batch(background_video_path, count, background_video_path_2=None, words_per_chunk=2, jobs=2, encode_workers=1, karaoke=False, profile=DEFAULT_PROFILE, segments=1, caption_engine=None, variants=None):
+    """
+    Generate several videos with the staged batch scheduler.
+    
+    Story generation runs in a single thread (it updates the idea database),
+    the network-bound steps run in a pool of `jobs` threads and the encodes
+    run in a pool of `encode_workers` processes, so the TTS of video N+1
+    overlaps the encode of video N.
+    
+    Args:
+        background_video_path (str): Path to the first background video.
+        count (int): Number of videos to generate.
+        background_video_path_2 (str): Optional path to the second background video.
+        words_per_chunk (int): Number of words per caption chunk.
+        jobs (int): Number of videos processed concurrently by the network-bound steps.
+        encode_workers (int): Number of concurrent FFmpeg encodes.
+        karaoke (bool): Highlight each caption word while it is spoken.
+        profile (str): Render profile: 'draft', 'final' or 'hq'.
+        segments (int): Number of segments each encode is split into.
+        caption_engine (str): 'ass', 'drawtext' or 'sprites' (default: automatic).
+        variants (list): Export variant names (default: a single export).
+    
+    Returns:
+        list: (video_number, success) tuples in video order.
+    """
+    video_jobs = [
+        create_video_job(video_num, count, background_video_path, background_video_path_2, words_per_chunk,
+                         karaoke=karaoke, profile=profile, segments=segments, caption_engine=caption_engine,
+                         variants=variants)
+        for video_num in range(1, count + 1)
+    ]
+    return run_video_jobs(video_jobs, jobs, encode_workers)
+
+def run_video_jobs(video_jobs, jobs=2, encode_workers=1):
+    """
+    Run prepared jobs (new or resumed) through the staged batch scheduler.
+    
+    Args:
+        video_jobs (list): Job dicts with unique video numbers.
+        jobs (int): Number of videos processed concurrently by the network-bound steps.
+        encode_workers (int): Number of concurrent FFmpeg encodes.
+    
+    Returns:
+        list: (video_number, success) tuples in video order.
+    """
+    # Every encode gets an equal share of the cores (see resource_governor)
+    os.environ[PARALLELISM_ENV] = str(encode_workers)
+    
+    stages = [
+        PipelineStage("story", story_stage, workers=1),
+        PipelineStage("assets", assets_stage, workers=jobs),
+        PipelineStage("encode", encode_stage, workers=encode_workers, use_processes=True)
+    ]
+    
+    def report(result):
+        job = result['job']
+        if not result['success'] and result['failed_stage']:
+            print(f"\n⚠️  Video {job['video_number']}/{job['total_videos']} failed in stage '{result['failed_stage']}'")
+        report_video_result(job, result['success'])
+    
+    # Each video is reported as soon as it is done, not after the whole batch
+    results = run_staged_batch(video_jobs, stages, queue_size=max(jobs, encode_workers), on_result=report)
+    
+    outcomes = []
+    for job in video_jobs:
+        result = results.get(job['video_number'])
+        if result is None:
+            # Never reached a result (the scheduler stopped early)
+            report_video_result(job, False)
+            outcomes.append((job['video_number'], False))
+        else:
+            outcomes.append((job['video_number'], result['success']))
+    
+    return outcomes
+
+def queue_command(argv):
+    """
+    `main.py queue`: add video jobs to the job queue (a SQLite database, or a
+    spool directory shared by several hosts).
+    
+    Args:
+        argv (list): Command line arguments after the subcommand.
+    """
+    import json
+    
+    parser = argparse.ArgumentParser(
+        prog="main.py queue",
+        description="Add video jobs to the shared job queue processed by `main.py worker`"
+    )
+    parser.add_argument("--count", type=int, default=1, help="Number of videos to queue (ignored with --story-file)")
+    parser.add_argument("--background", type=str, help="Filename of the background video from the 'background/' directory, or 'rotate' to use every file in turn")
+    parser.add_argument("--background2", type=str, help="Optional: Filename of the second background video")
+    parser.add_argument("--words-per-chunk", type=int, default=2, help="Number of words per caption chunk")
+    parser.add_argument("--karaoke", action="store_true", help="Highlight each caption word while it is spoken")
+    parser.add_argument("--profile", choices=list(RENDER_PROFILES), default=DEFAULT_PROFILE, help=f"Render profile (default: {DEFAULT_PROFILE})")
+    parser.add_argument("--segments", type=int, default=1, help="Number of keyframe-aligned segments each video is encoded in")
+    parser.add_argument("--caption-engine", choices=CAPTION_ENGINES, default=None, help="How captions are burned in (default: the best one available on the worker)")
+    parser.add_argument("--variants", type=str, default=None, metavar="NAMES", help=f"Comma-separated platform exports ({', '.join(EXPORT_VARIANTS)})")
+    parser.add_argument("--story-file", type=str, nargs="+", help="Optional: Story JSON file(s) to queue instead of generating stories")
+    parser.add_argument("--max-attempts", type=int, default=3, help="How often a job is retried before it is marked as failed")
+    parser.add_argument("--db", type=str, default=DEFAULT_QUEUE_DB, help=f"Queue database, or a directory (ending in '/') for a spool queue shared by several hosts (default: {DEFAULT_QUEUE_DB})")
+    parser.add_argument("--status", action="store_true", help="Only print the number of jobs per status")
+    args = parser.parse_args(argv)
+    
+    if args.status:
+        stats = get_queue_stats(args.db)
+        print(f"📋 Queue: {args.db}")
+        for status in ('queued', 'running', 'done', 'failed'):
+            print(f"   {status}: {stats.get(status, 0)}")
+        return
+    
+    if not args.background:
+        parser.error("--background is required when queueing jobs")
+    
+    if args.count < 1:
+        print("❌ Error: --count must be at least 1")
+        sys.exit(1)
+    
+    if args.words_per_chunk < 1 or args.words_per_chunk > 8:
+        print("❌ Error: --words-per-chunk must be between 1 and 8")
+        sys.exit(1)
+    
+    if args.segments < 1:
+        print("❌ Error: --segments must be at least 1")
+        sys.exit(1)
+    
+    variants = None
+    if args.variants:
         try:
-            duration = get_audio_duration(voiceover_paths['combined'])
-            if duration:
-                print(f"🎬 Video duration: {duration:.2f} seconds")
-        except:
-            pass
+            variants = parse_variant_names(args.variants) or None
+        except ValueError as e:
+            print(f"❌ Error: --variants: {e}")
+            sys.exit(1)
+    
+    background_video_path = validate_background_video(args.background)
+    if not background_video_path:
+        sys.exit(1)
+    
+    background_video_path_2 = None
+    if args.background2:
+        background_video_path_2 = validate_background_video(args.background2)
+        if not background_video_path_2:
+            sys.exit(1)
+    
+    base_payload = {
+        'background_video_path': background_video_path,
+        'background_video_path_2': background_video_path_2,
+        'words_per_chunk': args.words_per_chunk,
+        'karaoke': args.karaoke,
+        'profile': args.profile,
+        'segments': args.segments,
+        'caption_engine': args.caption_engine,
+        'variants': variants
+    }
+    
+    if args.story_file:
+        payloads = []
+        for story_file in args.story_file:
+            with open(story_file, 'r', encoding='utf-8') as f:
+                payloads.append(dict(base_payload, story_data=json.load(f)))
+    else:
+        payloads = [dict(base_payload) for _ in range(args.count)]
+    
+    queue_ids = enqueue_jobs(args.db, payloads, max_attempts=args.max_attempts)
+    print(f"📥 Queued {len(queue_ids)} job(s) in {args.db} (IDs {queue_ids[0]}-{queue_ids[-1]})")
+
+def run_queued_job(db_path, queued_job, worker_id, lease_seconds):
+    """
+    Run one claimed queue job while a background thread keeps its lease alive.
+    
+    Args:
+        db_path (str): Path to the queue database.
+        queued_job (dict): Job row returned by claim_job.
+        worker_id (str): ID of this worker.
+        lease_seconds (float): Lease length; heartbeats are sent every third of it.
+    
+    Returns:
+        bool: True if the video was generated.
+    """
+    import threading
+    
+    queue_id = queued_job['id']
+    payload = queued_job['payload']
+    stop_heartbeat = threading.Event()
+    
+    def send_heartbeats():
+        while not stop_heartbeat.wait(lease_seconds / 3):
+            if not heartbeat(db_path, queue_id, worker_id, lease_seconds):
+                print(f"⚠️  Lost the lease of queue job {queue_id}; another worker may take it over")
+                return
+    
+    heartbeat_thread = threading.Thread(target=send_heartbeats, name=f"heartbeat-{queue_id}", daemon=True)
+    heartbeat_thread.start()
+    
+    try:
+        # A previous worker died after the story step: continue its job
+        job = None
+        manifest_path = queued_job.get('manifest_path')
+        if manifest_path and os.path.exists(manifest_path):
+            job = job_from_manifest(manifest_path)
+        if job is None:
+            job = create_video_job(
+                queue_id, queue_id,
+                payload['background_video_path'],
+                payload.get('background_video_path_2'),
+                payload.get('words_per_chunk', 2),
+                story_data=payload.get('story_data'),
+                karaoke=payload.get('karaoke', False),
+                profile=payload.get('profile', DEFAULT_PROFILE),
+                segments=payload.get('segments', 1),
+                caption_engine=payload.get('caption_engine'),
+                variants=payload.get('variants')
+            )
+        job['video_number'] = queue_id
+        # Jobs still to do (this one included), not every job ever queued
+        stats = get_queue_stats(db_path)
+        job['total_videos'] = stats.get('queued', 0) + stats.get('running', 0)
         
-        return True
+        success = run_single_video_job(
+            job,
+            on_story_ready=lambda started_job: set_job_manifest(db_path, queue_id, started_job['manifest_path'])
+        )
+    except Exception as e:
+        print(f"❌ Queue job {queue_id} crashed: {e}")
+        job, success = {}, False
+    finally:
+        stop_heartbeat.set()
+        heartbeat_thread.join()
+    
+    if success:
+        output_path = job.get('output_path')
+        if isinstance(output_path, dict):
+            output_path = ", ".join(output_path.values())
+        complete_job(db_path, queue_id, worker_id, output_path)
     else:
-        print(f"❌ Failed to generate video {video_number}/{total_videos}")
-        return False
+        status = fail_job(db_path, queue_id, worker_id, "pipeline step failed")
+        if status is None:
+            print(f"⚠️  Lost the lease of queue job {queue_id}; another worker owns it now, the failure is not recorded")
+        else:
+            print(f"↩️  Queue job {queue_id} is now '{status}'")
+    return success
+
+def worker_command(argv):
+    """
+    `main.py worker`: claim jobs from the job queue and generate them.
+    
+    Several workers can process the same queue. A SQLite queue must be on a
+    local disk with all its workers on that host: claims rely on SQLite file
+    locking (BEGIN IMMEDIATE), which is not reliable over NFS or SMB. Workers
+    on several hosts use a spool directory on the shared volume instead,
+    where claims are atomic renames (src/spool_queue.py). Jobs whose worker
+    stops sending heartbeats go back to the queue when their lease expires.
+    
+    Args:
+        argv (list): Command line arguments after the subcommand.
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py worker",
+        description="Process video jobs from the shared job queue"
+    )
+    parser.add_argument("--db", type=str, default=DEFAULT_QUEUE_DB, help=f"Queue database, or a spool directory (ending in '/') shared by several hosts (default: {DEFAULT_QUEUE_DB})")
+    parser.add_argument("--worker-id", type=str, default=None, help="Worker name shown in the queue (default: host-pid)")
+    parser.add_argument("--lease", type=float, default=120.0, help="Seconds a claimed job stays reserved without a heartbeat")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds to wait before checking an empty queue again")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Stop when the queue has no more jobs")
+    parser.add_argument("--encode-parallelism", type=int, default=1,
+                        help="Number of encodes expected to run at once on this host (across all workers); each gets cores/N threads")
+    args = parser.parse_args(argv)
+    
+    os.environ[PARALLELISM_ENV] = str(max(1, args.encode_parallelism))
+    load_environment()
+    create_required_dirs()
+    worker_id = args.worker_id or default_worker_id()
+    print(f"👷 Worker {worker_id} processing queue {args.db}")
+    
+    successful_videos = 0
+    failed_videos = 0
+    try:
+        while True:
+            queued_job = claim_job(args.db, worker_id, args.lease)
+            if queued_job is None:
+                if args.exit_when_empty:
+                    break
+                time.sleep(args.poll_interval)
+                continue
+            
+            print(f"\n📤 Claimed queue job {queued_job['id']} (attempt {queued_job['attempts']}/{queued_job['max_attempts']})")
+            if run_queued_job(args.db, queued_job, worker_id, args.lease):
+                successful_videos += 1
+            else:
+                failed_videos += 1
+    except KeyboardInterrupt:
+        print("\n⏹️  Worker stopped. The current job will be requeued when its lease expires.")
+    
+    print(f"\n🏁 Worker {worker_id} finished: ✅ {successful_videos} succeeded, ❌ {failed_videos} failed")
+
+def create_required_dirs():
+    """Create the output directories of the pipeline if they are missing."""
+    required_dirs = ['stories', 'voices', 'images', 'captions', 'exports', 'ideas', 'jobs']
+    for dir_name in required_dirs:
+        if not os.path.exists(dir_name):
+            os.makedirs(dir_name)
+            print(f"📁 Created directory: {dir_name}")
+    
+    # Intermediates of runs that were killed before they could clean up
+    removed = remove_stale_workspaces()
+    if removed:
+        print(f"🧹 Removed {removed} stale scratch workspace(s)")
+
+def warm_up_resources():
+    """
+    Load everything a video needs that does not change between videos:
+    .env, FFmpeg location, the post template, the ElevenLabs client and a
+    running Chromium.
+    
+    Returns:
+        dict: What was warmed up, reported by the service's /health.
+    """
+    from api_clients import get_elevenlabs_client
+    
+    load_environment()
+    warm = {}
+    
+    toolchain = get_toolchain()
+    warm['ffmpeg'] = toolchain.describe() if toolchain else None
+    if toolchain:
+        print(f"🎞️  FFmpeg: {toolchain.ffmpeg} (captions: {toolchain.caption_engine() or 'none'})")
+    else:
+        print("⚠️  FFmpeg not found; encodes will fail until it is installed")
+    
+    load_post_template(script_dir)
+    warm['template'] = True
+    
+    warm['elevenlabs'] = False
+    api_key = os.environ.get("ELEVENLABS_API_KEY")
+    if api_key:
+        try:
+            get_elevenlabs_client(api_key)
+            warm['elevenlabs'] = True
+            print("🔊 ElevenLabs client ready")
+        except ImportError as e:
+            print(f"⚠️  ElevenLabs SDK not available: {e}")
+    
+    warm['browser'] = start_warm_browser()
+    if warm['browser']:
+        print("🌐 Chromium ready")
+    return warm
+
+def serve_command(argv):
+    """
+    `main.py serve`: run a local HTTP service that generates videos on request.
+    
+    The service keeps Chromium, the API clients, the post template and the
+    FFmpeg location loaded between videos, so a request only pays for the
+    work of its own video.
+    
+    Args:
+        argv (list): Command line arguments after the subcommand.
+    """
+    # Only the service needs http.server and its job bookkeeping
+    from render_service import RenderService, create_server, DEFAULT_HOST, DEFAULT_PORT
+    
+    parser = argparse.ArgumentParser(
+        prog="main.py serve",
+        description="Generate videos on request through a local HTTP API"
+    )
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help=f"Interface to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--socket", type=str, default=None, help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of videos generated at the same time")
+    parser.add_argument("--background", type=str, default=None, help="Default background video for requests that do not name one")
+    parser.add_argument("--words-per-chunk", type=int, default=2, help="Default number of words per caption chunk")
+    parser.add_argument("--profile", choices=list(RENDER_PROFILES), default=DEFAULT_PROFILE, help=f"Default render profile (default: {DEFAULT_PROFILE})")
+    args = parser.parse_args(argv)
+    
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1")
+        sys.exit(1)
+    
+    def prepare_job(request, service_id):
+        background = request.get('background') or args.background
+        if not background:
+            raise ValueError("'background' is required (no --background default is set)")
+        background_video_path = validate_background_video(background)
+        if not background_video_path:
+            raise ValueError(f"background video not found: {background}")
+        
+        background_video_path_2 = None
+        if request.get('background2'):
+            background_video_path_2 = validate_background_video(request['background2'])
+            if not background_video_path_2:
+                raise ValueError(f"background video not found: {request['background2']}")
+        
+        words_per_chunk = request.get('words_per_chunk', args.words_per_chunk)
+        if not isinstance(words_per_chunk, int) or not 1 <= words_per_chunk <= 8:
+            raise ValueError("'words_per_chunk' must be between 1 and 8")
+        
+        profile = request.get('profile', args.profile)
+        if profile not in RENDER_PROFILES:
+            raise ValueError(f"'profile' must be one of: {', '.join(RENDER_PROFILES)}")
+        
+        story_data = request.get('story')
+        if story_data is not None:
+            missing = [key for key in ('title', 'story', 'subreddit', 'username', 'upvotes')
+                       if not isinstance(story_data, dict) or key not in story_data]
+            if missing:
+                raise ValueError(f"'story' is missing: {', '.join(missing)}")
+        
+        return create_video_job(service_id, service_id, background_video_path, background_video_path_2,
+                                words_per_chunk, story_data=story_data, karaoke=bool(request.get('karaoke', False)),
+                                profile=profile)
+    
+    create_required_dirs()
+    os.environ[PARALLELISM_ENV] = str(args.jobs)
+    
+    print("🚀 Minecraft Reddit Story Reels Generator - render service")
+    print("=" * 50)
+    warm_resources = warm_up_resources()
+    
+    service = RenderService(prepare_job, run_single_video_job, workers=args.jobs, warm_resources=warm_resources)
+    server = create_server(service, args.host, args.port, args.socket)
+    address = args.socket or f"http://{args.host}:{args.port}"
+    print(f"👂 Listening on {address} ({args.jobs} concurrent video(s))")
+    
+    # Stop the same way on SIGTERM (service managers) as on Ctrl+C
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    
+    import signal
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopping service (running videos finish first)...")
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+        service.shutdown()
+        stop_warm_browser()
+
+def prepare_backgrounds_command(argv):
+    """
+    `main.py prepare-backgrounds`: create the proxies and keyframe indexes
+    of all background videos.
+    
+    Renders create a missing proxy or index on first use; running this once
+    after adding backgrounds keeps that work out of the first videos.
+    
+    Args:
+        argv (list): Command line arguments after the subcommand.
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py prepare-backgrounds",
+        description="Pre-scale every background video into its render proxies"
+    )
+    parser.add_argument("--background-dir", type=str, default="background", help="Directory with the background videos (default: background)")
+    parser.add_argument("--prune", action="store_true", help="Also delete proxies of removed or changed backgrounds")
+    args = parser.parse_args(argv)
+    
+    ffmpeg_path, ffprobe_path = find_ffmpeg_path()
+    if not ffmpeg_path:
+        print("❌ FFmpeg not found. Please install FFmpeg.")
+        sys.exit(1)
+    
+    sources = list_background_videos(args.background_dir)
+    if not sources:
+        print(f"❌ No video files found in '{args.background_dir}' directory.")
+        sys.exit(1)
+    
+    print(f"🎞️  Preparing {PROXY_FPS} fps proxies for {len(sources)} background video(s)...")
+    start_time = time.time()
+    ready, failed = prepare_background_proxies(ffmpeg_path, args.background_dir, on_progress=progress_printer())
+    
+    # Keyframe/motion indexes used to pick each video's section
+    for source_path in sources:
+        index = load_background_index(ffprobe_path, source_path)
+        if index:
+            print(f"📇 {os.path.basename(source_path)}: {index['duration']:.0f}s, {len(index['keyframes'])} keyframes")
+        else:
+            failed += 1
+    print(f"✅ {ready} proxies ready, ❌ {failed} failed ({time.time() - start_time:.1f}s)")
+    
+    if args.prune:
+        removed = remove_stale_proxies(args.background_dir)
+        print(f"🧹 Removed {removed} stale prox{'y' if removed == 1 else 'ies'}")
+    
+    if failed:
+        sys.exit(1)
+
+# Subcommands; plain `main.py --count ...` keeps running the pipeline directly
+SUBCOMMANDS = {
+    'queue': queue_command,
+    'worker': worker_command,
+    'serve': serve_command,
+    'prepare-backgrounds': prepare_backgrounds_command,
+}
 
 def main():
     """
     Main function to run the complete pipeline.
     """
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Minecraft Reddit Story Reels Generator",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -286,6 +1089,14 @@ Examples:
   python main.py --count 1 --background minecraft_parkour.mp4
   python main.py --count 5 --background parkour_loop.mp4
   python main.py --count 1 --background parkour1.mp4 --background2 parkour2.mp4
+  python main.py --count 20 --background parkour_loop.mp4 --jobs 4 --encode-workers 2
+  python main.py --count 10 --background rotate
+  python main.py --count 1 --background parkour1.mp4 --profile draft
+  python main.py --resume
+  python main.py queue --count 50 --background parkour_loop.mp4
+  python main.py worker --exit-when-empty
+  python main.py serve --port 8765 --background parkour_loop.mp4
+  python main.py prepare-backgrounds
   
 Make sure to:
 1. Add background videos to 'background/' directory
@@ -297,15 +1108,15 @@ Make sure to:
     parser.add_argument(
         "--count",
         type=int,
-        required=True,
-        help="Number of videos to generate in one run"
+        required=False,
+        help="Number of videos to generate in one run (required unless --resume is used)"
     )
     
     parser.add_argument(
         "--background",
         type=str,
-        required=True,
-        help="Filename of the background video from the 'background/' directory (will be top half if --background2 is used)"
+        required=False,
+        help="Filename of the background video from the 'background/' directory, or 'rotate' to use every file in turn (will be top half if --background2 is used; required unless --resume is used)"
     )
     
     parser.add_argument(
@@ -322,10 +1133,76 @@ Make sure to:
         help="Number of words per caption chunk (1=single word, 2=minimal, 3-4=balanced)"
     )
     
+    parser.add_argument(
+        "--karaoke",
+        action="store_true",
+        help="Highlight each caption word while it is spoken"
+    )
+    
+    parser.add_argument(
+        "--caption-engine",
+        choices=CAPTION_ENGINES,
+        default=None,
+        help="How captions are burned in: ass (libass), drawtext, or sprites (pre-rendered with Pillow, no system font path needed). Default: the best one available"
+    )
+    
+    parser.add_argument(
+        "--profile",
+        choices=list(RENDER_PROFILES),
+        default=DEFAULT_PROFILE,
+        help="Render profile: draft (540x960, 15 fps, ultrafast) for reviewing timing, final (1080x1920) or hq (slow preset, full-resolution sources)"
+    )
+    
+    parser.add_argument(
+        "--variants",
+        type=str,
+        default=None,
+        metavar="NAMES",
+        help=f"Comma-separated platform exports made from one composition in a single FFmpeg run ({', '.join(EXPORT_VARIANTS)}), each with its own resolution, bitrate cap and duration limit"
+    )
+    
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=2,
+        help="Number of videos processed concurrently by the network-bound steps (voiceover, captions)"
+    )
+    
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=1,
+        help="Number of FFmpeg encodes running in parallel worker processes"
+    )
+    
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        help="Split each video into this many keyframe-aligned segments encoded in parallel and joined without re-encoding (for long stories)"
+    )
+    
+    parser.add_argument(
+        "--trace",
+        type=str,
+        required=False,
+        metavar="OUT.json",
+        help="Optional: Write Chrome/Perfetto trace events of the whole run to this file"
+    )
+    
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the unfinished jobs recorded in 'jobs/' instead of generating new videos; completed steps are skipped"
+    )
+    
     args = parser.parse_args()
     
     # Validate arguments
-    if args.count < 1:
+    if not args.resume and (args.count is None or not args.background):
+        parser.error("--count and --background are required unless --resume is used")
+    
+    if args.count is not None and args.count < 1:
         print("❌ Error: --count must be at least 1")
         sys.exit(1)
     
@@ -333,29 +1210,73 @@ Make sure to:
         print("❌ Error: --words-per-chunk must be between 1 and 8")
         sys.exit(1)
     
-    # Validate background video
-    background_video_path = validate_background_video(args.background)
-    if not background_video_path:
+    if args.jobs < 1:
+        print("❌ Error: --jobs must be at least 1")
         sys.exit(1)
     
-    # Validate second background video if provided
-    background_video_path_2 = None
-    if args.background2:
-        background_video_path_2 = validate_background_video(args.background2)
-        if not background_video_path_2:
+    if args.encode_workers < 1:
+        print("❌ Error: --encode-workers must be at least 1")
+        sys.exit(1)
+    
+    if args.segments < 1:
+        print("❌ Error: --segments must be at least 1")
+        sys.exit(1)
+    
+    variants = None
+    if args.variants:
+        try:
+            variants = parse_variant_names(args.variants) or None
+        except ValueError as e:
+            print(f"❌ Error: --variants: {e}")
             sys.exit(1)
     
+    resumed_jobs = []
+    if args.resume:
+        # Continue unfinished jobs with the settings they were started with
+        for manifest_path in find_unfinished_manifests():
+            job = job_from_manifest(manifest_path)
+            if job:
+                resumed_jobs.append(job)
+        
+        if not resumed_jobs:
+            print("✅ No unfinished jobs to resume.")
+            return
+        
+        for video_num, job in enumerate(resumed_jobs, start=1):
+            job['video_number'] = video_num
+            job['total_videos'] = len(resumed_jobs)
+    else:
+        # Validate background video
+        background_video_path = validate_background_video(args.background)
+        if not background_video_path:
+            sys.exit(1)
+        
+        # Validate second background video if provided
+        background_video_path_2 = None
+        if args.background2:
+            background_video_path_2 = validate_background_video(args.background2)
+            if not background_video_path_2:
+                sys.exit(1)
+    
     # Print startup information
     print("🚀 Minecraft Reddit Story Reels Generator")
     print("=" * 50)
-    print(f"📊 Generating {args.count} video(s)")
-    print(f"🎮 Background video: {args.background}")
-    if args.background2:
-        print(f"🎮 Second background video: {args.background2}")
-    print(f"📝 Words per caption: {args.words_per_chunk}")
-    print(f"📁 Background path: {background_video_path}")
-    if background_video_path_2:
-        print(f"📁 Second background path: {background_video_path_2}")
+    if args.resume:
+        print(f"♻️  Resuming {len(resumed_jobs)} unfinished job(s)")
+        for job in resumed_jobs:
+            print(f"  - {job['job_id']}: {os.path.basename(job['background_video_path'])}")
+    else:
+        print(f"📊 Generating {args.count} video(s)")
+        print(f"🎮 Background video: {args.background}")
+        if args.background2:
+            print(f"🎮 Second background video: {args.background2}")
+        print(f"📝 Words per caption: {args.words_per_chunk}" + (" (karaoke)" if args.karaoke else ""))
+        print(f"🎚️  Render profile: {args.profile}")
+        if variants:
+            print(f"📦 Export variants: {', '.join(variants)}")
+        print(f"📁 Background path: {background_video_path}")
+        if background_video_path_2:
+            print(f"📁 Second background path: {background_video_path_2}")
     
     # Check dependencies
     print(f"\n🔍 Checking dependencies...")
@@ -364,30 +1285,57 @@ Make sure to:
     if not os.path.exists('.env'):
         print("⚠️  Warning: .env file not found. Make sure ELEVENLABS_API_KEY is set.")
     
+    # Load it once; worker processes inherit the variables
+    load_environment()
+    
     # Check required directories
-    required_dirs = ['stories', 'voices', 'images', 'captions', 'exports', 'ideas']
-    for dir_name in required_dirs:
-        if not os.path.exists(dir_name):
-            os.makedirs(dir_name)
-            print(f"📁 Created directory: {dir_name}")
+    create_required_dirs()
     
     # Run pipeline for each video
     successful_videos = 0
     failed_videos = 0
     start_time = time.time()
     
-    for video_num in range(1, args.count + 1):
-        success = generate_single_video(background_video_path, video_num, args.count, background_video_path_2)
-        
+    if args.trace:
+        enable_tracing(args.trace)
+        print(f"🧭 Recording trace events to: {args.trace}")
+    
+    try:
+        if resumed_jobs:
+            if len(resumed_jobs) == 1:
+                outcomes = [(1, run_single_video_job(resumed_jobs[0]))]
+            else:
+                outcomes = run_video_jobs(resumed_jobs, jobs=args.jobs, encode_workers=args.encode_workers)
+        elif args.count == 1:
+            outcomes = [(1, generate_single_video(background_video_path, 1, 1, background_video_path_2, args.words_per_chunk,
+                                                  args.karaoke, args.profile, args.segments, args.caption_engine,
+                                                  variants))]
+        else:
+            print(f"⚙️  Running with {args.jobs} concurrent job(s) and {args.encode_workers} encode worker(s)")
+            outcomes = generate_video_batch(
+                background_video_path,
+                args.count,
+                background_video_path_2,
+                args.words_per_chunk,
+                jobs=args.jobs,
+                encode_workers=args.encode_workers,
+                karaoke=args.karaoke,
+                profile=args.profile,
+                segments=args.segments,
+                caption_engine=args.caption_engine,
+                variants=variants
+            )
+    finally:
+        if args.trace:
+            event_count = finalize_trace(args.trace)
+            if event_count is not None:
+                print(f"🧭 Trace written to {args.trace} ({event_count} events)")
+    
+    for video_num, success in outcomes:
         if success:
             successful_videos += 1
         else:
             failed_videos += 1
-        
-        # Brief pause between videos
-        if video_num < args.count:
-            print("\n⏸️  Pausing 2 seconds before next video...")
-            time.sleep(2)
     
     # Final summary
     total_time = time.time() - start_time
@@ -0,0 +1,49 @@
+import threading
+
+# One client per (service, API key), shared by all threads of the process.
+# The SDK clients keep an HTTP connection pool, so reusing them saves the
+# TLS handshake on every request.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _get_client(service, api_key, create):
+    """Return the cached client for a service, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get((service, api_key))
+        if client is None:
+            client = create()
+            _clients[(service, api_key)] = client
+        return client
+
+def get_elevenlabs_client(api_key):
+    """
+    Gets the ElevenLabs client for an API key. The SDK is imported on the
+    first call, so importing the pipeline modules stays cheap.
+
+    Args:
+        api_key (str): ElevenLabs API key.
+
+    Returns:
+        ElevenLabs: The shared client.
+    """
+    def create():
+        from elevenlabs.client import ElevenLabs
+        return ElevenLabs(api_key=api_key)
+
+    return _get_client('elevenlabs', api_key, create)
+
+def get_openai_client(api_key):
+    """
+    Gets the OpenAI client for an API key, importing the SDK on first use.
+
+    Args:
+        api_key (str): OpenAI API key.
+
+    Returns:
+        OpenAI: The shared client.
+    """
+    def create():
+        from openai import OpenAI
+        return OpenAI(api_key=api_key)
+
+    return _get_client('openai', api_key, create)
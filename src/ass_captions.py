@@ -0,0 +1,139 @@
+import os
+from caption_timeline import load_caption_timeline
+
+# Caption look, matching the previous drawtext captions: yellow Arial with a
+# black border, centred 120px above the bottom of the 1080x1920 frame. Sizes
+# are scaled for other frame heights.
+ASS_STYLE = {
+    'font': "Arial",
+    'font_size': 26,
+    'primary_colour': "&H0000FFFF",    # yellow (ASS colours are &HAABBGGRR)
+    'secondary_colour': "&H00FFFFFF",  # white, words not yet spoken in karaoke mode
+    'outline_colour': "&H00000000",
+    'outline': 3,
+    'margin_v': 120
+}
+
+# Pop-in animation: start at 70% size and grow to full size in 200 ms
+POP_IN_SCALE = 70
+POP_IN_MS = 200
+
+def format_ass_time(seconds):
+    """Format seconds as an ASS timestamp (H:MM:SS.cc)."""
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def _escape_ass_text(text):
+    """Keep caption text from being read as ASS override tags."""
+    return text.replace('\\', '/').replace('{', '(').replace('}', ')').replace('\n', ' ')
+
+def _karaoke_text(text, start, end, word_times=None):
+    """
+    Add a \\k tag before each word, so words turn from the secondary to the
+    primary colour as they are spoken. Each word lights up at its start in
+    the alignment; without word timing (captions read back from an SRT) the
+    caption's duration is split between the words by their length.
+    """
+    words = text.split()
+    total_centiseconds = max(1, int(round((end - start) * 100)))
+    if word_times and len(word_times) == len(words):
+        # Centiseconds after the caption start at which each word lights up
+        marks = []
+        for word_start, _ in word_times:
+            mark = int(round((word_start - start) * 100))
+            marks.append(min(total_centiseconds, max(marks[-1] if marks else 0, mark)))
+        marks.append(total_centiseconds)
+        # An empty syllable covers the silence before the first word
+        lead = f"{{\\k{marks[0]}}}" if marks[0] else ""
+        return lead + ' '.join(f"{{\\k{marks[i + 1] - marks[i]}}}{_escape_ass_text(word)}"
+                               for i, word in enumerate(words))
+
+    total_characters = sum(len(word) for word in words) or 1
+    parts = []
+    used = 0
+    for i, word in enumerate(words):
+        if i == len(words) - 1:
+            duration = total_centiseconds - used
+        else:
+            duration = int(total_centiseconds * len(word) / total_characters)
+        used += duration
+        parts.append(f"{{\\k{duration}}}{_escape_ass_text(word)}")
+    return ' '.join(parts)
+
+def write_ass_captions(captions, ass_path, title_end_time=0.0, karaoke=False, width=1080, height=1920):
+    """
+    Convert SRT captions into an ASS subtitle file with the pop-in
+    animation as ASS transforms, so one `ass` filter draws all captions.
+
+    Args:
+        captions (CaptionTimeline or str): Caption timeline or SRT file.
+        ass_path (str): ASS file to write.
+        title_end_time (float): Captions starting earlier are left out.
+        karaoke (bool): Highlight each word while it is spoken.
+        width (int): Video width (ASS PlayResX).
+        height (int): Video height (ASS PlayResY).
+
+    Returns:
+        int: Number of caption events written.
+    """
+    scale = height / 1920
+    style = dict(ASS_STYLE,
+                 font_size=round(ASS_STYLE['font_size'] * scale, 1),
+                 outline=round(ASS_STYLE['outline'] * scale, 2),
+                 margin_v=round(ASS_STYLE['margin_v'] * scale))
+    pop_in = (f"{{\\fscx{POP_IN_SCALE}\\fscy{POP_IN_SCALE}\\bord{style['outline'] * POP_IN_SCALE / 100:g}"
+              f"\\t(0,{POP_IN_MS},\\fscx100\\fscy100\\bord{style['outline']:g})}}")
+
+    timeline = load_caption_timeline(captions)
+    events = []
+    for index, (start, end, text) in enumerate(timeline):
+        if start < title_end_time or end <= start:
+            continue
+        body = _karaoke_text(text, start, end, timeline.word_times(index)) if karaoke else _escape_ass_text(text)
+        events.append(f"Dialogue: 0,{format_ass_time(start)},{format_ass_time(end)},Caption,,0,0,0,,{pop_in}{body}")
+
+    header = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Caption,{style['font']},{style['font_size']:g},{style['primary_colour']},{style['secondary_colour']},"
+        f"{style['outline_colour']},&H00000000,1,0,0,0,100,100,0,0,1,{style['outline']:g},0,2,20,20,{style['margin_v']},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+
+    with open(ass_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(header + events) + '\n')
+    return len(events)
+
+def filter_path(path):
+    """
+    Format a file path for use inside an FFmpeg filter argument. A relative
+    path avoids the escaping of Windows drive letters.
+    """
+    try:
+        return os.path.relpath(path).replace('\\', '/')
+    except ValueError:
+        # Different drive than the working directory (Windows)
+        return os.path.abspath(path).replace('\\', '/').replace(':', '\\:')
+
+def create_ass_filter(ass_path):
+    """
+    Create the FFmpeg filter burning in an ASS file.
+
+    Returns:
+        str: The `ass` filter.
+    """
+    return f"ass='{filter_path(ass_path)}'"
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import bisect
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+from tracing import trace_span
+from background_proxy import VIDEO_EXTENSIONS
+
+# Indexes and the rotation state are stored next to the sources, in background/.index
+INDEX_DIR_NAME = ".index"
+ROTATION_STATE_NAME = "rotation.json"
+INDEX_VERSION = 1
+
+# Background name that makes every video take the next file of background/
+ROTATE_BACKGROUNDS = "rotate"
+
+# Sections whose motion is below this share of the clip's median (menus,
+# pauses, loading screens) are skipped when another section is available
+MIN_RELATIVE_MOTION = 0.5
+
+_LOCK_STALE_SECONDS = 30
+_index_lock = threading.Lock()
+
+def get_index_dir(video_path):
+    """Get the index directory for the backgrounds next to video_path."""
+    return os.path.join(os.path.dirname(os.path.abspath(video_path)), INDEX_DIR_NAME)
+
+def get_index_path(video_path):
+    """Get the sidecar index file of a background video."""
+    return os.path.join(get_index_dir(video_path), f"{os.path.basename(video_path)}.json")
+
+def _write_json(path, data):
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def build_background_index(ffprobe_path, video_path):
+    """
+    Index a background video from its packet headers, without decoding.
+
+    The keyframes are the packets flagged 'K'. The motion score of each
+    keyframe interval is the mean size of its other packets relative to
+    the clip's median: predicted frames grow with the amount of movement.
+
+    Args:
+        ffprobe_path (str): FFprobe executable.
+        video_path (str): Background video.
+
+    Returns:
+        dict: {'duration', 'keyframes', 'motion', ...}, or None on error.
+    """
+    cmd = [
+        ffprobe_path, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,size,flags:format=duration",
+        "-of", "json", video_path
+    ]
+    try:
+        with trace_span("ffprobe index", "ffmpeg", source=os.path.basename(video_path)):
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout)
+        duration = float(probe['format']['duration'])
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+        print(f"Error indexing background {os.path.basename(video_path)}: {e}")
+        return None
+
+    packets = sorted((float(p['pts_time']), int(p['size']), 'K' in p.get('flags', ''))
+                     for p in probe.get('packets', []) if p.get('pts_time') not in (None, 'N/A'))
+    keyframes = [pts for pts, _, is_key in packets if is_key] or [0.0]
+
+    # Mean predicted-frame size per keyframe interval
+    totals = [0] * len(keyframes)
+    counts = [0] * len(keyframes)
+    for pts, size, is_key in packets:
+        if not is_key:
+            interval = max(0, bisect.bisect_right(keyframes, pts) - 1)
+            totals[interval] += size
+            counts[interval] += 1
+    sizes = [totals[i] / counts[i] if counts[i] else 0.0 for i in range(len(keyframes))]
+    median = sorted(sizes)[len(sizes) // 2] or 1.0
+
+    stat = os.stat(video_path)
+    return {
+        'version': INDEX_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'duration': duration,
+        'keyframes': [round(pts, 3) for pts in keyframes],
+        'motion': [round(size / median, 3) for size in sizes]
+    }
+
+def load_background_index(ffprobe_path, video_path):
+    """
+    Get the index of a background, building the sidecar on first use and
+    again whenever the video's size or modification time changes.
+
+    Returns:
+        dict: The index, or None if the video could not be indexed.
+    """
+    index_path = get_index_path(video_path)
+    stat = os.stat(video_path)
+    with _index_lock:
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if (index.get('version') == INDEX_VERSION and index['size'] == stat.st_size
+                    and index['mtime_ns'] == stat.st_mtime_ns):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index = build_background_index(ffprobe_path, video_path)
+    if index:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with _index_lock:
+            _write_json(index_path, index)
+    return index
+
+def _window_motion(index, start, duration):
+    """Mean motion score of the keyframe intervals covering [start, start + duration)."""
+    keyframes = index['keyframes']
+    first = max(0, bisect.bisect_right(keyframes, start) - 1)
+    last = max(first + 1, bisect.bisect_left(keyframes, start + duration))
+    scores = index['motion'][first:last]
+    return sum(scores) / len(scores) if scores else 0.0
+
+def choose_background_offset(index, duration, cursor=0.0):
+    """
+    Pick the first keyframe at or after cursor from which the clip still
+    lasts `duration` seconds, skipping low-motion sections. Wraps around to
+    the start of the clip when the rest is too short.
+
+    Args:
+        index (dict): Background index.
+        duration (float): Seconds of background the video needs.
+        cursor (float): Where the previous video's section ended.
+
+    Returns:
+        float: Keyframe timestamp to seek to (0.0 if the clip is too short).
+    """
+    candidates = [k for k in index['keyframes'] if k + duration <= index['duration']]
+    if not candidates:
+        return 0.0
+
+    rest = [k for k in candidates if k >= cursor]
+    ordered = rest + [k for k in candidates if k < cursor]
+    for keyframe in ordered:
+        if _window_motion(index, keyframe, duration) >= MIN_RELATIVE_MOTION:
+            return keyframe
+    return ordered[0]
+
+@contextmanager
+def _rotation_lock(index_dir):
+    """Exclusive lock on the rotation state, shared by all processes using background/."""
+    os.makedirs(index_dir, exist_ok=True)
+    lock_path = os.path.join(index_dir, ".lock")
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            # A process killed while holding the lock must not block everyone
+            try:
+                if time.time() - os.path.getmtime(lock_path) > _LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def _read_rotation_state(index_dir):
+    try:
+        with open(os.path.join(index_dir, ROTATION_STATE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def next_background_offset(ffprobe_path, video_path, duration):
+    """
+    Pick where the next video starts in a background: each video continues
+    after the section used by the previous one, so a batch walks through
+    the whole clip instead of always showing its first seconds.
+
+    Args:
+        ffprobe_path (str): FFprobe executable.
+        video_path (str): Background video.
+        duration (float): Seconds of background the video needs.
+
+    Returns:
+        float: Keyframe-aligned offset in seconds (0.0 if unknown).
+    """
+    index = load_background_index(ffprobe_path, video_path)
+    if not index:
+        return 0.0
+
+    index_dir = get_index_dir(video_path)
+    name = os.path.basename(video_path)
+    with _rotation_lock(index_dir):
+        state = _read_rotation_state(index_dir)
+        cursors = state.setdefault('cursors', {})
+        offset = choose_background_offset(index, duration, cursors.get(name, 0.0))
+        cursors[name] = round(offset + duration, 3)
+        _write_json(os.path.join(index_dir, ROTATION_STATE_NAME), state)
+    return offset
+
+def next_background_file(background_dir="background", exclude=None):
+    """
+    Pick the least used background video of a directory (by name on ties),
+    so videos made with `--background rotate` spread over all files.
+
+    Args:
+        background_dir (str): Directory with the background videos.
+        exclude (str): Path not to pick (the other half of stacked backgrounds).
+
+    Returns:
+        str: Path to the background video, or None if the directory has none.
+    """
+    if not os.path.isdir(background_dir):
+        return None
+    names = sorted(name for name in os.listdir(background_dir) if name.lower().endswith(VIDEO_EXTENSIONS))
+    if exclude and len(names) > 1:
+        names = [name for name in names if name != os.path.basename(exclude)]
+    if not names:
+        return None
+
+    index_dir = os.path.join(background_dir, INDEX_DIR_NAME)
+    with _rotation_lock(index_dir):
+        state = _read_rotation_state(index_dir)
+        uses = state.setdefault('uses', {})
+        name = min(names, key=lambda n: (uses.get(n, 0), n))
+        uses[name] = uses.get(name, 0) + 1
+        _write_json(os.path.join(index_dir, ROTATION_STATE_NAME), state)
+    return os.path.join(background_dir, name)
@@ -0,0 +1,253 @@
+import os
+import json
+import hashlib
+import subprocess
+import threading
+import uuid
+from tracing import trace_span
+from ffmpeg_runner import run_ffmpeg
+from media_info import get_media_info
+from resource_governor import acquire_encode, release_encode
+
+# Proxies are stored next to the sources, in background/.proxies
+PROXY_DIR_NAME = ".proxies"
+HASH_INDEX_NAME = "hashes.json"
+
+# Frame rate of the proxies (and of the final videos made from them)
+PROXY_FPS = 30
+
+# Background geometries used by compose_final_video
+FULL_FRAME = (1080, 1920)   # single background
+HALF_FRAME = (1080, 960)    # one half of two stacked backgrounds
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# One lock per proxy file, so threads of one process never build it twice
+_proxy_locks = {}
+_proxy_locks_lock = threading.Lock()
+_hash_index_lock = threading.Lock()
+
+def get_proxy_dir(source_path):
+    """Get the proxy directory for the backgrounds next to source_path."""
+    return os.path.join(os.path.dirname(os.path.abspath(source_path)), PROXY_DIR_NAME)
+
+def _load_hash_index(proxy_dir):
+    try:
+        with open(os.path.join(proxy_dir, HASH_INDEX_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_hash_index(proxy_dir, index):
+    index_path = os.path.join(proxy_dir, HASH_INDEX_NAME)
+    temp_path = f"{index_path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(temp_path, index_path)
+
+def get_source_hash(source_path):
+    """
+    Hash the content of a background video.
+
+    Hashing a multi-GB source takes seconds, so the hash is remembered in
+    .proxies/hashes.json together with the file's size and modification
+    time, and only computed again when the file changes.
+
+    Args:
+        source_path (str): Path to the background video.
+
+    Returns:
+        str: 12-character content hash.
+    """
+    proxy_dir = get_proxy_dir(source_path)
+    os.makedirs(proxy_dir, exist_ok=True)
+    stat = os.stat(source_path)
+    name = os.path.basename(source_path)
+
+    with _hash_index_lock:
+        entry = _load_hash_index(proxy_dir).get(name)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['hash']
+
+    with trace_span("hash background", "cache", source=name, size=stat.st_size):
+        digest = hashlib.md5()
+        with open(source_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        content_hash = digest.hexdigest()[:12]
+
+    with _hash_index_lock:
+        index = _load_hash_index(proxy_dir)
+        index[name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': content_hash}
+        _save_hash_index(proxy_dir, index)
+    return content_hash
+
+def get_proxy_path(source_path, width, height, fps=PROXY_FPS):
+    """
+    Get the proxy file of a background for one geometry. The name contains
+    the source hash, so an edited source never reuses an old proxy.
+
+    Returns:
+        str: Path such as background/.proxies/parkour_3f2a9c1b7e4d_1080x1920_30fps.mp4.
+    """
+    return os.path.join(get_proxy_dir(source_path), f"{_proxy_prefix(source_path)}_{width}x{height}_{fps}fps.mp4")
+
+def _proxy_prefix(source_path):
+    """Name shared by all proxies of one version of a source."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    return f"{stem}_{get_source_hash(source_path)}"
+
+def _get_proxy_lock(proxy_path):
+    with _proxy_locks_lock:
+        return _proxy_locks.setdefault(proxy_path, threading.Lock())
+
+def create_background_proxy(ffmpeg_path, source_path, proxy_path, width, height, fps=PROXY_FPS, on_progress=None):
+    """
+    Transcode a background into its proxy: scaled and cropped to the target
+    geometry, converted to the target frame rate, without audio, with a
+    keyframe every second so it decodes and seeks cheaply. The whole source
+    is decoded, so the transcode is followed like the other encodes and
+    killed if it stalls or runs far longer than the source's duration warrants.
+
+    Args:
+        ffmpeg_path (str): FFmpeg executable.
+        source_path (str): Full-resolution background video.
+        proxy_path (str): Proxy file to write.
+        width (int): Proxy width.
+        height (int): Proxy height.
+        fps (int): Proxy frame rate.
+        on_progress (callable): Progress callback (see run_ffmpeg()).
+
+    Returns:
+        bool: True if the proxy was written.
+    """
+    # Write under a unique name first so other processes never read a
+    # half-written proxy
+    temp_path = f"{os.path.splitext(proxy_path)[0]}.{uuid.uuid4().hex[:8]}.tmp.mp4"
+    cmd = [
+        ffmpeg_path, "-y",
+        "-i", source_path,
+        "-vf", f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},setsar=1,fps={fps}",
+        "-an",
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "18",
+        "-tune", "fastdecode",
+        "-g", str(fps), "-keyint_min", str(fps), "-sc_threshold", "0", "-bf", "0",
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+    ]
+
+    media_info = get_media_info(source_path)
+    duration = media_info['duration'] if media_info else None
+
+    # A proxy is at most about as large as its source
+    allocation = acquire_encode(os.path.getsize(source_path), os.path.dirname(proxy_path))
+    if allocation is None:
+        return False
+    try:
+        cmd += [*allocation.ffmpeg_args(), temp_path]
+        with trace_span("ffmpeg proxy", "ffmpeg", source=os.path.basename(source_path), geometry=f"{width}x{height}"):
+            run_ffmpeg(cmd, duration, on_progress, label="proxy")
+        os.replace(temp_path, proxy_path)
+        return True
+    except subprocess.TimeoutExpired as e:
+        print(f"FFmpeg timed out while creating proxy for {os.path.basename(source_path)}: {e.stderr[-2000:]}")
+        return False
+    except subprocess.CalledProcessError as e:
+        print(f"FFmpeg error while creating proxy for {os.path.basename(source_path)}: {e.stderr[-2000:]}")
+        return False
+    except OSError as e:
+        print(f"Error creating proxy for {os.path.basename(source_path)}: {e}")
+        return False
+    finally:
+        release_encode(allocation)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def get_background_proxy(ffmpeg_path, source_path, width, height, fps=PROXY_FPS, on_progress=None):
+    """
+    Get the proxy of a background for one geometry, transcoding it on first
+    use. Later renders read the small proxy instead of decoding, scaling
+    and cropping the full-resolution source on every frame.
+
+    Args:
+        ffmpeg_path (str): FFmpeg executable.
+        source_path (str): Full-resolution background video.
+        width (int): Target width.
+        height (int): Target height.
+        fps (int): Target frame rate.
+        on_progress (callable): Progress callback of the transcode, if one is needed.
+
+    Returns:
+        str: Path to the proxy, or source_path if the proxy could not be made.
+    """
+    try:
+        proxy_path = get_proxy_path(source_path, width, height, fps)
+    except OSError as e:
+        print(f"⚠️  Background proxy unavailable, using the source: {e}")
+        return source_path
+
+    with _get_proxy_lock(proxy_path):
+        with trace_span("cache lookup", "cache", path=os.path.basename(proxy_path)) as span:
+            hit = os.path.exists(proxy_path) and os.path.getsize(proxy_path) > 0
+            span['hit'] = hit
+        if hit:
+            return proxy_path
+
+        print(f"🎞️  Creating {width}x{height} proxy of {os.path.basename(source_path)} (once per background)...")
+        if create_background_proxy(ffmpeg_path, source_path, proxy_path, width, height, fps, on_progress):
+            return proxy_path
+
+    print(f"⚠️  Using the full-resolution source for {os.path.basename(source_path)}")
+    return source_path
+
+def list_background_videos(background_dir="background"):
+    """List the background videos of a directory, sorted by name."""
+    if not os.path.isdir(background_dir):
+        return []
+    return [os.path.join(background_dir, name) for name in sorted(os.listdir(background_dir))
+            if name.lower().endswith(VIDEO_EXTENSIONS)]
+
+def prepare_background_proxies(ffmpeg_path, background_dir="background", geometries=(FULL_FRAME, HALF_FRAME), fps=PROXY_FPS, on_progress=None):
+    """
+    Create the missing proxies of every background in a directory.
+
+    Args:
+        ffmpeg_path (str): FFmpeg executable.
+        background_dir (str): Directory with the background videos.
+        geometries (tuple): (width, height) pairs to prepare.
+        fps (int): Proxy frame rate.
+        on_progress (callable): Progress callback of the transcodes.
+
+    Returns:
+        tuple: (ready, failed) number of proxies.
+    """
+    ready = 0
+    failed = 0
+    for source_path in list_background_videos(background_dir):
+        for width, height in geometries:
+            if get_background_proxy(ffmpeg_path, source_path, width, height, fps, on_progress) != source_path:
+                ready += 1
+            else:
+                failed += 1
+    return ready, failed
+
+def remove_stale_proxies(background_dir="background"):
+    """
+    Delete proxies whose source was removed or changed.
+
+    Returns:
+        int: Number of deleted proxy files.
+    """
+    proxy_dir = os.path.join(background_dir, PROXY_DIR_NAME)
+    if not os.path.isdir(proxy_dir):
+        return 0
+
+    current = {_proxy_prefix(source) for source in list_background_videos(background_dir)}
+    removed = 0
+    for name in os.listdir(proxy_dir):
+        if name.endswith('.mp4') and not any(name.startswith(prefix + '_') for prefix in current):
+            os.remove(os.path.join(proxy_dir, name))
+            removed += 1
+    return removed
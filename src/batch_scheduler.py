@@ -0,0 +1,135 @@
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Sentinel pushed through the stage queues once the previous stage is drained
+_STOP = object()
+
+class PipelineStage:
+    """
+    One stage of a staged batch run.
+
+    Args:
+        name (str): Name of the stage for logging.
+        function (callable): Takes a job dict and returns the updated job dict,
+                             or None/False if the job failed in this stage.
+        workers (int): Number of jobs processed concurrently by this stage.
+        use_processes (bool): Run the function in a process pool instead of
+                              a thread (for CPU-bound work such as encoding).
+    """
+
+    def __init__(self, name, function, workers=1, use_processes=False):
+        self.name = name
+        self.function = function
+        self.workers = max(1, int(workers))
+        self.use_processes = use_processes
+
+def _run_stage_worker(stage, executor, input_queue, output_queue, results, results_lock, on_result):
+    """
+    Worker loop: takes jobs from the input queue, runs the stage and forwards
+    successful jobs to the next queue. Finished and failed jobs are recorded
+    and passed to on_result right away.
+    """
+    while True:
+        job = input_queue.get()
+        if job is _STOP:
+            # Let the sibling workers of this stage see the sentinel as well
+            input_queue.put(_STOP)
+            return
+
+        try:
+            if executor is not None:
+                result = executor.submit(stage.function, job).result()
+            else:
+                result = stage.function(job)
+        except Exception as e:
+            print(f"❌ Stage '{stage.name}' crashed for video {job.get('video_number')}: {e}")
+            result = None
+
+        if not result:
+            _record_result(results, results_lock, on_result, job['video_number'],
+                           {'success': False, 'failed_stage': stage.name, 'job': job})
+            continue
+
+        if output_queue is not None:
+            output_queue.put(result)
+        else:
+            _record_result(results, results_lock, on_result, result['video_number'],
+                           {'success': True, 'failed_stage': None, 'job': result})
+
+def _record_result(results, results_lock, on_result, video_number, result):
+    """Store the outcome of a job and report it (one report at a time)."""
+    with results_lock:
+        results[video_number] = result
+        if on_result:
+            try:
+                on_result(result)
+            except Exception as e:
+                print(f"Result callback failed for video {video_number}: {e}")
+
+def run_staged_batch(jobs, stages, queue_size=2, on_result=None):
+    """
+    Runs every job through the given stages, overlapping stages across jobs.
+
+    Stages are connected by bounded queues, so a fast stage never runs more
+    than `queue_size` jobs ahead of a slow one. While video N is in a later
+    stage (e.g. encoding), video N+1 is already processed by the earlier ones.
+
+    Args:
+        jobs (list): Job dicts, each with a unique 'video_number' key.
+        stages (list): PipelineStage objects in execution order.
+        queue_size (int): Maximum number of jobs waiting between two stages.
+        on_result (callable): Called with the {'success', 'failed_stage', 'job'}
+                              dict of each job as soon as it finishes the last
+                              stage or fails, while later jobs keep running.
+
+    Returns:
+        dict: Mapping of video_number to {'success', 'failed_stage', 'job'}.
+    """
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+    results = {}
+    results_lock = threading.Lock()
+    executors = []
+    stage_threads = []
+
+    try:
+        for index, stage in enumerate(stages):
+            executor = None
+            if stage.use_processes:
+                executor = ProcessPoolExecutor(max_workers=stage.workers)
+                executors.append(executor)
+
+            output_queue = queues[index + 1] if index + 1 < len(stages) else None
+            threads = []
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=_run_stage_worker,
+                    args=(stage, executor, queues[index], output_queue, results, results_lock, on_result),
+                    name=f"{stage.name}-{worker_index + 1}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+            stage_threads.append(threads)
+
+        def feed_jobs():
+            for job in jobs:
+                queues[0].put(job)
+            queues[0].put(_STOP)
+
+        feeder = threading.Thread(target=feed_jobs, name="feeder", daemon=True)
+        feeder.start()
+
+        # Close each stage once everything before it has drained
+        for index, threads in enumerate(stage_threads):
+            for thread in threads:
+                thread.join()
+            if index + 1 < len(queues):
+                queues[index + 1].put(_STOP)
+
+        feeder.join()
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    return results
@@ -2,6 +2,8 @@ import os
 import json
 import hashlib
 import shutil
+import uuid
+from tracing import trace_span
 
 def get_content_hash(content):
     """Generate a hash for content to use as cache key."""
@@ -17,23 +19,33 @@ def get_cache_paths(base_dir, content_hash, file_type):
     
     if file_type == "audio":
         return os.path.join(cache_dir, f"audio_{content_hash}.mp3")
+    elif file_type == "alignment":
+        return os.path.join(cache_dir, f"alignment_{content_hash}.json")
+    elif file_type == "delivery_audio":
+        return os.path.join(cache_dir, f"audio_{content_hash}.m4a")
     elif file_type == "image":
         return os.path.join(cache_dir, f"image_{content_hash}.png")
     elif file_type == "captions":
         return os.path.join(cache_dir, f"captions_{content_hash}.srt")
     elif file_type == "story":
         return os.path.join(cache_dir, f"story_{content_hash}.json")
+    elif file_type == "sprite":
+        return os.path.join(cache_dir, f"sprite_{content_hash}.png")
     
     return None
 
 def cache_exists(cache_path):
     """Check if cached file exists and is valid."""
-    return os.path.exists(cache_path) and os.path.getsize(cache_path) > 0
+    with trace_span("cache lookup", "cache", path=os.path.basename(cache_path)) as span:
+        hit = os.path.exists(cache_path) and os.path.getsize(cache_path) > 0
+        span['hit'] = hit
+        return hit
 
 def copy_from_cache(cache_path, target_path):
     """Copy file from cache to target location."""
     try:
-        shutil.copy2(cache_path, target_path)
+        with trace_span("cache copy", "cache", path=os.path.basename(cache_path)):
+            shutil.copy2(cache_path, target_path)
         return True
     except Exception as e:
         print(f"Error copying from cache: {e}")
@@ -42,7 +54,12 @@ def copy_from_cache(cache_path, target_path):
 def save_to_cache(source_path, cache_path):
     """Save file to cache."""
     try:
-        shutil.copy2(source_path, cache_path)
+        with trace_span("cache save", "cache", path=os.path.basename(cache_path)):
+            # Copy under a unique name first so concurrent workers never
+            # read a half-written cache file
+            temp_path = f"{cache_path}.{uuid.uuid4().hex[:8]}.tmp"
+            shutil.copy2(source_path, temp_path)
+            os.replace(temp_path, cache_path)
         return True
     except Exception as e:
         print(f"Error saving to cache: {e}")
@@ -53,3 +70,19 @@ def get_story_cache_key(story_data):
     # Use title + story content for cache key
     content = f"{story_data['title']}{story_data['story']}"
     return get_content_hash(content)
+
+def generate_job_id(story_data):
+    """
+    Generate the ID used to name every artifact of one video.
+
+    The ID starts with the story cache key, so artifacts of the same story
+    group together, and ends with a random suffix, so videos started at the
+    same moment (in other threads, processes or hosts) never share a name.
+
+    Args:
+        story_data (dict): The story of the video.
+
+    Returns:
+        str: Job ID such as '3f2a9c1b7e4d_8c1f0a2b'.
+    """
+    return f"{get_story_cache_key(story_data)}_{uuid.uuid4().hex[:8]}"
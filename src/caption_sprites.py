@@ -0,0 +1,171 @@
+import os
+import uuid
+import importlib.util
+from functools import lru_cache
+from ass_captions import ASS_STYLE, POP_IN_SCALE, POP_IN_MS
+from caption_timeline import load_caption_timeline
+from cache_manager import get_content_hash, get_cache_paths
+from toolchain import find_font_file
+
+# Same look as the ASS captions: yellow text with a black outline, centred
+# 120px above the bottom of the 1080x1920 frame
+SPRITE_STYLE = {
+    'fill': (255, 255, 0, 255),
+    'outline_fill': (0, 0, 0, 255),
+    'font_size': ASS_STYLE['font_size'],
+    'outline': ASS_STYLE['outline'],
+    'margin_v': ASS_STYLE['margin_v']
+}
+
+# Fonts looked up by name in the system font directories by Pillow, before
+# the drawtext font of the host and Pillow's built-in font
+FONT_NAMES = ["arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"]
+
+# Pop-in animation as a few sprites of growing size, then the full-size one
+POP_IN_STEPS = 3
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def sprites_available():
+    """True if Pillow is installed, so captions can be rendered as sprites."""
+    return importlib.util.find_spec("PIL") is not None
+
+@lru_cache(maxsize=32)
+def load_sprite_font(size, font_file=None):
+    """
+    Load the caption font at a pixel size. No font path is required: Pillow
+    finds Arial (or a common substitute) by name on Windows, macOS and Linux.
+
+    Returns:
+        ImageFont: The font.
+    """
+    from PIL import ImageFont
+
+    for candidate in [font_file, *FONT_NAMES, find_font_file()]:
+        if not candidate:
+            continue
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+def get_band_size(width, height):
+    """Size of every sprite: a full-width band tall enough for one caption line."""
+    scale = height / 1920
+    return width, int(round((SPRITE_STYLE['font_size'] * 2 + SPRITE_STYLE['outline'] * 4) * scale))
+
+def get_caption_sprite(text, width, height, zoom=1.0, font_file=None):
+    """
+    Get the PNG of one caption, rasterizing it on first use. Sprites are
+    cached in .cache/ by a hash of the text, style, size and font, so
+    repeated words and phrases are only drawn once.
+
+    Args:
+        text (str): Caption text ('' for the transparent blank sprite).
+        width (int): Video width.
+        height (int): Video height.
+        zoom (float): Pop-in size relative to the full caption.
+        font_file (str): Optional font to use instead of Arial.
+
+    Returns:
+        str: Path to the RGBA PNG.
+    """
+    from PIL import Image, ImageDraw
+
+    scale = height / 1920
+    band_width, band_height = get_band_size(width, height)
+    font = load_sprite_font(max(1, int(round(SPRITE_STYLE['font_size'] * scale * zoom))), font_file)
+    outline = max(1, int(round(SPRITE_STYLE['outline'] * scale * zoom))) if text else 0
+
+    key = get_content_hash({
+        'text': text, 'style': repr(SPRITE_STYLE), 'band': [band_width, band_height],
+        'font': getattr(font, 'path', 'default'), 'size': getattr(font, 'size', None), 'outline': outline
+    })
+    sprite_path = get_cache_paths(project_root, key, "sprite")
+    if os.path.exists(sprite_path):
+        return sprite_path
+
+    image = Image.new("RGBA", (band_width, band_height), (0, 0, 0, 0))
+    if text:
+        # Anchored at the bottom centre, like drawtext's y=h-120-text_h
+        ImageDraw.Draw(image).text(
+            (band_width / 2, band_height - SPRITE_STYLE['outline'] * scale * 2), text, font=font,
+            fill=SPRITE_STYLE['fill'], stroke_width=outline, stroke_fill=SPRITE_STYLE['outline_fill'], anchor="md"
+        )
+
+    # Other processes may render the same sprite at the same time
+    temp_path = f"{sprite_path}.{uuid.uuid4().hex[:8]}.tmp.png"
+    image.save(temp_path)
+    os.replace(temp_path, sprite_path)
+    return sprite_path
+
+def concat_file_entry(path):
+    """Line of an FFmpeg concat script for a file, with its path quoted."""
+    escaped = os.path.abspath(path).replace('\\', '/').replace("'", "'\\''")
+    return f"file '{escaped}'"
+
+def write_sprite_captions(captions, concat_path, title_end_time=0.0, width=1080, height=1920, font_file=None):
+    """
+    Rasterize the captions and write a concat script that plays them as an
+    image sequence: a transparent sprite between captions, the pop-in
+    sprites at the start of each caption, then the full-size one. A single
+    overlay of that sequence replaces the per-frame text filters.
+
+    Args:
+        captions (CaptionTimeline or str): Caption timeline or SRT file.
+        concat_path (str): Concat script to write.
+        title_end_time (float): Captions starting earlier are left out.
+        width (int): Video width.
+        height (int): Video height.
+        font_file (str): Optional font to use instead of Arial.
+
+    Returns:
+        int: Number of captions in the sequence.
+    """
+    blank = get_caption_sprite("", width, height)
+    step = POP_IN_MS / 1000 / POP_IN_STEPS
+    zooms = [(POP_IN_SCALE + (100 - POP_IN_SCALE) * i / POP_IN_STEPS) / 100 for i in range(POP_IN_STEPS)]
+
+    entries = []
+    position = 0.0
+    count = 0
+    for start, end, text in load_caption_timeline(captions).captions_after(title_end_time):
+        start = max(start, position)
+        if end <= start or not text:
+            continue
+        if start > position:
+            entries.append((blank, start - position))
+        for zoom in zooms:
+            if end - start > step * 2:
+                entries.append((get_caption_sprite(text, width, height, zoom, font_file), step))
+                start += step
+        entries.append((get_caption_sprite(text, width, height, 1.0, font_file), end - start))
+        position = end
+        count += 1
+
+    lines = ["ffconcat version 1.0"]
+    for path, duration in entries or [(blank, 1.0)]:
+        lines += [concat_file_entry(path), f"duration {duration:.3f}"]
+    # The last duration only applies when the file is listed once more
+    lines.append(concat_file_entry(blank))
+    with open(concat_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return count
+
+def create_sprite_overlay_filter(width, height):
+    """
+    Build the overlay that draws the caption image sequence at the caption
+    position. Frames after the last sprite pass through unchanged.
+
+    Returns:
+        str: Overlay filter taking the video and the sprite sequence.
+    """
+    scale = height / 1920
+    _, band_height = get_band_size(width, height)
+    y = height - int(round(SPRITE_STYLE['margin_v'] * scale)) - band_height + int(round(SPRITE_STYLE['outline'] * scale * 2))
+    return f"overlay=0:{y}:eof_action=pass"
+
+def sprite_inputs(concat_path):
+    """FFmpeg input arguments reading a sprite concat script."""
+    return ["-f", "concat", "-safe", "0", "-i", concat_path.replace('\\', '/')]
@@ -0,0 +1,219 @@
+import os
+import re
+import bisect
+import threading
+from array import array
+
+# Words as counted when matching the title against the captions
+WORD_PATTERN = re.compile(r'\b\w+\b')
+
+# Timelines already parsed by this process, keyed by absolute SRT path
+_timelines = {}
+_timelines_lock = threading.Lock()
+
+def parse_srt_time(time_str):
+    """Convert an SRT timestamp (HH:MM:SS,mmm) to seconds."""
+    hours, minutes, seconds = time_str.strip().replace(',', '.').split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def format_srt_time(seconds):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+
+class CaptionTimeline:
+    """
+    The caption chunks of one video: start and end times in two arrays of
+    doubles plus the texts, ordered by start time. Time queries bisect the
+    arrays instead of scanning the captions.
+
+    Attributes:
+        starts (array): Start of each caption in seconds.
+        ends (array): End of each caption in seconds.
+        texts (list): Text of each caption.
+        path (str): SRT file the timeline was read from or saved to, or None.
+        word_starts (array): Start of each spoken word, in caption order, or
+                             None if only the caption timing is known (SRT).
+        word_ends (array): End of each spoken word, or None.
+        word_offsets (array): Index of the first word of each caption in
+                              word_starts (one more entry than captions), or None.
+    """
+
+    __slots__ = ('starts', 'ends', 'texts', 'path', 'word_starts', 'word_ends', 'word_offsets', '_word_totals')
+
+    def __init__(self, starts=(), ends=(), texts=(), path=None):
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+        self.texts = list(texts)
+        self.path = path
+        self.word_starts = None
+        self.word_ends = None
+        self.word_offsets = None
+        self._word_totals = None
+
+    @classmethod
+    def from_chunks(cls, chunks, path=None):
+        """Build a timeline from {'start', 'end', 'text'} dicts."""
+        return cls([c['start'] for c in chunks], [c['end'] for c in chunks], [c['text'] for c in chunks], path)
+
+    @classmethod
+    def from_srt(cls, srt_path):
+        """Parse an SRT file."""
+        with open(srt_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        captions = []
+        for block in content.strip().split('\n\n'):
+            lines = block.strip().split('\n')
+            if len(lines) >= 3 and '-->' in lines[1]:
+                start_str, end_str = lines[1].split('-->')
+                captions.append((parse_srt_time(start_str), parse_srt_time(end_str), ' '.join(lines[2:]).strip()))
+        captions.sort(key=lambda caption: caption[0])
+        return cls([c[0] for c in captions], [c[1] for c in captions], [c[2] for c in captions], srt_path)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends, self.texts)
+
+    def __getitem__(self, index):
+        return self.starts[index], self.ends[index], self.texts[index]
+
+    def attach_words(self, words):
+        """
+        Keep the timing of each spoken word, so captions can be highlighted
+        word by word. The words are assigned to the captions in order, by the
+        number of words in each caption text.
+
+        Args:
+            words (list): {'word', 'start', 'end'} dicts in spoken order, as
+                          returned by the alignment the captions were built from.
+
+        Returns:
+            bool: False if the words do not match the captions (nothing kept).
+        """
+        offsets = array('l', [0])
+        for text in self.texts:
+            offsets.append(offsets[-1] + len(text.split()))
+        if offsets[-1] != len(words):
+            return False
+        self.word_starts = array('d', (word['start'] for word in words))
+        self.word_ends = array('d', (word['end'] for word in words))
+        self.word_offsets = offsets
+        return True
+
+    def word_times(self, index):
+        """
+        Start and end of each word of a caption.
+
+        Returns:
+            list: (start, end) tuples, or None if the word timing is not known.
+        """
+        if self.word_offsets is None:
+            return None
+        first, last = self.word_offsets[index], self.word_offsets[index + 1]
+        return list(zip(self.word_starts[first:last], self.word_ends[first:last]))
+
+    def duration(self):
+        """End of the last caption (0.0 without captions)."""
+        return max(self.ends) if self.ends else 0.0
+
+    def captions_after(self, time):
+        """Captions starting at or after `time`, as (start, end, text) tuples."""
+        first = bisect.bisect_left(self.starts, time)
+        return [self[i] for i in range(first, len(self))]
+
+    def captions_between(self, start, end):
+        """Captions shown at some point in [start, end), as (start, end, text) tuples."""
+        first = bisect.bisect_left(self.starts, start)
+        # A caption that started earlier may still be on screen
+        while first > 0 and self.ends[first - 1] > start:
+            first -= 1
+        last = bisect.bisect_left(self.starts, end)
+        return [self[i] for i in range(first, last) if self.ends[i] > start]
+
+    def caption_at(self, time):
+        """Index of the caption on screen at `time`, or None."""
+        index = bisect.bisect_right(self.starts, time) - 1
+        if index >= 0 and self.ends[index] > time:
+            return index
+        return None
+
+    def word_end_time(self, word_count):
+        """
+        End of the caption containing the word_count-th spoken word, found by
+        bisecting the running word totals of the captions.
+
+        Returns:
+            float: End time in seconds, or None if the captions have fewer words.
+        """
+        if self._word_totals is None:
+            totals = array('l')
+            running = 0
+            for text in self.texts:
+                running += len(WORD_PATTERN.findall(text))
+                totals.append(running)
+            self._word_totals = totals
+        index = bisect.bisect_left(self._word_totals, max(1, word_count))
+        return self.ends[index] if index < len(self) else None
+
+    def title_end_time(self, title):
+        """
+        When the title has been read: the end of the caption holding its
+        last word, since captions are aligned to "{title}. {story}".
+
+        Returns:
+            float: End time in seconds, or None if it cannot be determined.
+        """
+        word_count = len(WORD_PATTERN.findall(title))
+        return self.word_end_time(word_count) if word_count else None
+
+    def to_srt(self, srt_path):
+        """Write the timeline as an SRT file and remember it as its source."""
+        blocks = []
+        for i, (start, end, text) in enumerate(self):
+            blocks += [str(i + 1), f"{format_srt_time(start)} --> {format_srt_time(end)}", text, ""]
+        with open(srt_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(blocks))
+        self.path = srt_path
+        remember_caption_timeline(self)
+
+def remember_caption_timeline(timeline):
+    """Keep a timeline so later loads of its SRT in this process skip parsing."""
+    if not timeline.path:
+        return
+    key = os.path.abspath(timeline.path)
+    stat = os.stat(key)
+    with _timelines_lock:
+        _timelines[key] = (stat.st_size, stat.st_mtime_ns, timeline)
+
+def load_caption_timeline(captions):
+    """
+    Get the timeline of a caption file, parsing each SRT once per process
+    (again only if the file changes).
+
+    Args:
+        captions (str or CaptionTimeline): SRT path, or a timeline that is
+                                           returned as is.
+
+    Returns:
+        CaptionTimeline: The timeline.
+    """
+    if isinstance(captions, CaptionTimeline):
+        return captions
+
+    key = os.path.abspath(captions)
+    stat = os.stat(key)
+    with _timelines_lock:
+        entry = _timelines.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+
+    timeline = CaptionTimeline.from_srt(captions)
+    with _timelines_lock:
+        _timelines[key] = (stat.st_size, stat.st_mtime_ns, timeline)
+    return timeline
@@ -1,43 +1,28 @@
 import os
 import json
+import math
 import subprocess
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-
-def find_ffmpeg_path():
-    """
-    Find FFmpeg/ffprobe executable path on Windows.
-    
-    Returns:
-        tuple: (ffmpeg_path, ffprobe_path) or (None, None) if not found
-    """
-    # Common Windows locations for FFmpeg
-    common_paths = [
-        # WinGet installation path
-        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'WinGet', 'Links'),
-        os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'WinGet', 'Packages', 'Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe', 'ffmpeg-7.1.1-full_build', 'bin'),
-        # Program Files locations
-        r'C:\Program Files\ffmpeg\bin',
-        r'C:\Program Files (x86)\ffmpeg\bin',
-        # User PATH locations
-        r'C:\ffmpeg\bin',
-    ]
-    
-    # First try system PATH
-    try:
-        subprocess.run(['ffprobe', '-version'], capture_output=True, check=True)
-        return 'ffmpeg', 'ffprobe'
-    except:
-        pass
-    
-    # Search common installation paths
-    for path in common_paths:
-        ffmpeg_exe = os.path.join(path, 'ffmpeg.exe')
-        ffprobe_exe = os.path.join(path, 'ffprobe.exe')
-        if os.path.exists(ffmpeg_exe) and os.path.exists(ffprobe_exe):
-            return ffmpeg_exe, ffprobe_exe
-    
-    return None, None
+from tracing import trace_span
+from resource_governor import acquire_encode, release_encode, get_encode_threads
+from scratch_workspace import ScratchWorkspace
+from ffmpeg_runner import run_ffmpeg
+from timing_algorithms import get_title_end_time_exact
+from caption_timeline import load_caption_timeline
+from voice_alignment import load_alignment
+from ass_captions import write_ass_captions, create_ass_filter, filter_path
+from caption_sprites import write_sprite_captions, create_sprite_overlay_filter, sprite_inputs, concat_file_entry
+from toolchain import get_toolchain, find_ffmpeg_path, find_font_file
+from render_profiles import get_render_profile, DEFAULT_PROFILE
+from export_variants import get_export_variant, get_variant_path, bitrate_to_bits, CONTAINER_OPTIONS
+from background_proxy import get_background_proxy, FULL_FRAME, HALF_FRAME
+from background_index import next_background_offset, load_background_index
+from media_info import get_media_info
+
+# Segments of a segment-parallel encode are at least this long, so short
+# videos are not split into pieces that cost more to start than to encode
+MIN_SEGMENT_SECONDS = 10.0
 
 def get_latest_story_file():
     """
@@ -161,7 +146,8 @@ def get_latest_caption_file():
 
 def get_audio_duration(audio_path):
     """
-    Gets the duration of an audio file using FFprobe.
+    Gets the duration of an audio file. MP3 and WAV headers are read in
+    process (see media_info.py); FFprobe is only run for other formats.
 
     Args:
         audio_path (str): Path to the audio file.
@@ -169,151 +155,73 @@ def get_audio_duration(audio_path):
     Returns:
         float: Duration in seconds, or None if error.
     """
-    try:
-        ffmpeg_path, ffprobe_path = find_ffmpeg_path()
-        if not ffprobe_path:
-            print("FFprobe not found. Please install FFmpeg.")
-            return None
-            
-        cmd = [
-            ffprobe_path, "-v", "quiet", "-show_entries", "format=duration",
-            "-of", "csv=p=0", audio_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except Exception as e:
-        print(f"Error getting audio duration: {e}")
+    info = get_media_info(audio_path)
+    if not info:
+        print(f"Error getting audio duration of {audio_path}")
         return None
+    return info['duration']
 
-def create_story_only_srt(original_srt_path, output_srt_path, start_time):
-    """
-    Creates a new SRT file containing only subtitles after the specified start time.
-    
-    Args:
-        original_srt_path (str): Path to the original SRT file.
-        output_srt_path (str): Path for the new story-only SRT file.
-        start_time (float): Time in seconds when story begins.
-    """
-    try:
-        with open(original_srt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        blocks = content.strip().split('\n\n')
-        story_blocks = []
-        subtitle_index = 1
-        
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                time_line = lines[1]
-                text = lines[2]
-                
-                if '-->' in time_line:
-                    # Parse start time
-                    start_time_str = time_line.split('-->')[0].strip()
-                    time_parts = start_time_str.replace(',', '.').split(':')
-                    if len(time_parts) == 3:
-                        hours = float(time_parts[0])
-                        minutes = float(time_parts[1])
-                        seconds = float(time_parts[2])
-                        subtitle_start = hours * 3600 + minutes * 60 + seconds
-                        
-                        # Only include subtitles that start after the title ends
-                        if subtitle_start >= start_time:
-                            story_blocks.append(f"{subtitle_index}\n{time_line}\n{text}")
-                            subtitle_index += 1
-        
-        # Write the story-only SRT file
-        with open(output_srt_path, 'w', encoding='utf-8') as f:
-            f.write('\n\n'.join(story_blocks))
-        
-        print(f"Created story-only SRT: {len(story_blocks)} subtitles starting from {start_time:.3f}s")
-        
-    except Exception as e:
-        print(f"Error creating story-only SRT: {e}")
-        # Fallback: copy original file
-        import shutil
-        shutil.copy2(original_srt_path, output_srt_path)
-
-def create_animated_subtitles_filter(srt_path, title_end_time):
+def create_animated_subtitles_filter(captions, title_end_time, font_file=None, scale=1.0, window=None):
     """
     Create FFmpeg drawtext filters for animated subtitles with pop-up effect.
+    Used when the FFmpeg build has no libass for the `ass` filter.
     
     Args:
-        srt_path (str): Path to the SRT file.
+        captions (CaptionTimeline or str): Caption timeline or SRT file.
         title_end_time (float): When to start showing subtitles.
+        font_file (str): TrueType font (default: the first one found on the host).
+        scale (float): Size of the captions relative to a 1080x1920 frame.
+        window (tuple): Only include captions shown between these (start, end)
+                        seconds, for a segment of the video (default: all).
     
     Returns:
         str: FFmpeg filter string for animated subtitles.
     """
     try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        font_file = filter_path(font_file or find_font_file() or 'arial.ttf')
+        timeline = load_caption_timeline(captions)
         
-        blocks = content.strip().split('\n\n')
-        filters = []
+        # Only captions after the title (and inside the segment)
+        if window:
+            selected = [c for c in timeline.captions_between(*window) if c[0] >= title_end_time]
+        else:
+            selected = timeline.captions_after(title_end_time)
         
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                time_line = lines[1]
-                text = lines[2].replace("'", "\\'")  # Escape single quotes
-                
-                if '-->' in time_line:
-                    # Parse timing
-                    start_time_str, end_time_str = time_line.split('-->')
-                    
-                    # Parse start time
-                    start_parts = start_time_str.strip().replace(',', '.').split(':')
-                    if len(start_parts) == 3:
-                        start_hours = float(start_parts[0])
-                        start_minutes = float(start_parts[1])
-                        start_seconds = float(start_parts[2])
-                        start_time = start_hours * 3600 + start_minutes * 60 + start_seconds
-                    
-                    # Parse end time
-                    end_parts = end_time_str.strip().replace(',', '.').split(':')
-                    if len(end_parts) == 3:
-                        end_hours = float(end_parts[0])
-                        end_minutes = float(end_parts[1])
-                        end_seconds = float(end_parts[2])
-                        end_time = end_hours * 3600 + end_minutes * 60 + end_seconds
-                    
-                    # Only include if starts after title end time
-                    if start_time >= title_end_time:
-                        # Animation: scale from 0 to 1 over first 0.2 seconds, then normal size
-                        scale_expr = f"if(lt(t-{start_time},0.2),0.7+0.3*(t-{start_time})/0.2,1.0)"
-                        
-                        # Create drawtext filter with pop-up animation
-                        filter_text = (
-                            f"drawtext=text='{text}'"
-                            f":fontfile='C\\:/Windows/Fonts/arial.ttf'"
-                            f":fontsize=26*{scale_expr}"
-                            f":fontcolor=yellow"
-                            f":borderw=3*{scale_expr}"
-                            f":bordercolor=black"
-                            f":x=(w-text_w)/2"
-                            f":y=h-120-text_h"
-                            f":enable='between(t,{start_time},{end_time})'"
-                        )
-                        filters.append(filter_text)
+        filters = []
+        for start_time, end_time, text in selected:
+            text = text.replace("'", "\\'")  # Escape single quotes
+            
+            # Animation: scale from 0 to 1 over first 0.2 seconds, then normal size
+            scale_expr = f"if(lt(t-{start_time},0.2),0.7+0.3*(t-{start_time})/0.2,1.0)"
+            
+            # Create drawtext filter with pop-up animation
+            filter_text = (
+                f"drawtext=text='{text}'"
+                f":fontfile='{font_file}'"
+                f":fontsize={26 * scale:g}*{scale_expr}"
+                f":fontcolor=yellow"
+                f":borderw={3 * scale:g}*{scale_expr}"
+                f":bordercolor=black"
+                f":x=(w-text_w)/2"
+                f":y=h-{120 * scale:g}-text_h"
+                f":enable='between(t,{start_time},{end_time})'"
+            )
+            filters.append(filter_text)
         
         # Combine all filters
-        if filters:
-            return ",".join(filters)
-        else:
-            return ""
+        return ",".join(filters)
             
     except Exception as e:
         print(f"Error creating animated subtitles: {e}")
         return ""
 
-def get_title_end_time(captions_path, story_data):
+def get_title_end_time(captions, story_data):
     """
-    Analyzes the SRT file to find when the title reading ends.
+    Finds when the title reading ends from the first caption containing
+    the last word of the title.
     
     Args:
-        captions_path (str): Path to the SRT file.
+        captions (CaptionTimeline or str): Caption timeline or SRT file.
         story_data (dict): Story data containing the title.
     
     Returns:
@@ -324,35 +232,13 @@ def get_title_end_time(captions_path, story_data):
         if not title_words:
             return 4.5
         
-        # Look for the last word of the title in the SRT file
+        # Look for the last word of the title in the captions
         last_title_word = title_words[-1].rstrip('.,!?')
         
-        with open(captions_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Split into subtitle blocks
-        blocks = content.strip().split('\n\n')
-        
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                time_line = lines[1]
-                text_line = lines[2].lower().strip()
-                
-                # Check if this contains the last word of the title
-                if last_title_word in text_line:
-                    # Extract end time
-                    if '-->' in time_line:
-                        end_time_str = time_line.split('-->')[1].strip()
-                        # Parse HH:MM:SS,mmm format
-                        time_parts = end_time_str.replace(',', '.').split(':')
-                        if len(time_parts) == 3:
-                            hours = float(time_parts[0])
-                            minutes = float(time_parts[1])
-                            seconds = float(time_parts[2])
-                            total_seconds = hours * 3600 + minutes * 60 + seconds
-                            # Add small buffer to ensure title is fully read
-                            return total_seconds + 0.5
+        for start, end, text in load_caption_timeline(captions):
+            if last_title_word in text.lower():
+                # Add small buffer to ensure title is fully read
+                return end + 0.5
         
         # Fallback if parsing fails
         return 4.5
@@ -360,7 +246,370 @@ def get_title_end_time(captions_path, story_data):
         print(f"Warning: Could not parse title end time: {e}")
         return 4.5
 
-def compose_final_video(background_video_path, opening_image_path, title_voice_path, story_voice_path, captions_path, output_path, opening_duration=3.0, story_data=None, background_video_path_2=None):
+def estimate_encode_bytes(duration, profile=None):
+    """
+    Estimates the disk space one composition needs: the final encode of a
+    video in the given render profile.
+
+    Args:
+        duration (float): Video duration in seconds.
+        profile (dict): Render profile (default: 'final').
+
+    Returns:
+        int: Estimated bytes, with a safety margin.
+    """
+    profile = profile or get_render_profile()
+    final_bitrate = 6_000_000   # 1080x1920, medium preset, CRF 23
+    # Bitrate follows the pixel count and roughly doubles every 6 CRF steps down
+    pixels = profile['width'] * profile['height'] / (1080 * 1920)
+    bitrate = final_bitrate * pixels * 2 ** ((23 - profile['crf']) / 6)
+    return int(duration * bitrate / 8 * 1.5)
+
+def estimate_variant_bytes(duration, variant, profile):
+    """
+    Estimates the disk space of one export variant: its trimmed duration at
+    the profile's quality, but never more than its bitrate cap allows.
+    """
+    if variant['max_duration']:
+        duration = min(duration, variant['max_duration'])
+    estimate = estimate_encode_bytes(duration, dict(profile, width=variant['width'], height=variant['height']))
+    return min(estimate, int(duration * bitrate_to_bits(variant['max_bitrate']) / 8 * 1.5))
+
+def is_delivery_audio(audio_path):
+    """True if the file is AAC audio that can be muxed with -c:a copy."""
+    if not audio_path or not os.path.exists(audio_path):
+        return False
+    info = get_media_info(audio_path)
+    return bool(info) and info.get('audio_codec') == 'aac'
+
+def get_audio_output_args(copy_audio, bitrate):
+    """
+    Audio output options: a stream copy of the AAC voiceover, or an AAC
+    encode of the MP3 when no delivery-ready copy exists.
+    """
+    if copy_audio:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", bitrate, "-ar", "44100"]
+
+def build_variant_outputs(variants, profile, audio_input, duration, allocation, output_path, copy_audio=False):
+    """
+    Builds the fan-out of one composition to several export variants: the
+    composited [video] is split once, each branch is scaled to its variant
+    and encoded by its own libx264 instance in the same FFmpeg run.
+
+    Args:
+        variants (list): Variant settings from get_export_variant().
+        profile (dict): Render profile of the composition (preset, CRF).
+        audio_input (int): Input index of the voiceover.
+        duration (float): Duration of the composition.
+        allocation (EncodeAllocation): Thread budget shared by the encoders.
+        output_path (str): Base output path; each variant adds its suffix.
+        copy_audio (bool): The voiceover is AAC at the profile's audio
+                           bitrate; variants with that bitrate mux it as is,
+                           the others encode it at their own bitrate.
+
+    Returns:
+        tuple: (filter graph to append, output arguments, {variant name: path}).
+    """
+    labels = "".join(f"[split{i}]" for i in range(len(variants)))
+    graph = f";[video]split={len(variants)}{labels}"
+    outputs = []
+    paths = {}
+    for i, variant in enumerate(variants):
+        if (variant['width'], variant['height']) == (profile['width'], profile['height']):
+            graph += f";[split{i}]null[out{i}]"
+        else:
+            graph += f";[split{i}]scale={variant['width']}:{variant['height']}:flags=bicubic,setsar=1[out{i}]"
+        
+        trimmed = min(duration, variant['max_duration']) if variant['max_duration'] else duration
+        bufsize = f"{bitrate_to_bits(variant['max_bitrate']) * 2:.0f}"
+        path = get_variant_path(output_path, variant)
+        outputs += [
+            "-map", f"[out{i}]", "-map", f"{audio_input}:a",
+            "-c:v", "libx264",
+            "-preset", profile['preset'],
+            "-crf", str(profile['crf']),
+            "-maxrate", variant['max_bitrate'], "-bufsize", bufsize,
+            "-pix_fmt", "yuv420p",
+            *get_audio_output_args(copy_audio and variant['audio_bitrate'] == profile['audio_bitrate'], variant['audio_bitrate']),
+            "-t", str(trimmed),
+            *CONTAINER_OPTIONS[variant['container']],
+            *allocation.ffmpeg_args(share=len(variants)),
+            path
+        ]
+        paths[variant['name']] = path
+    return graph, outputs, paths
+
+def build_composition_filter(stacked, image_input, title_end_time, caption_filter, profile=None, segment_start=0.0, caption_input=None):
+    """
+    Builds the filter graph of the final video: background scale/crop
+    (optionally two stacked backgrounds), the Reddit post overlay during
+    the title and the caption filters.
+
+    Args:
+        stacked (bool): Inputs 0 and 1 are two backgrounds to stack (top/bottom).
+        image_input (int): Input index of the looped post image, or None for
+                           a segment that starts after the title.
+        title_end_time (float): When the post image disappears.
+        caption_filter (str): Filter chain drawing the captions.
+        profile (dict): Render profile with the output size and frame rate
+                        (default: 'final').
+        segment_start (float): Where this segment starts in the video. Frames
+                               are shifted to the video's timeline for the
+                               overlay and captions, then back to zero.
+        caption_input (int): Input index of the caption sprite sequence that
+                             caption_filter overlays, if any.
+
+    Returns:
+        str: Value for -filter_complex with the output labelled [video].
+    """
+    profile = profile or get_render_profile()
+    width, height = profile['width'], profile['height']
+    # Frames dropped right after decoding are never scaled or overlaid
+    fps = f",fps={profile['fps']}" if profile['fps'] else ""
+    shift = f",setpts=PTS+{segment_start:.3f}/TB" if segment_start else ""
+    
+    # Background proxies already have the final size, so their scale and
+    # crop pass the frames through unchanged
+    if stacked:
+        half = height // 2
+        background = (
+            f"[0:v]scale={width}:{half}:force_original_aspect_ratio=increase,crop={width}:{half}{fps}[bg1];"
+            f"[1:v]scale={width}:{half}:force_original_aspect_ratio=increase,crop={width}:{half}{fps}[bg2];"
+            f"[bg1][bg2]vstack=inputs=2{shift}[bg];"
+        )
+    else:
+        background = f"[0:v]scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},setsar=1{fps}{shift}[bg];"
+    
+    reset = ",setpts=PTS-STARTPTS" if segment_start else ""
+    sprites = f"[{caption_input}:v]" if caption_input is not None else ""
+    if image_input is None:
+        return background + f"[bg]{sprites}{caption_filter}{reset}[video]"
+    
+    # The post image is 1000px wide on a 1080px wide frame
+    post_width = int(1000 * profile['scale']) // 2 * 2
+    return (
+        background +
+        f"[{image_input}:v]scale={post_width}:-1:force_original_aspect_ratio=decrease{shift}[post];"
+        f"[bg][post]overlay=(W-w)/2:(H-h)/2:enable='between(t,0,{title_end_time})'[titled];"
+        f"[titled]{sprites}{caption_filter}{reset}[video]"
+    )
+
+def plan_segments(duration, count, keyframes=None):
+    """
+    Split the video into segments that can be encoded in parallel. Each
+    segment starts on a keyframe of the background, so its worker seeks
+    straight to it, and lasts at least MIN_SEGMENT_SECONDS.
+
+    Args:
+        duration (float): Video duration in seconds.
+        count (int): Wanted number of segments.
+        keyframes (list): Background keyframes relative to the start of the
+                          video (default: every whole second, as in proxies).
+
+    Returns:
+        list: (start, length) of each segment; one segment for short videos.
+    """
+    count = min(count, int(duration // MIN_SEGMENT_SECONDS))
+    if count <= 1:
+        return [(0.0, duration)]
+    
+    candidates = sorted(k for k in (keyframes or range(1, math.ceil(duration))) if 0 < k < duration)
+    starts = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        later = [k for k in candidates if k >= starts[-1] + MIN_SEGMENT_SECONDS / 2]
+        if later:
+            start = float(min(later, key=lambda k: abs(k - target)))
+            if duration - start >= MIN_SEGMENT_SECONDS / 2:
+                starts.append(start)
+    
+    ends = starts[1:] + [duration]
+    return [(start, end - start) for start, end in zip(starts, ends)]
+
+def build_segment_command(ffmpeg_path, backgrounds, opening_image_path, title_end_time, caption_filter, profile, start, length, segment_path, allocation, caption_inputs=()):
+    """
+    Builds the FFmpeg command that encodes one segment of the video (no
+    audio). The backgrounds are seeked to their offset plus the segment
+    start; the post image is only read by segments that show the title.
+
+    Args:
+        backgrounds (list): (path, offset) of each background.
+        start (float): Segment start in the video.
+        length (float): Segment length in seconds.
+        segment_path (str): Segment file to write.
+        allocation (EncodeAllocation): Thread budget of the segment.
+        caption_inputs (list): Input arguments of the caption sprite sequence.
+
+    Returns:
+        list: The command.
+    """
+    inputs = []
+    for path, offset in backgrounds:
+        if offset + start > 0:
+            inputs += ["-ss", f"{offset + start:.3f}"]
+        inputs += ["-i", path]
+    image_input = None
+    if start < title_end_time:
+        image_input = len(backgrounds)
+        inputs += ["-loop", "1", "-i", opening_image_path]
+    caption_input = None
+    if caption_inputs:
+        caption_input = len(backgrounds) + (image_input is not None)
+        inputs += caption_inputs
+    
+    filter_complex = build_composition_filter(len(backgrounds) > 1, image_input, title_end_time, caption_filter, profile,
+                                              start, caption_input)
+    return [
+        ffmpeg_path, "-y",
+        *inputs,
+        "-filter_complex", filter_complex,
+        "-map", "[video]", "-an",
+        "-c:v", "libx264",
+        "-preset", profile['preset'],
+        "-crf", str(profile['crf']),
+        "-pix_fmt", "yuv420p",
+        "-t", f"{length:.3f}",
+        *allocation.ffmpeg_args(),
+        segment_path
+    ]
+
+def encode_segment(cmd_factory, segment_path, expected_bytes, threads, index, length, on_progress=None):
+    """
+    Encode one segment under its own share of the encode budget.
+
+    Args:
+        cmd_factory (callable): Builds the command from the EncodeAllocation.
+        segment_path (str): Segment file the command writes.
+        expected_bytes (int): Estimated size of the segment.
+        threads (int): Threads of this segment's FFmpeg process.
+        index (int): Segment number, for logs.
+        length (float): Duration of the segment.
+        on_progress (callable): Progress callback (see run_ffmpeg()).
+
+    Returns:
+        bool: True if the segment was encoded.
+    """
+    allocation = acquire_encode(expected_bytes, os.path.dirname(segment_path) or ".", threads=threads)
+    if allocation is None:
+        return False
+    try:
+        with trace_span("ffmpeg segment", "ffmpeg", segment=index, output=os.path.basename(segment_path)) as span:
+            progress = run_ffmpeg(cmd_factory(allocation), length, on_progress, label=f"segment {index}")
+            span['speed'] = progress['speed']
+        return True
+    except subprocess.TimeoutExpired as e:
+        print(f"FFmpeg timed out on segment {index}: {e.stderr[-2000:]}")
+        return False
+    except subprocess.CalledProcessError as e:
+        print(f"FFmpeg error on segment {index}: {e.stderr[-2000:]}")
+        return False
+    finally:
+        release_encode(allocation)
+
+def join_segments(ffmpeg_path, segment_paths, audio_path, output_path, duration, audio_args, workspace, on_progress=None):
+    """
+    Join encoded segments with the concat demuxer (stream copy, no
+    re-encode) and mux the full voiceover once (audio_args from
+    get_audio_output_args()).
+
+    Returns:
+        bool: True if the output was written.
+    """
+    list_path = workspace.path("segments.concat.txt")
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            f.write(concat_file_entry(path) + "\n")
+    cmd = [
+        ffmpeg_path, "-y",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "copy",
+        *audio_args,
+        "-t", str(duration),
+        "-movflags", "+faststart",
+        output_path
+    ]
+    try:
+        with trace_span("ffmpeg join", "ffmpeg", output=os.path.basename(output_path), segments=len(segment_paths)):
+            run_ffmpeg(cmd, duration, on_progress, label="join")
+        return True
+    except subprocess.TimeoutExpired:
+        print("FFmpeg timed out while joining the segments")
+        return False
+    except subprocess.CalledProcessError as e:
+        print(f"FFmpeg error while joining the segments: {e.stderr[-2000:]}")
+        return False
+    finally:
+        os.remove(list_path)
+
+def encode_segmented_video(ffmpeg_path, backgrounds, opening_image_path, audio_path, output_path, title_end_time, caption_filter, drawtext_args, profile, plan, duration, workspace, caption_inputs=(), on_progress=None, copy_audio=False):
+    """
+    Encode the video as parallel segments and join them. The host's thread
+    budget for one encode is split between the segments, so a long video
+    uses all cores even where libx264 alone would not.
+
+    Args:
+        backgrounds (list): (path, offset) of each background.
+        caption_filter (str): Caption filter shared by all segments (ASS).
+        drawtext_args (tuple): Arguments of create_animated_subtitles_filter
+                               when captions are drawtext filters, so each
+                               segment only gets its own captions; or None.
+        profile (dict): Render profile.
+        plan (list): (start, length) of each segment from plan_segments().
+        duration (float): Duration of the whole video.
+        workspace (ScratchWorkspace): Scratch workspace the segments are written to.
+        caption_inputs (list): Input arguments of the caption sprite sequence.
+        on_progress (callable): Progress callback of every segment and the join.
+        copy_audio (bool): audio_path is delivery-ready AAC, muxed without re-encoding.
+
+    Returns:
+        bool: True if the output was written.
+    """
+    threads = max(1, get_encode_threads() // len(plan))
+    segment_paths = [workspace.path(f"seg{i}.mp4", estimate_encode_bytes(length, profile))
+                     for i, (_, length) in enumerate(plan)]
+    print(f"Encoding '{profile['name']}' ({profile['width']}x{profile['height']}, preset {profile['preset']}) "
+          f"as {len(plan)} segments with {threads} thread(s) each")
+    
+    def encode(i):
+        start, length = plan[i]
+        segment_captions = caption_filter
+        if drawtext_args:
+            segment_captions = create_animated_subtitles_filter(*drawtext_args, window=(start, start + length)) or "null"
+        
+        def build(allocation):
+            return build_segment_command(ffmpeg_path, backgrounds, opening_image_path, title_end_time, segment_captions,
+                                         profile, start, length, segment_paths[i], allocation, caption_inputs)
+        return encode_segment(build, segment_paths[i], estimate_encode_bytes(length, profile), threads, i, length, on_progress)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(plan), thread_name_prefix="segment") as executor:
+            results = list(executor.map(encode, range(len(plan))))
+        if not all(results):
+            print(f"❌ {results.count(False)} of {len(plan)} segments failed")
+            remove_partial_output(output_path)
+            return False
+        
+        if not join_segments(ffmpeg_path, segment_paths, audio_path, output_path, duration, get_audio_output_args(copy_audio, profile['audio_bitrate']), workspace, on_progress):
+            remove_partial_output(output_path)
+            return False
+        print("Video composition completed successfully!")
+        return True
+    finally:
+        for path in segment_paths:
+            remove_partial_output(path)
+
+def remove_partial_output(output_path):
+    """Delete the output of a failed encode so it is never mistaken for a finished video."""
+    try:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    except OSError:
+        pass
+
+def compose_final_video(background_video_path, opening_image_path, title_voice_path, story_voice_path, captions_path, output_path, opening_duration=3.0, story_data=None, background_video_path_2=None, karaoke=False, use_proxies=True, rotate_sections=True, profile=DEFAULT_PROFILE, segments=1, caption_engine=None, variants=None, on_progress=None, delivery_audio_path=None):
     """
     Composes the final video using FFmpeg with combined audio.
     Note: title_voice_path and story_voice_path now point to the same combined audio file.
@@ -370,21 +619,58 @@ def compose_final_video(background_video_path, opening_image_path, title_voice_p
         opening_image_path (str): Path to the opening Reddit post image.
         title_voice_path (str): Path to the combined voiceover audio (same as story_voice_path).
         story_voice_path (str): Path to the combined voiceover audio (same as title_voice_path).
-        captions_path (str): Path to the SRT caption file.
+        captions_path (str): Path to the SRT caption file, or its CaptionTimeline.
         output_path (str): Path for the output video.
         opening_duration (float): Duration to show opening image (default: 3.0 seconds).
         story_data: Story data for timing calculations.
         background_video_path_2 (str): Optional path to the second background video (bottom half).
+        karaoke (bool): Highlight each caption word while it is spoken.
+        use_proxies (bool): Read pre-scaled background proxies instead of the
+                            full-resolution sources (created on first use).
+        rotate_sections (bool): Start each video at the keyframe after the
+                                section of the background used by the last one.
+        profile (str): Render profile: 'draft', 'final' or 'hq'.
+        segments (int): Split the video into this many keyframe-aligned
+                        segments encoded by parallel FFmpeg processes, then
+                        joined without re-encoding (1 = single pass).
+        caption_engine (str): 'ass', 'drawtext' or 'sprites' (default: the
+                              best one this FFmpeg build supports).
+        variants (list): Export variant names ('tiktok', 'reels', 'shorts',
+                         'preview'). The video is composited once and split
+                         to one encoder per variant in the same FFmpeg run.
+        on_progress (callable): Called with frame, fps, speed and position of
+                                each FFmpeg run while it encodes (see
+                                ffmpeg_runner.run_ffmpeg()).
+        delivery_audio_path (str): AAC copy of the voiceover from the
+                                   voiceover step, encoded at the profile's
+                                   audio_bitrate; muxed with -c:a copy
+                                   instead of encoding the MP3 again.
 
     Returns:
-        bool: True if successful, False otherwise.
+        bool: True if successful, False otherwise. With variants, a dict of
+              {variant name: output path} instead of True.
     """
+    encode_allocation = None
+    variant_paths = {}
+    # Caption scripts and segments; removed however the encode ends
+    workspace = ScratchWorkspace(os.path.splitext(os.path.basename(output_path))[0])
     try:
-        # Find FFmpeg executable
-        ffmpeg_path, ffprobe_path = find_ffmpeg_path()
-        if not ffmpeg_path:
+        render_profile = get_render_profile(profile)
+        export_variants = [get_export_variant(name) for name in variants or []]
+        
+        # Find FFmpeg and decide up front what its build can render
+        toolchain = get_toolchain()
+        if not toolchain:
             print("FFmpeg not found. Please install FFmpeg.")
             return False
+        ffmpeg_path, ffprobe_path = toolchain.ffmpeg, toolchain.ffprobe
+        if not toolchain.has_encoder('libx264'):
+            print(f"FFmpeg at {ffmpeg_path} was built without libx264, which the final encode needs.")
+            return False
+        if caption_engine and not toolchain.supports_caption_engine(caption_engine):
+            print(f"Warning: '{caption_engine}' captions are not available here, using the default")
+            caption_engine = None
+        caption_engine = caption_engine or toolchain.caption_engine()
         
         # Get audio duration (both paths point to same file now)
         total_audio_duration = get_audio_duration(title_voice_path)
@@ -393,20 +679,24 @@ def compose_final_video(background_video_path, opening_image_path, title_voice_p
             print("Failed to get audio duration")
             return False
         
-        # Get EXACT title end time by counting words in SRT file
+        # Parse the captions once; every step below reads this timeline
+        captions = load_caption_timeline(captions_path)
+        if karaoke and captions.word_offsets is None:
+            # An SRT only has the caption timing; the words light up at
+            # their own starts if the voiceover's alignment is still there
+            words = load_alignment(story_voice_path)
+            if words:
+                captions.attach_words(words)
+        
+        # Get EXACT title end time by counting words in the captions
         title_end_time = 4.5  # Default fallback
         if story_data:
             try:
-                # Import the exact timing algorithm
-                import sys
-                sys.path.append(os.path.dirname(__file__))
-                from timing_algorithms import get_title_end_time_exact
-                
-                title_end_time = get_title_end_time_exact(captions_path, story_data)
+                title_end_time = get_title_end_time_exact(captions, story_data)
             except Exception as e:
                 print(f"Warning: Exact timing failed, using fallback: {e}")
                 # Fallback to original simple method
-                title_end_time = get_title_end_time(captions_path, story_data)
+                title_end_time = get_title_end_time(captions, story_data)
         
         print(f"🎯 Title reading ends EXACTLY at: {title_end_time:.3f} seconds")
         
@@ -418,164 +708,203 @@ def compose_final_video(background_video_path, opening_image_path, title_voice_p
         print(f"Opening image duration: {actual_opening_duration:.2f} seconds")
         print(f"Background video duration: {background_duration:.2f} seconds")
         
+        # Pick a keyframe-aligned section of each background that lasts for
+        # the whole audio, continuing after the section of the last video
+        background_paths = [path for path in (background_video_path, background_video_path_2) if path]
+        background_offsets = [0.0] * len(background_paths)
+        if rotate_sections:
+            background_offsets = [next_background_offset(ffprobe_path, path, total_audio_duration) for path in background_paths]
+        
+        # Decode the backgrounds from proxies already cropped to their place
+        # in the frame. This runs before the encode slot is taken, since a
+        # missing proxy is built under its own slot.
+        source_paths = list(background_paths)
+        if use_proxies and render_profile['use_proxies']:
+            width, height = HALF_FRAME if background_video_path_2 else FULL_FRAME
+            for i, source_path in enumerate(background_paths):
+                background_paths[i] = get_background_proxy(ffmpeg_path, source_path, width, height, on_progress=on_progress)
+                if background_paths[i] != source_path:
+                    # Proxies have a keyframe on every whole second
+                    background_offsets[i] = float(math.floor(background_offsets[i]))
+        background_video_path = background_paths[0]
+        if background_video_path_2:
+            background_video_path_2 = background_paths[1]
+        
+        for path, offset in zip(background_paths, background_offsets):
+            print(f"Background {os.path.basename(path)} from {offset:.2f}s")
+        
         # Convert paths to use forward slashes for FFmpeg
         background_video_path = background_video_path.replace('\\', '/')
         opening_image_path = opening_image_path.replace('\\', '/')
         combined_voice_path = title_voice_path.replace('\\', '/')  # Use combined audio
+        # The voiceover step already encoded the audio for delivery
+        copy_audio = is_delivery_audio(delivery_audio_path)
+        if copy_audio:
+            combined_voice_path = delivery_audio_path.replace('\\', '/')
+            print("Muxing the AAC voiceover without re-encoding")
         output_path = output_path.replace('\\', '/')
         
         # Handle second background video path if provided
         if background_video_path_2:
             background_video_path_2 = background_video_path_2.replace('\\', '/')
         
-        # Create temp video without subtitles first
-        temp_video = output_path.replace('.mp4', '_temp.mp4')
-        
-        # Prepare FFmpeg command based on whether we have one or two background videos
-        if background_video_path_2:
-            # Step 1: Create video with two stacked background videos
-            cmd1 = [
-                ffmpeg_path, "-y",  # Overwrite output file
-                
-                # Input 0: First background video (top half)
-                "-i", background_video_path,
-                
-                # Input 1: Second background video (bottom half)
-                "-i", background_video_path_2,
-                
-                # Input 2: Reddit post image
-                "-loop", "1", "-i", opening_image_path,
-                
-                # Input 3: Combined audio (full audio track)
-                "-i", combined_voice_path,
-                
-                # Filter complex: stack two background videos and overlay post image
-                "-filter_complex",
-                f"[0:v]scale=1080:960:force_original_aspect_ratio=increase,crop=1080:960[bg1];"
-                f"[1:v]scale=1080:960:force_original_aspect_ratio=increase,crop=1080:960[bg2];"
-                f"[bg1][bg2]vstack=inputs=2[bg_stacked];"
-                f"[2:v]scale=1000:-1:force_original_aspect_ratio=decrease[post];"
-                f"[bg_stacked][post]overlay=(W-w)/2:(H-h)/2:enable='between(t,0,{title_end_time})'[video]",
-                
-                # Map the video and audio
-                "-map", "[video]", "-map", "3:a",
-                
-                # FAST encoding settings - prioritize speed over quality
-                "-c:v", "libx264", 
-                "-preset", "ultrafast",   # Fastest encoding preset
-                "-crf", "23",             # Reasonable quality, much faster
-                "-pix_fmt", "yuv420p",
-                "-movflags", "+faststart",
-                
-                # Audio settings
-                "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
-                
-                # Duration (match total audio duration)
-                "-t", str(total_audio_duration),
-                
-                # Output temp video
-                temp_video
-            ]
+        # Captions only start after the title is read. With libass, all of
+        # them go into one ASS file with the pop-in animation, drawn by a
+        # single filter; other builds get one drawtext filter per caption,
+        # or one overlay of captions pre-rendered with Pillow.
+        caption_filter = ""
+        caption_inputs = []
+        if caption_engine == 'ass':
+            ass_path = workspace.path("captions.ass")
+            caption_count = write_ass_captions(captions, ass_path, title_end_time, karaoke,
+                                               render_profile['width'], render_profile['height'])
+            print(f"Created ASS captions: {caption_count} subtitles starting from {title_end_time:.3f}s")
+            caption_filter = create_ass_filter(ass_path) if caption_count else ""
+        elif caption_engine == 'drawtext':
+            if karaoke:
+                print("Warning: Karaoke captions need libass; this FFmpeg build only has drawtext")
+            caption_filter = create_animated_subtitles_filter(captions, title_end_time, toolchain.font_file,
+                                                              render_profile['scale'])
+            print(f"Created drawtext captions starting from {title_end_time:.3f}s (FFmpeg has no libass)")
+        elif caption_engine == 'sprites':
+            if karaoke:
+                print("Warning: Karaoke captions need libass, caption sprites are drawn in one colour")
+            sprites_path = workspace.path("captions.sprites.txt")
+            caption_count = write_sprite_captions(captions, sprites_path, title_end_time,
+                                                  render_profile['width'], render_profile['height'])
+            print(f"Created caption sprites: {caption_count} subtitles starting from {title_end_time:.3f}s")
+            if caption_count:
+                caption_filter = create_sprite_overlay_filter(render_profile['width'], render_profile['height'])
+                caption_inputs = sprite_inputs(sprites_path)
         else:
-            # Step 1: Create video with single background video (original behavior)
-            cmd1 = [
-                ffmpeg_path, "-y",  # Overwrite output file
-                
-                # Input 0: Background video (main video throughout)
-                "-i", background_video_path,
-                
-                # Input 1: Reddit post image
-                "-loop", "1", "-i", opening_image_path,
-                
-                # Input 2: Combined audio (full audio track)
-                "-i", combined_voice_path,
-                
-                # Filter complex: background video with fast scaling
-                "-filter_complex",
-                f"[0:v]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,setsar=1[bg];"
-                f"[1:v]scale=1000:-1:force_original_aspect_ratio=decrease[post];"
-                f"[bg][post]overlay=(W-w)/2:(H-h)/2:enable='between(t,0,{title_end_time})'[video]",
-                
+            print("Warning: No caption engine available (libass, drawtext with a font or Pillow), rendering without captions")
+        caption_filter = caption_filter or "null"
+        
+        if segments > 1 and export_variants:
+            print("Variant exports are encoded in one pass, not in segments")
+        elif segments > 1:
+            # Segments start on keyframes of the (first) background: every
+            # whole second in proxies, from the background index otherwise
+            keyframes = None
+            if background_paths[0] == source_paths[0]:
+                index = load_background_index(ffprobe_path, source_paths[0])
+                if index:
+                    keyframes = [k - background_offsets[0] for k in index['keyframes']]
+            plan = plan_segments(total_audio_duration, segments, keyframes)
+            if len(plan) > 1:
+                drawtext_args = (captions, title_end_time, toolchain.font_file, render_profile['scale'])
+                return encode_segmented_video(
+                    ffmpeg_path, list(zip([p.replace('\\', '/') for p in background_paths], background_offsets)),
+                    opening_image_path, combined_voice_path, output_path, title_end_time, caption_filter,
+                    drawtext_args if caption_engine == 'drawtext' else None, render_profile, plan, total_audio_duration,
+                    workspace, caption_inputs, on_progress, copy_audio
+                )
+            print("Video is too short to split into segments, encoding in one pass")
+        
+        # Wait for a share of the host's cores, RAM and disk before encoding
+        if export_variants:
+            expected_bytes = sum(estimate_variant_bytes(total_audio_duration, variant, render_profile) for variant in export_variants)
+        else:
+            expected_bytes = estimate_encode_bytes(total_audio_duration, render_profile)
+        encode_allocation = acquire_encode(expected_bytes, os.path.dirname(output_path) or ".")
+        if encode_allocation is None:
+            return False
+        print(f"Encoding '{render_profile['name']}' ({render_profile['width']}x{render_profile['height']}, "
+              f"preset {render_profile['preset']}) with {encode_allocation.threads} thread(s)")
+        
+        # Inputs: background video(s), Reddit post image, combined audio
+        # -ss before -i seeks in the demuxer to the keyframe, nothing before
+        # it is decoded
+        inputs = []
+        for path, offset in zip([background_video_path, background_video_path_2], background_offsets):
+            if offset > 0:
+                inputs += ["-ss", f"{offset:.3f}"]
+            inputs += ["-i", path]
+        inputs += ["-loop", "1", "-i", opening_image_path]
+        inputs += caption_inputs
+        inputs += ["-i", combined_voice_path]
+        image_input = 2 if background_video_path_2 else 1
+        caption_input = image_input + 1 if caption_inputs else None
+        audio_input = image_input + (2 if caption_inputs else 1)
+        
+        filter_complex = build_composition_filter(
+            bool(background_video_path_2), image_input, title_end_time, caption_filter, render_profile,
+            caption_input=caption_input
+        )
+        
+        if export_variants:
+            # Composited once, then split to one encoder per variant
+            variant_filter, outputs, variant_paths = build_variant_outputs(
+                export_variants, render_profile, audio_input, total_audio_duration, encode_allocation, output_path,
+                copy_audio
+            )
+            filter_complex += variant_filter
+        else:
+            outputs = [
                 # Map the video and audio
-                "-map", "[video]", "-map", "2:a",
+                "-map", "[video]", "-map", f"{audio_input}:a",
                 
-                # FAST encoding settings - prioritize speed over quality
-                "-c:v", "libx264", 
-                "-preset", "ultrafast",   # Fastest encoding preset
-                "-crf", "23",             # Reasonable quality, much faster
+                # Video settings
+                "-c:v", "libx264",
+                "-preset", render_profile['preset'],
+                "-crf", str(render_profile['crf']),
                 "-pix_fmt", "yuv420p",
                 "-movflags", "+faststart",
                 
                 # Audio settings
-                "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+                *get_audio_output_args(copy_audio, render_profile['audio_bitrate']),
                 
                 # Duration (match total audio duration)
                 "-t", str(total_audio_duration),
                 
-                # Output temp video
-                temp_video
-            ]
-        
-        print("Running FFmpeg command (Step 1: Video without subtitles)...")
-        print(f"Command: {' '.join(cmd1)}")
-        try:
-            result = subprocess.run(cmd1, capture_output=True, text=True, check=True, timeout=300)  # 5 minute timeout
-            print("Step 1 completed successfully!")
-        except subprocess.TimeoutExpired:
-            print("FFmpeg timed out after 5 minutes - killing process...")
-            return False
-        
-        # Step 2: Add animated subtitles to the video (only after title ends)
-        # Create a modified SRT file that starts from title_end_time
-        temp_srt_path = captions_path.replace('.srt', '_story_only.srt')
-        create_story_only_srt(captions_path, temp_srt_path, title_end_time)
-        
-        # Create animated subtitle filters
-        animated_filter = create_animated_subtitles_filter(temp_srt_path, title_end_time)
-        
-        if animated_filter:
-            # Use drawtext with animations
-            cmd2 = [
-                ffmpeg_path, "-y",
-                "-i", temp_video,
-                "-vf", animated_filter,
-                "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-                "-c:a", "copy",  # Copy audio without re-encoding
-                output_path
-            ]
-        else:
-            # Fallback to simple subtitles if animation fails
-            rel_temp_srt = os.path.relpath(temp_srt_path).replace('\\', '/')
-            cmd2 = [
-                ffmpeg_path, "-y",
-                "-i", temp_video,
-                "-vf", f"subtitles='{rel_temp_srt}':force_style='Fontname=Arial,Fontsize=26,Bold=1,PrimaryColour=&H0000ffff,OutlineColour=&H00000000,Outline=3,Shadow=2,Alignment=2,MarginV=120'",
-                "-c:v", "libx264", "-preset", "medium", "-crf", "23",
-                "-c:a", "copy",  # Copy audio without re-encoding
+                # Thread budget from the resource governor
+                *encode_allocation.ffmpeg_args(),
+                
                 output_path
             ]
         
-        print("Running FFmpeg command (Step 2: Adding animated subtitles)...")
+        # One filter graph and one final-quality encode per output:
+        # background, title overlay and captions are rendered in a single pass
+        cmd = [
+            ffmpeg_path, "-y",  # Overwrite output file
+            *inputs,
+            "-filter_complex", filter_complex,
+            *outputs
+        ]
+        
+        print("Running FFmpeg command (single pass: background, title overlay and captions)...")
+        print(f"Command: {' '.join(cmd)}")
         try:
-            result = subprocess.run(cmd2, capture_output=True, text=True, check=True, timeout=300)  # 5 minute timeout
-        except subprocess.TimeoutExpired:
-            print("FFmpeg subtitle step timed out after 5 minutes - killing process...")
+            with trace_span("ffmpeg compose", "ffmpeg", output=os.path.basename(output_path), duration=total_audio_duration, stacked=bool(background_video_path_2), variants=len(export_variants)) as span:
+                # Killed when it stops making progress or runs far longer
+                # than the video's duration warrants
+                progress = run_ffmpeg(cmd, total_audio_duration, on_progress, label="compose")
+                span['speed'] = progress['speed']
+        except subprocess.TimeoutExpired as e:
+            print(f"FFmpeg timed out - killed. Last output:\n{e.stderr}")
+            for path in variant_paths.values() or [output_path]:
+                remove_partial_output(path)
             return False
         
-        # Clean up temp file
-        if os.path.exists(temp_video):
-            os.remove(temp_video)
-            
         print("Video composition completed successfully!")
+        if export_variants:
+            for name, path in variant_paths.items():
+                print(f"   {name}: {path}")
+            return variant_paths
         return True
         
     except subprocess.CalledProcessError as e:
         print(f"FFmpeg error: {e}")
         print(f"FFmpeg stderr: {e.stderr}")
+        for path in variant_paths.values() or [output_path]:
+            remove_partial_output(path)
         return False
     except Exception as e:
         print(f"Error during video composition: {e}")
         return False
+    finally:
+        release_encode(encode_allocation)
+        workspace.cleanup()
 
 def main(background_video_filename=None, background_video_filename_2=None):
     """
@@ -651,9 +980,9 @@ def main(background_video_filename=None, background_video_filename_2=None):
     if not os.path.exists(exports_dir):
         os.makedirs(exports_dir)
     
-    # Generate output filename
-    timestamp = int(time.time())
-    output_filename = f"final_{timestamp}.mp4"
+    # Name the output after the job ID shared by the caption and voice files
+    job_id = os.path.splitext(os.path.basename(caption_file))[0]
+    output_filename = f"final_{job_id}.mp4"
     output_path = os.path.join(exports_dir, output_filename)
     
     print("Composing final video with separate title and story audio...")
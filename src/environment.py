@@ -0,0 +1,32 @@
+import threading
+
+_environment_loaded = None
+_environment_lock = threading.Lock()
+
+def load_environment():
+    """
+    Loads the .env file into os.environ, once per process.
+
+    Call it before reading API keys. Later calls return immediately, so
+    functions that need a key can call it on every run. Child processes
+    inherit the loaded variables through os.environ.
+
+    Returns:
+        bool: True if python-dotenv was available to load the file.
+    """
+    global _environment_loaded
+
+    with _environment_lock:
+        if _environment_loaded is not None:
+            return _environment_loaded
+
+        try:
+            from dotenv import load_dotenv
+        except ImportError:
+            # Keys set in the shell environment still work
+            _environment_loaded = False
+            return False
+
+        load_dotenv()
+        _environment_loaded = True
+        return True
@@ -0,0 +1,94 @@
+import os
+
+# Platform exports made from one composition. Each variant is scaled from
+# the composited frame, capped to the platform's bitrate and trimmed to its
+# maximum duration; None means no trim.
+EXPORT_VARIANTS = {
+    'tiktok': {
+        'width': 1080,
+        'height': 1920,
+        'max_bitrate': "8M",
+        'max_duration': 600,
+        'audio_bitrate': "128k",
+        'container': "mp4"
+    },
+    'reels': {
+        'width': 1080,
+        'height': 1920,
+        'max_bitrate': "6M",
+        'max_duration': 90,
+        'audio_bitrate': "128k",
+        'container': "mp4"
+    },
+    'shorts': {
+        'width': 1080,
+        'height': 1920,
+        'max_bitrate': "10M",
+        'max_duration': 180,
+        'audio_bitrate': "192k",
+        'container': "mp4"
+    },
+    # Small copy for previews and review links
+    'preview': {
+        'width': 720,
+        'height': 1280,
+        'max_bitrate': "2M",
+        'max_duration': None,
+        'audio_bitrate': "96k",
+        'container': "mp4"
+    }
+}
+
+# Containers the variants can be written to, with their muxer options
+CONTAINER_OPTIONS = {
+    'mp4': ["-movflags", "+faststart"],
+    'mov': ["-movflags", "+faststart"],
+    'mkv': []
+}
+
+def get_export_variant(name):
+    """
+    Get the settings of an export variant.
+
+    Args:
+        name (str): 'tiktok', 'reels', 'shorts' or 'preview'.
+
+    Returns:
+        dict: The variant settings with its 'name'.
+
+    Raises:
+        ValueError: If there is no variant with that name.
+    """
+    if name not in EXPORT_VARIANTS:
+        raise ValueError(f"unknown export variant '{name}' (choose from {', '.join(EXPORT_VARIANTS)})")
+    return dict(EXPORT_VARIANTS[name], name=name)
+
+def parse_variant_names(value):
+    """
+    Parse a comma-separated list of variant names, e.g. "tiktok,preview".
+
+    Returns:
+        list: Variant names in the given order, without duplicates.
+
+    Raises:
+        ValueError: If a name is not a known variant.
+    """
+    names = []
+    for name in (part.strip() for part in value.split(',')):
+        if not name or name in names:
+            continue
+        get_export_variant(name)
+        names.append(name)
+    return names
+
+def get_variant_path(output_path, variant):
+    """Output file of a variant: the output name with the variant as suffix."""
+    stem = os.path.splitext(output_path)[0]
+    return f"{stem}_{variant['name']}.{variant['container']}"
+
+def bitrate_to_bits(bitrate):
+    """Convert an FFmpeg bitrate such as "6M" or "128k" to bits per second."""
+    multipliers = {'k': 1_000, 'M': 1_000_000}
+    if bitrate[-1] in multipliers:
+        return float(bitrate[:-1]) * multipliers[bitrate[-1]]
+    return float(bitrate)
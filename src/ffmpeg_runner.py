@@ -0,0 +1,168 @@
+import subprocess
+import threading
+import time
+from collections import deque
+
+# An encode is killed when FFmpeg reports no new frames for this long
+STALL_TIMEOUT = 60.0
+
+# Overall limit: the expected duration at this fraction of real time (the
+# slowest speed a healthy encode runs at), but never less than MIN_TIMEOUT
+MIN_SPEED = 0.1
+MIN_TIMEOUT = 300.0
+
+# Lines of stderr kept for error reports
+STDERR_TAIL_LINES = 40
+
+def parse_progress_time(value):
+    """Convert an out_time_us / out_time_ms value (microseconds) to seconds."""
+    try:
+        return int(value) / 1_000_000
+    except (TypeError, ValueError):
+        return None
+
+def parse_progress_speed(value):
+    """Convert a speed such as "1.85x" to a float, or None if not known yet."""
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+def get_timeout(expected_duration):
+    """Overall timeout of an encode of `expected_duration` seconds of video."""
+    if not expected_duration:
+        return None
+    return max(MIN_TIMEOUT, expected_duration / MIN_SPEED)
+
+def run_ffmpeg(cmd, expected_duration=None, on_progress=None, label="ffmpeg", stall_timeout=STALL_TIMEOUT, timeout=None):
+    """
+    Run an FFmpeg command with `-progress pipe:1` and follow the encode as
+    it runs. Progress blocks (frame, fps, speed, out_time) are parsed as they
+    arrive and passed to `on_progress`; only the last lines of stderr are kept.
+
+    The process is killed if it reports no progress for `stall_timeout`
+    seconds, or when it runs longer than `timeout` (default: scaled to the
+    expected duration, see get_timeout()).
+
+    Args:
+        cmd (list): FFmpeg command (executable first).
+        expected_duration (float): Seconds of video the command writes, for
+                                   the percentage and the default timeout.
+        on_progress (callable): Called with a progress dict ('label',
+                                'frame', 'fps', 'speed', 'out_time',
+                                'percent', 'elapsed', 'done') after each block.
+        label (str): Name of the encode in the progress dicts.
+        stall_timeout (float): Seconds without progress before the encode is killed.
+        timeout (float): Overall limit in seconds.
+
+    Returns:
+        dict: The last progress dict.
+
+    Raises:
+        subprocess.TimeoutExpired: If the encode stalled or ran too long
+                                   (with the stderr tail as `stderr`).
+        subprocess.CalledProcessError: If FFmpeg failed (with the stderr tail).
+    """
+    timeout = timeout or get_timeout(expected_duration)
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    started = time.monotonic()
+    state = {'last_change': started, 'position': None}
+    progress = {
+        'label': label, 'frame': 0, 'fps': None, 'speed': None, 'out_time': 0.0,
+        'percent': None, 'elapsed': 0.0, 'done': False
+    }
+
+    def report(block):
+        frame = int(block.get('frame', progress['frame']) or 0)
+        out_time = parse_progress_time(block.get('out_time_us', block.get('out_time_ms')))
+        position = (frame, out_time)
+        if position != state['position']:
+            state['position'] = position
+            state['last_change'] = time.monotonic()
+        progress.update({
+            'frame': frame,
+            'fps': float(block['fps']) if block.get('fps', 'N/A') != 'N/A' else progress['fps'],
+            'speed': parse_progress_speed(block.get('speed')) or progress['speed'],
+            'out_time': out_time if out_time is not None else progress['out_time'],
+            'elapsed': time.monotonic() - started,
+            'done': block.get('progress') == 'end'
+        })
+        if expected_duration:
+            progress['percent'] = min(100.0, progress['out_time'] / expected_duration * 100)
+        if on_progress:
+            try:
+                on_progress(dict(progress))
+            except Exception as e:
+                print(f"Progress callback failed: {e}")
+
+    def read_progress(stream):
+        block = {}
+        for line in stream:
+            key, _, value = line.strip().partition('=')
+            block[key] = value
+            # Each block ends with progress=continue (or =end)
+            if key == 'progress':
+                report(block)
+                block = {}
+
+    def read_stderr(stream):
+        for line in stream:
+            stderr_tail.append(line.rstrip())
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               encoding='utf-8', errors='replace')
+    readers = [
+        threading.Thread(target=read_progress, args=(process.stdout,), daemon=True),
+        threading.Thread(target=read_stderr, args=(process.stderr,), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+
+    reason = None
+    while process.poll() is None:
+        now = time.monotonic()
+        if now - state['last_change'] > stall_timeout:
+            reason = f"no progress for {stall_timeout:.0f}s"
+        elif timeout and now - started > timeout:
+            reason = f"still running after {timeout:.0f}s"
+        if reason:
+            process.kill()
+            break
+        time.sleep(0.5)
+
+    process.wait()
+    for reader in readers:
+        reader.join(timeout=5)
+
+    stderr = '\n'.join(stderr_tail)
+    if reason:
+        print(f"FFmpeg ({label}) killed: {reason}")
+        raise subprocess.TimeoutExpired(cmd, timeout or stall_timeout, stderr=stderr)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+    return progress
+
+def progress_printer(prefix="", interval=5.0):
+    """
+    Progress callback for the CLI: prints the position, speed and frame rate
+    of the encode at most every `interval` seconds, and once at the end.
+
+    Returns:
+        callable: Callback for run_ffmpeg(on_progress=...).
+    """
+    last_printed = {}
+
+    def print_progress(progress):
+        now = time.monotonic()
+        if not progress['done'] and now - last_printed.get(progress['label'], 0.0) < interval:
+            return
+        last_printed[progress['label']] = now
+        position = f"{progress['out_time']:.1f}s"
+        if progress['percent'] is not None:
+            position = f"{progress['percent']:.0f}% ({position})"
+        speed = f"{progress['speed']:.2f}x" if progress['speed'] else "?x"
+        fps = f"{progress['fps']:.0f} fps" if progress['fps'] else "? fps"
+        print(f"⏩ {prefix}{progress['label']}: {position}, {speed}, {fps}")
+
+    return print_progress
@@ -1,16 +1,11 @@
 import os
 import json
-import re
-from elevenlabs.client import ElevenLabs
-from dotenv import load_dotenv
-import time
-import sys
-
-# Add src directory to path for imports
-sys.path.append(os.path.dirname(__file__))
+from api_clients import get_elevenlabs_client
 from cache_manager import get_story_cache_key, get_cache_paths, cache_exists, copy_from_cache, save_to_cache
-
-load_dotenv()
+from environment import load_environment
+from tracing import trace_span
+from caption_timeline import CaptionTimeline, load_caption_timeline
+from voice_alignment import load_alignment, save_alignment, get_alignment_path
 
 def get_latest_story_file():
     """
@@ -52,26 +47,104 @@ def get_latest_voice_file():
 
     return max(files, key=os.path.getctime)
 
-def format_srt_time(seconds):
+def create_alignment_client(api_key):
     """
-    Formats seconds into SRT time format (HH:MM:SS,mmm).
+    Gets the ElevenLabs client used for forced alignment (shared with the
+    voiceover step, see api_clients).
 
     Args:
-        seconds (float): Time in seconds.
+        api_key (str): ElevenLabs API key.
+
+    Returns:
+        ElevenLabs: The client.
+    """
+    return get_elevenlabs_client(api_key)
+
+def align_with_elevenlabs(voice_file_path, full_text):
+    """
+    Get word timings of a voiceover with ElevenLabs forced alignment, which
+    uploads the audio. Used when the TTS provider returned no timestamps.
 
     Returns:
-        str: Formatted time string.
+        list: {'word', 'start', 'end'} dicts, or None if failed.
     """
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    milliseconds = int((seconds % 1) * 1000)
+    load_environment()
+    api_key = os.environ.get("ELEVENLABS_API_KEY")
+    if not api_key:
+        print("Error: ELEVENLABS_API_KEY environment variable not set.")
+        return None
     
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
+    try:
+        elevenlabs = create_alignment_client(api_key)
+    except ImportError as e:
+        print(f"Error: ElevenLabs SDK not available: {e}")
+        return None
+    
+    # Read the audio file
+    with open(voice_file_path, 'rb') as audio_file:
+        # Use ElevenLabs forced alignment
+        print("Running forced alignment with ElevenLabs...")
+        with trace_span("ElevenLabs forced_alignment", "alignment", characters=len(full_text)):
+            alignment_result = elevenlabs.forced_alignment.create(
+                file=audio_file,
+                text=full_text
+            )
+    
+    # Extract word-level timing information
+    words_with_timing = []
+    
+    
+    # Try different possible attribute names for the response
+    if hasattr(alignment_result, 'words'):
+        words_data = alignment_result.words
+    elif hasattr(alignment_result, 'word_alignments'):
+        words_data = alignment_result.word_alignments
+    else:
+        raise AttributeError("Cannot find words data in alignment result")
+    
+    for word_info in words_data:
+        
+        
+        # Try different possible attribute names
+        word_text = None
+        start_time = None
+        end_time = None
+        
+        # Try to get word text
+        for attr in ['word', 'text', 'token', 'content']:
+            if hasattr(word_info, attr):
+                word_text = getattr(word_info, attr)
+                break
+        
+        # Try to get start time
+        for attr in ['start_time_seconds', 'start_time', 'start', 'begin']:
+            if hasattr(word_info, attr):
+                start_time = getattr(word_info, attr)
+                break
+        
+        # Try to get end time
+        for attr in ['end_time_seconds', 'end_time', 'end', 'finish']:
+            if hasattr(word_info, attr):
+                end_time = getattr(word_info, attr)
+                break
+        
+        if word_text and start_time is not None and end_time is not None:
+            words_with_timing.append({
+                'word': word_text,
+                'start': start_time,
+                'end': end_time
+            })
+        else:
+            print(f"Debug: Missing data - word: {word_text}, start: {start_time}, end: {end_time}")
+            print(f"Debug: Available attributes: {[attr for attr in dir(word_info) if not attr.startswith('_')]}")
+            break
+    
+    return words_with_timing
 
 def generate_captions(story_data, voice_file_path, words_per_chunk=4):
     """
-    Generates timed captions for a story using ElevenLabs forced alignment.
+    Generates timed captions for a story from the word timings stored with
+    the voiceover, or with ElevenLabs forced alignment if there are none.
 
     Args:
         story_data (dict): The story data containing the text.
@@ -80,7 +153,8 @@ def generate_captions(story_data, voice_file_path, words_per_chunk=4):
                               Use 1-2 for minimal text, 3-4 for balanced, 5-8 for more text.
 
     Returns:
-        str: Path to the generated SRT file.
+        CaptionTimeline: The captions, also saved as an SRT file (its
+                         `path`), or None if failed.
     """
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -103,79 +177,30 @@ def generate_captions(story_data, voice_file_path, words_per_chunk=4):
         print(f"🎯 Using cached captions file...")
         if copy_from_cache(cache_path, srt_path):
             print(f"✅ Cached captions copied to {srt_path}")
-            return srt_path
+            timeline = load_caption_timeline(srt_path)
+            words = load_alignment(voice_file_path)
+            if words:
+                timeline.attach_words(words)
+            return timeline
         else:
             print("⚠️  Failed to copy from cache, generating new captions...")
     
-    # Initialize ElevenLabs client
-    api_key = os.environ.get("ELEVENLABS_API_KEY")
-    if not api_key:
-        print("Error: ELEVENLABS_API_KEY environment variable not set.")
-        return None
-    
-    elevenlabs = ElevenLabs(api_key=api_key)
-    
     # Combine title and story for alignment
     full_text = f"{story_data['title']}. {story_data['story']}"
     
     try:
-        # Read the audio file
-        with open(voice_file_path, 'rb') as audio_file:
-            # Use ElevenLabs forced alignment
-            print("Running forced alignment with ElevenLabs...")
-            alignment_result = elevenlabs.forced_alignment.create(
-                file=audio_file,
-                text=full_text
-            )
-        
-        # Extract word-level timing information
-        words_with_timing = []
-        
-        
-        # Try different possible attribute names for the response
-        if hasattr(alignment_result, 'words'):
-            words_data = alignment_result.words
-        elif hasattr(alignment_result, 'word_alignments'):
-            words_data = alignment_result.word_alignments
+        # Timings returned by the TTS call together with the audio; no
+        # network round trip needed
+        words_with_timing = load_alignment(voice_file_path)
+        if words_with_timing:
+            print("Using the word timings stored with the voiceover")
         else:
-            raise AttributeError("Cannot find words data in alignment result")
-        
-        for word_info in words_data:
-            
-            
-            # Try different possible attribute names
-            word_text = None
-            start_time = None
-            end_time = None
-            
-            # Try to get word text
-            for attr in ['word', 'text', 'token', 'content']:
-                if hasattr(word_info, attr):
-                    word_text = getattr(word_info, attr)
-                    break
-            
-            # Try to get start time
-            for attr in ['start_time_seconds', 'start_time', 'start', 'begin']:
-                if hasattr(word_info, attr):
-                    start_time = getattr(word_info, attr)
-                    break
-            
-            # Try to get end time
-            for attr in ['end_time_seconds', 'end_time', 'end', 'finish']:
-                if hasattr(word_info, attr):
-                    end_time = getattr(word_info, attr)
-                    break
-            
-            if word_text and start_time is not None and end_time is not None:
-                words_with_timing.append({
-                    'word': word_text,
-                    'start': start_time,
-                    'end': end_time
-                })
-            else:
-                print(f"Debug: Missing data - word: {word_text}, start: {start_time}, end: {end_time}")
-                print(f"Debug: Available attributes: {[attr for attr in dir(word_info) if not attr.startswith('_')]}")
-                break
+            words_with_timing = align_with_elevenlabs(voice_file_path, full_text)
+            if words_with_timing is None:
+                return None
+            # Kept next to the voiceover, so karaoke captions of a resumed
+            # encode still get the word timing
+            save_alignment(get_alignment_path(voice_file_path), words_with_timing, "forced-alignment")
         
         print(f"Aligned {len(words_with_timing)} words")
         
@@ -199,26 +224,20 @@ def generate_captions(story_data, voice_file_path, words_per_chunk=4):
                 })
                 current_chunk = {'words': [], 'start': None, 'end': None}
         
-        # Generate SRT content
-        srt_content = []
-        for i, chunk in enumerate(chunks):
-            srt_content.append(f"{i + 1}")
-            srt_content.append(f"{format_srt_time(chunk['start'])} --> {format_srt_time(chunk['end'])}")
-            srt_content.append(chunk['text'])
-            srt_content.append("")  # Empty line between entries
-        
-        # Write SRT file
-        with open(srt_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(srt_content))
+        # The timeline is kept in memory for the later steps and written as
+        # SRT for the cache and for resumed or separate encode processes
+        timeline = CaptionTimeline.from_chunks(chunks)
+        timeline.attach_words(words_with_timing)
+        timeline.to_srt(srt_path)
         
         print(f"Captions generated: {srt_path}")
-        print(f"Total duration: {chunks[-1]['end']:.2f} seconds")
-        print(f"Number of caption chunks: {len(chunks)}")
+        print(f"Total duration: {timeline.duration():.2f} seconds")
+        print(f"Number of caption chunks: {len(timeline)}")
         
         # Save to cache
         save_to_cache(srt_path, cache_path)
         
-        return srt_path
+        return timeline
         
     except Exception as e:
         print(f"Error during forced alignment: {e}")
@@ -255,10 +274,10 @@ def main():
     words_per_chunk = 2  # Change this: 1=single word, 2=minimal, 3-4=balanced, 5-8=more text
     print(f"Generating captions with {words_per_chunk} words per chunk...")
     
-    captions_path = generate_captions(story_data, voice_file, words_per_chunk=words_per_chunk)
+    captions = generate_captions(story_data, voice_file, words_per_chunk=words_per_chunk)
     
-    if captions_path:
-        print(f"Success! Captions saved to: {captions_path}")
+    if captions:
+        print(f"Success! Captions saved to: {captions.path}")
     else:
         print("Failed to generate captions.")
 
@@ -1,6 +1,5 @@
 
 import json
-import time
 import os
 
 def generate_story():
@@ -29,8 +28,8 @@ if __name__ == "__main__":
         os.makedirs("stories")
 
     # Save the story to a JSON file
-    timestamp = int(time.time())
-    file_path = os.path.join("stories", f"{timestamp}.json")
+    from cache_manager import generate_job_id
+    file_path = os.path.join("stories", f"{generate_job_id(story_data)}.json")
     with open(file_path, "w") as f:
         json.dump(story_data, f, indent=4)
 
@@ -1,16 +1,21 @@
 
 import os
 import json
-from elevenlabs.client import ElevenLabs
-from dotenv import load_dotenv
-import time
-import sys
+import shutil
+import base64
+import subprocess
+import uuid
+from api_clients import get_elevenlabs_client, get_openai_client
+from cache_manager import get_story_cache_key, get_cache_paths, cache_exists, copy_from_cache, save_to_cache, generate_job_id
+from environment import load_environment
+from tracing import trace_span
+from scratch_workspace import ScratchWorkspace
+from voice_alignment import get_alignment_path, words_from_characters, save_alignment
+from render_profiles import get_render_profile, DEFAULT_PROFILE
 
-# Add src directory to path for imports
-sys.path.append(os.path.dirname(__file__))
-from cache_manager import get_story_cache_key, get_cache_paths, cache_exists, copy_from_cache, save_to_cache
-
-load_dotenv()
+# The voiceover is transcoded to AAC once per story and bitrate; every
+# render then muxes it with -c:a copy
+DELIVERY_SAMPLE_RATE = 44100
 
 def get_latest_story_file():
     """
@@ -32,16 +37,22 @@ def get_latest_story_file():
 
     return max(files, key=os.path.getctime)
 
-def generate_voiceover(story_data):
+def generate_voiceover(story_data, job_id=None, audio_bitrate=None):
     """
     Generates voiceovers from a story using available TTS services.
     Creates a combined audio file with fallback support.
 
     Args:
         story_data (dict): The story to generate voiceovers for.
+        job_id (str): ID of the video, used as the file name. Generated if not given.
+        audio_bitrate (str): Bitrate of the delivery AAC, the render profile's
+                             audio_bitrate (default: that of the default profile).
     
     Returns:
-        dict: Paths to generated audio files or None if error.
+        dict: Paths to generated audio files or None if error. 'delivery' is
+              the AAC copy of the voiceover, when FFmpeg could create it;
+              'alignment' the word timings returned with the audio, when
+              the provider supports timestamps.
     """
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -49,30 +60,42 @@ def generate_voiceover(story_data):
     if not os.path.exists(voices_dir):
         os.makedirs(voices_dir)
 
-    timestamp = int(time.time())
-    combined_path = os.path.join(voices_dir, f"{timestamp}.mp3")
+    if job_id is None:
+        job_id = generate_job_id(story_data)
+    audio_bitrate = audio_bitrate or get_render_profile(DEFAULT_PROFILE)['audio_bitrate']
+    combined_path = os.path.join(voices_dir, f"{job_id}.mp3")
     
     # Check cache first
     cache_key = get_story_cache_key(story_data)
     cache_path = get_cache_paths(project_root, cache_key, "audio")
+    alignment_cache_path = get_cache_paths(project_root, cache_key, "alignment")
+    # Timings of an earlier attempt never belong to the new audio
+    alignment_path = get_alignment_path(combined_path)
+    if os.path.exists(alignment_path):
+        os.remove(alignment_path)
     
     if cache_exists(cache_path):
         print(f"🎯 Using cached audio file...")
         if copy_from_cache(cache_path, combined_path):
             print(f"✅ Cached voiceover copied to {combined_path}")
-            return create_result_paths(combined_path)
+            if cache_exists(alignment_cache_path):
+                copy_from_cache(alignment_cache_path, alignment_path)
+            return create_result_paths(combined_path, prepare_delivery_audio(combined_path, cache_key, project_root, audio_bitrate))
         else:
             print("⚠️  Failed to copy from cache, generating new audio...")
     
     combined_text = f"{story_data['title']}. {story_data['story']}"
     
     # Try ElevenLabs first
+    load_environment()
     api_key = os.environ.get("ELEVENLABS_API_KEY")
     if api_key:
         if generate_elevenlabs_tts(combined_text, combined_path, api_key):
             # Save to cache
             save_to_cache(combined_path, cache_path)
-            return create_result_paths(combined_path)
+            if os.path.exists(alignment_path):
+                save_to_cache(alignment_path, alignment_cache_path)
+            return create_result_paths(combined_path, prepare_delivery_audio(combined_path, cache_key, project_root, audio_bitrate))
     
     # Try OpenAI TTS as fallback
     openai_key = os.environ.get("OPENAI_API_KEY")
@@ -81,52 +104,91 @@ def generate_voiceover(story_data):
         if generate_openai_tts(combined_text, combined_path, openai_key):
             # Save to cache
             save_to_cache(combined_path, cache_path)
-            return create_result_paths(combined_path)
+            return create_result_paths(combined_path, prepare_delivery_audio(combined_path, cache_key, project_root, audio_bitrate))
     
     # Use offline fallback (test tone)
     print("All TTS services failed, using offline test audio...")
     if generate_offline_tts(combined_text, combined_path):
         # Save to cache
         save_to_cache(combined_path, cache_path)
-        return create_result_paths(combined_path)
+        return create_result_paths(combined_path, prepare_delivery_audio(combined_path, cache_key, project_root, audio_bitrate))
     
     return None
 
 def generate_elevenlabs_tts(text, output_path, api_key):
-    """Generate TTS using ElevenLabs API."""
+    """
+    Generate TTS using ElevenLabs API. The audio is requested with
+    timestamps, so the character alignment comes back in the same call and
+    is saved next to the voiceover; captions then need no forced alignment.
+    """
     try:
         print("Generating voiceover with ElevenLabs...")
-        elevenlabs = ElevenLabs(api_key=api_key)
+        elevenlabs = get_elevenlabs_client(api_key)
         
-        audio = elevenlabs.text_to_speech.convert(
-            text=text,
-            voice_id="JBFqnCBsd6RMkjVDRZzb",
-            model_id="eleven_multilingual_v2",
-        )
-        with open(output_path, "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
+        with trace_span("ElevenLabs text_to_speech", "tts", characters=len(text)) as span:
+            try:
+                response = elevenlabs.text_to_speech.convert_with_timestamps(
+                    text=text,
+                    voice_id="JBFqnCBsd6RMkjVDRZzb",
+                    model_id="eleven_multilingual_v2",
+                )
+            except AttributeError:
+                # SDK without timestamps: audio only, captions use forced alignment
+                response = None
+            
+            if response is None:
+                span['timestamps'] = False
+                audio = elevenlabs.text_to_speech.convert(
+                    text=text,
+                    voice_id="JBFqnCBsd6RMkjVDRZzb",
+                    model_id="eleven_multilingual_v2",
+                )
+                with open(output_path, "wb") as f:
+                    for chunk in audio:
+                        f.write(chunk)
+            else:
+                span['timestamps'] = True
+                with open(output_path, "wb") as f:
+                    f.write(base64.b64decode(response.audio_base_64))
+                save_elevenlabs_alignment(response, output_path)
         print(f"ElevenLabs voiceover saved to {output_path}")
         return True
     except Exception as e:
         print(f"ElevenLabs TTS error: {e}")
         return False
 
+def save_elevenlabs_alignment(response, output_path):
+    """
+    Save the word timings of a convert_with_timestamps response next to the
+    voiceover. The alignment of the original text is preferred over the
+    normalized one, since captions show the original words.
+    """
+    alignment = getattr(response, 'alignment', None) or getattr(response, 'normalized_alignment', None)
+    if alignment is None:
+        print("⚠️  ElevenLabs returned no alignment, captions will use forced alignment")
+        return
+    words = words_from_characters(
+        alignment.characters,
+        alignment.character_start_times_seconds,
+        alignment.character_end_times_seconds
+    )
+    save_alignment(get_alignment_path(output_path), words, "elevenlabs")
+    print(f"Saved timings of {len(words)} words")
+
 def generate_openai_tts(text, output_path, api_key):
     """Generate TTS using OpenAI API."""
     try:
-        from openai import OpenAI
-        
         print("Generating voiceover with OpenAI...")
-        client = OpenAI(api_key=api_key)
-        
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text
-        )
+        client = get_openai_client(api_key)
         
-        response.stream_to_file(output_path)
+        with trace_span("OpenAI audio.speech", "tts", characters=len(text)):
+            response = client.audio.speech.create(
+                model="tts-1",
+                voice="alloy",
+                input=text
+            )
+            
+            response.stream_to_file(output_path)
         print(f"OpenAI voiceover saved to {output_path}")
         return True
     except Exception as e:
@@ -153,32 +215,32 @@ def generate_offline_tts(text, output_path):
             sample = math.sin(2 * math.pi * frequency * i / sample_rate)
             frames.append(struct.pack('<h', int(sample * 32767)))
         
-        # Write WAV file first
-        wav_path = output_path.replace('.mp3', '.wav')
-        with wave.open(wav_path, 'wb') as wav_file:
-            wav_file.setnchannels(1)
-            wav_file.setsampwidth(2)
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(b''.join(frames))
-        
-        # Convert to MP3 if possible
-        try:
-            from compose_video import find_ffmpeg_path
-            ffmpeg_path, _ = find_ffmpeg_path()
-            if ffmpeg_path:
-                import subprocess
-                subprocess.run([
-                    ffmpeg_path, "-y", "-i", wav_path,
-                    "-c:a", "mp3", "-b:a", "128k", output_path
-                ], capture_output=True, check=True)
-                os.remove(wav_path)
-            else:
-                # Just rename WAV to MP3 if no ffmpeg
-                os.rename(wav_path, output_path)
-        except:
-            # Fallback: rename WAV to MP3
-            if os.path.exists(wav_path):
-                os.rename(wav_path, output_path)
+        # Write WAV file first, in the scratch workspace
+        with ScratchWorkspace("offline-tts") as workspace:
+            wav_path = workspace.path("tone.wav", len(frames) * 2 + 44)
+            with wave.open(wav_path, 'wb') as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(b''.join(frames))
+            
+            # Convert to MP3 if possible
+            try:
+                from toolchain import find_ffmpeg_path
+                ffmpeg_path, _ = find_ffmpeg_path()
+                if ffmpeg_path:
+                    import subprocess
+                    subprocess.run([
+                        ffmpeg_path, "-y", "-i", wav_path,
+                        "-c:a", "mp3", "-b:a", "128k", output_path
+                    ], capture_output=True, check=True)
+                else:
+                    # Just move WAV to MP3 if no ffmpeg
+                    shutil.move(wav_path, output_path)
+            except:
+                # Fallback: move WAV to MP3
+                if os.path.exists(wav_path):
+                    shutil.move(wav_path, output_path)
         
         print(f"Test audio saved to {output_path}")
         return True
@@ -186,13 +248,64 @@ def generate_offline_tts(text, output_path):
         print(f"Offline TTS error: {e}")
         return False
 
-def create_result_paths(combined_path):
+def prepare_delivery_audio(combined_path, cache_key, project_root, audio_bitrate):
+    """
+    Get the delivery-ready AAC (.m4a) copy of a voiceover, transcoding the
+    MP3 only if the story has no cached copy at this bitrate yet. Compositions
+    mux it with -c:a copy instead of encoding the voiceover on every render.
+
+    Args:
+        combined_path (str): The MP3 voiceover.
+        cache_key (str): Story cache key.
+        project_root (str): Project directory (holds .cache/).
+        audio_bitrate (str): AAC bitrate, from the render profile.
+
+    Returns:
+        str: Path to the .m4a next to the MP3, or None if FFmpeg is missing
+             or the transcode failed (compositions then encode the MP3).
+    """
+    delivery_path = os.path.splitext(combined_path)[0] + ".m4a"
+    cache_path = get_cache_paths(project_root, f"{cache_key}_{audio_bitrate}", "delivery_audio")
+    if cache_exists(cache_path) and copy_from_cache(cache_path, delivery_path):
+        return delivery_path
+
+    from toolchain import find_ffmpeg_path
+    ffmpeg_path, _ = find_ffmpeg_path()
+    if not ffmpeg_path:
+        return None
+
+    temp_path = f"{os.path.splitext(delivery_path)[0]}.{uuid.uuid4().hex[:8]}.tmp.m4a"
+    try:
+        with trace_span("ffmpeg delivery audio", "ffmpeg", output=os.path.basename(delivery_path)):
+            subprocess.run([
+                ffmpeg_path, "-y", "-i", combined_path,
+                "-vn", "-c:a", "aac", "-b:a", audio_bitrate, "-ar", str(DELIVERY_SAMPLE_RATE),
+                "-movflags", "+faststart",
+                temp_path
+            ], capture_output=True, text=True, check=True, timeout=300)
+        os.replace(temp_path, delivery_path)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        print(f"⚠️  Could not create the AAC voiceover, renders will encode the MP3: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return None
+
+    save_to_cache(delivery_path, cache_path)
+    return delivery_path
+
+def create_result_paths(combined_path, delivery_path=None):
     """Create result dictionary with all paths pointing to the same file."""
-    return {
+    paths = {
         'title': combined_path,
         'story': combined_path,
         'combined': combined_path
     }
+    if delivery_path:
+        paths['delivery'] = delivery_path
+    alignment_path = get_alignment_path(combined_path)
+    if os.path.exists(alignment_path):
+        paths['alignment'] = alignment_path
+    return paths
 
 if __name__ == "__main__":
     latest_story_file = get_latest_story_file()
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import threading
+
+from cache_manager import get_content_hash
+
+# Job keys that are needed to continue a job in a new process
+PERSISTED_JOB_KEYS = [
+    'job_id', 'video_number', 'total_videos', 'background_video_path',
+    'background_video_path_2', 'words_per_chunk', 'karaoke', 'profile', 'segments', 'caption_engine', 'variants', 'story_data', 'story_file_path'
+]
+
+# Steps of the same job can finish at the same time in different threads
+_manifest_lock = threading.Lock()
+
+def get_jobs_dir():
+    """
+    Gets the directory holding the job manifests, creating it if needed.
+
+    Returns:
+        str: Path to the 'jobs' directory.
+    """
+    jobs_dir = "jobs"
+    if not os.path.exists(jobs_dir):
+        os.makedirs(jobs_dir, exist_ok=True)
+    return jobs_dir
+
+def get_manifest_path(job_id):
+    """Get the manifest path for a job ID."""
+    return os.path.join(get_jobs_dir(), f"{job_id}.json")
+
+def load_manifest(manifest_path):
+    """
+    Load a job manifest.
+
+    Returns:
+        dict: The manifest, or None if it does not exist or is unreadable.
+    """
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def _write_manifest(manifest_path, manifest):
+    """Write the manifest atomically so a killed process never leaves half a file."""
+    manifest['updated_at'] = time.time()
+    temp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, manifest_path)
+
+def create_manifest(job):
+    """
+    Create the manifest for a job once its story exists.
+
+    Args:
+        job (dict): Job dict with at least 'job_id' and 'story_data'.
+
+    Returns:
+        str: Path to the manifest.
+    """
+    manifest_path = get_manifest_path(job['job_id'])
+    manifest = {
+        'job_id': job['job_id'],
+        'status': 'running',
+        'created_at': time.time(),
+        'job': {key: job.get(key) for key in PERSISTED_JOB_KEYS},
+        'steps': {}
+    }
+    with _manifest_lock:
+        _write_manifest(manifest_path, manifest)
+    return manifest_path
+
+def compute_input_hash(job, keys, extra=None):
+    """
+    Hash the job values a step depends on.
+
+    Args:
+        job (dict): The job dict.
+        keys (list): Job keys the step reads.
+        extra (dict): Additional parameters that affect the step output.
+
+    Returns:
+        str: Short content hash.
+    """
+    inputs = {key: job.get(key) for key in keys}
+    if extra:
+        inputs.update(extra)
+    return get_content_hash(json.dumps(inputs, sort_keys=True, default=str))
+
+def _output_files(output):
+    """List the file paths contained in a step output (str or dict of str)."""
+    if isinstance(output, str):
+        return [output]
+    if isinstance(output, dict):
+        return [value for value in output.values() if isinstance(value, str)]
+    return []
+
+def get_completed_output(manifest_path, step_key, input_hash):
+    """
+    Get the recorded output of a step if it can be reused.
+
+    A step counts as finished only if it was recorded with the same input
+    hash and all of its output files still exist.
+
+    Returns:
+        The recorded output, or None if the step has to run.
+    """
+    if not manifest_path:
+        return None
+
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        return None
+
+    step = manifest.get('steps', {}).get(step_key)
+    if not step or step.get('input_hash') != input_hash:
+        return None
+
+    output = step.get('output')
+    for path in _output_files(output):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+    return output
+
+def record_step(manifest_path, step_key, output, input_hash):
+    """
+    Record a completed step in the manifest.
+
+    Args:
+        manifest_path (str): Path to the manifest.
+        step_key (str): Short step identifier (e.g. 'voiceover').
+        output: The step output (path or dict of paths).
+        input_hash (str): Hash of the step inputs from compute_input_hash.
+    """
+    if not manifest_path:
+        return
+
+    with _manifest_lock:
+        manifest = load_manifest(manifest_path)
+        if manifest is None:
+            return
+        manifest.setdefault('steps', {})[step_key] = {
+            'output': output,
+            'input_hash': input_hash,
+            'completed_at': time.time()
+        }
+        _write_manifest(manifest_path, manifest)
+
+def set_manifest_status(manifest_path, status):
+    """
+    Update the job status ('running', 'failed' or 'completed').
+    """
+    if not manifest_path:
+        return
+
+    with _manifest_lock:
+        manifest = load_manifest(manifest_path)
+        if manifest is None:
+            return
+        manifest['status'] = status
+        _write_manifest(manifest_path, manifest)
+
+def find_unfinished_manifests():
+    """
+    Find the manifests of jobs that did not complete.
+
+    Returns:
+        list: Manifest paths, oldest job first.
+    """
+    jobs_dir = get_jobs_dir()
+    unfinished = []
+    for filename in os.listdir(jobs_dir):
+        if not filename.endswith(".json"):
+            continue
+        manifest_path = os.path.join(jobs_dir, filename)
+        manifest = load_manifest(manifest_path)
+        if manifest and manifest.get('status') != 'completed':
+            unfinished.append((manifest.get('created_at', 0), manifest_path))
+
+    return [manifest_path for _, manifest_path in sorted(unfinished)]
+
+def job_from_manifest(manifest_path):
+    """
+    Rebuild the job dict of an unfinished job. Completed steps are picked
+    up again through get_completed_output when the step graph runs.
+
+    Returns:
+        dict: The job dict, or None if the manifest is unreadable.
+    """
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        return None
+
+    job = dict(manifest.get('job', {}))
+    job['manifest_path'] = manifest_path
+    job['resumed'] = True
+    job['started_at'] = time.time()
+    return job
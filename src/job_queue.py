@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import sqlite3
+import socket
+import spool_queue
+
+# A SQLite queue must be on a local disk: claims rely on SQLite file locking,
+# which is not reliable over NFS or SMB. Workers on several hosts share a
+# spool directory instead (see is_spool_queue).
+DEFAULT_QUEUE_DB = os.path.join("jobs", "queue.db")
+
+# How often a job may be claimed before it is marked as failed for good
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    heartbeat_at REAL,
+    manifest_path TEXT,
+    output_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+"""
+
+def is_spool_queue(db_path):
+    """
+    True if the queue path names a directory (an existing one, or a path
+    ending in a separator). Such a queue is a spool directory handled by
+    spool_queue, which works on NFS/SMB volumes shared by several hosts;
+    any other path is a SQLite database for workers on one host.
+    """
+    return db_path.endswith(('/', os.sep)) or os.path.isdir(db_path)
+
+def default_worker_id():
+    """Identify a worker by host name and process ID."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _connect(db_path):
+    """
+    Open a connection to the queue database, creating the schema if needed.
+    Every call opens its own connection, so the functions can be used from
+    several threads (e.g. the heartbeat thread) and processes at once.
+    """
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir, exist_ok=True)
+
+    connection = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(_SCHEMA)
+    return connection
+
+def _row_to_job(row):
+    """Convert a database row to a plain dict with the decoded payload."""
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+def enqueue_jobs(db_path, payloads, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Add jobs to the queue.
+
+    Args:
+        db_path (str): Path to the queue database or spool directory.
+        payloads (list): One dict per video (background paths, words_per_chunk,
+                         optional story_data).
+        max_attempts (int): How often each job may be claimed.
+
+    Returns:
+        list: IDs of the queued jobs.
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.enqueue_jobs(db_path, payloads, max_attempts)
+    now = time.time()
+    connection = _connect(db_path)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        ids = []
+        for payload in payloads:
+            cursor = connection.execute(
+                "INSERT INTO jobs (payload, max_attempts, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (json.dumps(payload), max_attempts, now, now)
+            )
+            ids.append(cursor.lastrowid)
+        connection.execute("COMMIT")
+        return ids
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+def _requeue_expired(connection, now):
+    """
+    Give jobs whose worker stopped sending heartbeats back to the queue,
+    or fail them if they used up their attempts.
+
+    Returns:
+        int: Number of requeued jobs.
+    """
+    connection.execute(
+        "UPDATE jobs SET status = 'failed', error = 'lease expired after last attempt', "
+        "worker_id = NULL, updated_at = ? "
+        "WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+        (now, now)
+    )
+    cursor = connection.execute(
+        "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL, updated_at = ? "
+        "WHERE status = 'running' AND lease_expires_at < ?",
+        (now, now)
+    )
+    return cursor.rowcount
+
+def claim_job(db_path, worker_id, lease_seconds=120):
+    """
+    Claim the oldest queued job for this worker.
+
+    Args:
+        db_path (str): Path to the queue database or spool directory.
+        worker_id (str): ID of the claiming worker.
+        lease_seconds (float): How long the claim is valid without a heartbeat.
+
+    Returns:
+        dict: The claimed job, or None if the queue is empty.
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.claim_job(db_path, worker_id, lease_seconds)
+    now = time.time()
+    connection = _connect(db_path)
+    try:
+        # IMMEDIATE takes the write lock up front, so two workers can never
+        # claim the same row
+        connection.execute("BEGIN IMMEDIATE")
+        requeued = _requeue_expired(connection, now)
+        if requeued:
+            print(f"♻️  Requeued {requeued} job(s) with expired leases")
+
+        row = connection.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+        ).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+
+        connection.execute(
+            "UPDATE jobs SET status = 'running', worker_id = ?, attempts = attempts + 1, "
+            "lease_expires_at = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+            (worker_id, now + lease_seconds, now, now, row['id'])
+        )
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        connection.execute("COMMIT")
+        return _row_to_job(row)
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+def heartbeat(db_path, queue_id, worker_id, lease_seconds=120):
+    """
+    Extend the lease of a running job.
+
+    Returns:
+        bool: False if the job is no longer owned by this worker
+              (its lease expired and another worker took it over).
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.heartbeat(db_path, queue_id, worker_id, lease_seconds)
+    now = time.time()
+    connection = _connect(db_path)
+    try:
+        cursor = connection.execute(
+            "UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ?, updated_at = ? "
+            "WHERE id = ? AND worker_id = ? AND status = 'running'",
+            (now + lease_seconds, now, now, queue_id, worker_id)
+        )
+        return cursor.rowcount == 1
+    finally:
+        connection.close()
+
+def set_job_manifest(db_path, queue_id, manifest_path):
+    """
+    Remember the manifest of a queued job, so a worker that takes over after
+    a crash resumes the job instead of starting over.
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.set_job_manifest(db_path, queue_id, manifest_path)
+    connection = _connect(db_path)
+    try:
+        connection.execute(
+            "UPDATE jobs SET manifest_path = ?, updated_at = ? WHERE id = ?",
+            (manifest_path, time.time(), queue_id)
+        )
+    finally:
+        connection.close()
+
+def complete_job(db_path, queue_id, worker_id, output_path=None):
+    """Mark a job as done."""
+    if is_spool_queue(db_path):
+        return spool_queue.complete_job(db_path, queue_id, worker_id, output_path)
+    connection = _connect(db_path)
+    try:
+        connection.execute(
+            "UPDATE jobs SET status = 'done', output_path = ?, error = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ? AND worker_id = ?",
+            (output_path, time.time(), queue_id, worker_id)
+        )
+    finally:
+        connection.close()
+
+def fail_job(db_path, queue_id, worker_id, error):
+    """
+    Record a failed attempt. The job goes back to the queue until it
+    used up its attempts.
+
+    Returns:
+        str: The new status ('queued' or 'failed'), or None if the job is
+             no longer owned by this worker.
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.fail_job(db_path, queue_id, worker_id, error)
+    connection = _connect(db_path)
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        row = connection.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ?",
+            (queue_id, worker_id)
+        ).fetchone()
+        if row is None:
+            connection.execute("COMMIT")
+            return None
+
+        status = 'queued' if row['attempts'] < row['max_attempts'] else 'failed'
+        connection.execute(
+            "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE id = ?",
+            (status, error, time.time(), queue_id)
+        )
+        connection.execute("COMMIT")
+        return status
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    finally:
+        connection.close()
+
+def get_queue_stats(db_path):
+    """
+    Count the jobs per status.
+
+    Returns:
+        dict: Mapping of status to number of jobs.
+    """
+    if is_spool_queue(db_path):
+        return spool_queue.get_queue_stats(db_path)
+    connection = _connect(db_path)
+    try:
+        rows = connection.execute("SELECT status, COUNT(*) AS count FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['count'] for row in rows}
+    finally:
+        connection.close()
@@ -0,0 +1,393 @@
+import os
+import json
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from tracing import trace_span
+
+# Media info of every file probed on this host, keyed by absolute path. An
+# entry is reused while the file's size and modification time match.
+MEDIA_INFO_CACHE_PATH = os.path.join(tempfile.gettempdir(), "reels-automator-media-info.json")
+CACHE_VERSION = 1
+MAX_CACHE_ENTRIES = 5000
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# --- MP3 -------------------------------------------------------------------
+
+# Bitrates in kbps by (MPEG version 1?, layer) and bitrate index
+_MP3_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Sample rates by version bits (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_MP3_SAMPLE_RATES = {0: [11025, 12000, 8000], 2: [22050, 24000, 16000], 3: [44100, 48000, 32000]}
+
+def _parse_mp3_frame_header(data, pos):
+    """
+    Decode the MPEG audio frame header at pos.
+
+    Returns:
+        tuple: (frame_length, samples, sample_rate, channels, layer) or None.
+    """
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 3
+    layer = 4 - ((data[pos + 1] >> 1) & 3)
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    channels = 1 if data[pos + 3] >> 6 == 3 else 2
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, channels, layer
+
+def _skip_id3v2(data):
+    """Offset of the first byte after an ID3v2 tag (0 without a tag)."""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def read_mp3_info(data):
+    """
+    Read the duration of an MP3 by walking its frame headers. This is exact
+    for CBR and VBR files and for files made by joining MP3s.
+
+    Returns:
+        dict: Media info, or None if no frames were found.
+    """
+    pos = _skip_id3v2(data)
+    end = len(data) - (128 if data[-128:-125] == b'TAG' else 0)
+    total_samples = 0
+    frames = 0
+    first = None
+
+    while pos < end:
+        header = _parse_mp3_frame_header(data, pos)
+        if header is None or header[0] <= 0:
+            # Junk between frames: resynchronize on the next frame header
+            pos = data.find(b'\xff', pos + 1, end)
+            if pos < 0:
+                break
+            continue
+        length, samples, sample_rate, channels, layer = header
+        if first is None:
+            first = header
+            # The Xing/Info frame of VBR and LAME files holds no audio
+            if b'Xing' in data[pos:pos + length] or b'Info' in data[pos:pos + length]:
+                pos += length
+                continue
+        if sample_rate == first[2]:
+            total_samples += samples
+            frames += 1
+        pos += length
+
+    if not frames:
+        return None
+    return {
+        'format': 'mp3',
+        'codec': 'mp3' if first[4] == 3 else f"mp{first[4]}",
+        'duration': total_samples / first[2],
+        'sample_rate': first[2],
+        'channels': first[3]
+    }
+
+# --- WAV -------------------------------------------------------------------
+
+def read_wav_info(data):
+    """
+    Read the duration of a RIFF/WAVE file from its fmt and data chunks.
+
+    Returns:
+        dict: Media info, or None if the chunks are missing.
+    """
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return None
+    pos = 12
+    fmt = None
+    data_size = None
+    while pos + 8 <= len(data):
+        chunk_id, chunk_size = data[pos:pos + 4], struct.unpack('<I', data[pos + 4:pos + 8])[0]
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', data[pos + 8:pos + 24])
+        elif chunk_id == b'data':
+            # Streamed WAVs leave the size at 0 or 0xFFFFFFFF
+            data_size = min(chunk_size, len(data) - pos - 8) if chunk_size not in (0, 0xFFFFFFFF) else len(data) - pos - 8
+            break
+        pos += 8 + chunk_size + (chunk_size & 1)
+
+    if not fmt or data_size is None or not fmt[3]:
+        return None
+    format_tag, channels, sample_rate, byte_rate, _, bits = fmt
+    sample_type = 'f' if format_tag == 3 else 's'
+    return {
+        'format': 'wav',
+        'codec': f"pcm_{sample_type}{bits}le" if bits > 8 else "pcm_u8",
+        'duration': data_size / byte_rate,
+        'sample_rate': sample_rate,
+        'channels': channels
+    }
+
+# --- MP4 / MOV -------------------------------------------------------------
+
+_MP4_CODECS = {
+    'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'av01': 'av1',
+    'vp09': 'vp9', 'mp4v': 'mpeg4', 'mp4a': 'aac', 'Opus': 'opus', '.mp3': 'mp3', 'ac-3': 'ac3'
+}
+
+def _iter_boxes(data, start, end):
+    """Yield (type, payload_start, box_end) of the boxes in data[start:end]."""
+    pos = start
+    while pos + 8 <= end:
+        size, box_type = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield box_type.decode('latin-1'), pos + header, min(pos + size, end)
+        pos += size
+
+def _find_box(data, start, end, path):
+    """Find the payload range of a nested box, e.g. ['mdia', 'minf', 'stbl']."""
+    for name in path:
+        for box_type, payload, box_end in _iter_boxes(data, start, end):
+            if box_type == name:
+                start, end = payload, box_end
+                break
+        else:
+            return None
+    return start, end
+
+def _read_moov(path):
+    """Read the moov box of an MP4/MOV file, wherever it is in the file."""
+    with open(path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            header = f.read(16)
+            size, box_type = struct.unpack('>I4s', header[:8])
+            if size == 1:
+                size = struct.unpack('>Q', header[8:16])[0]
+            elif size == 0:
+                size = file_size - pos
+            if size < 8:
+                return None
+            if box_type == b'moov':
+                f.seek(pos)
+                return f.read(size)
+            pos += size
+    return None
+
+def read_mp4_info(path):
+    """
+    Read duration, codecs, size and sample rate from the moov box of an
+    MP4/MOV file (mvhd, tkhd/mdhd, hdlr and stsd boxes).
+
+    Returns:
+        dict: Media info, or None if the file has no readable moov box.
+    """
+    moov = _read_moov(path)
+    if not moov:
+        return None
+    start, end = 8, len(moov)
+    mvhd = _find_box(moov, start, end, ['mvhd'])
+    if not mvhd:
+        return None
+    payload = mvhd[0]
+    if moov[payload] == 1:
+        timescale, duration = struct.unpack('>IQ', moov[payload + 20:payload + 32])
+    else:
+        timescale, duration = struct.unpack('>II', moov[payload + 12:payload + 20])
+    if not timescale:
+        return None
+
+    info = {'format': 'mp4', 'duration': duration / timescale}
+    for box_type, trak_start, trak_end in _iter_boxes(moov, start, end):
+        if box_type != 'trak':
+            continue
+        hdlr = _find_box(moov, trak_start, trak_end, ['mdia', 'hdlr'])
+        stsd = _find_box(moov, trak_start, trak_end, ['mdia', 'minf', 'stbl', 'stsd'])
+        if not hdlr or not stsd:
+            continue
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12]
+        entry = stsd[0] + 8          # after version/flags and entry count
+        fourcc = moov[entry + 4:entry + 8].decode('latin-1')
+        codec = _MP4_CODECS.get(fourcc, fourcc.strip())
+        sample_entry = entry + 8
+        if handler == b'vide' and 'video_codec' not in info:
+            info['video_codec'] = codec
+            info['width'], info['height'] = struct.unpack('>HH', moov[sample_entry + 24:sample_entry + 28])
+        elif handler == b'soun' and 'audio_codec' not in info:
+            info['audio_codec'] = codec
+            info['channels'] = struct.unpack('>H', moov[sample_entry + 16:sample_entry + 18])[0]
+            info['sample_rate'] = struct.unpack('>I', moov[sample_entry + 24:sample_entry + 28])[0] >> 16
+
+    info['codec'] = info.get('video_codec') or info.get('audio_codec')
+    return info
+
+# --- Probing and cache -----------------------------------------------------
+
+def read_header_info(path):
+    """
+    Read media info from the file headers in pure Python. The format is
+    detected from the content, so WAV data saved as .mp3 is read correctly.
+
+    Returns:
+        dict: Media info, or None for formats this module cannot read.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        with open(path, 'rb') as f:
+            return read_wav_info(f.read())
+    if head[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'wide'):
+        return read_mp4_info(path)
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        with open(path, 'rb') as f:
+            return read_mp3_info(f.read())
+    return None
+
+def probe_with_ffprobe(path):
+    """
+    Read media info with ffprobe, for formats without a header reader.
+
+    Returns:
+        dict: Media info, or None if ffprobe is missing or fails.
+    """
+    from toolchain import find_ffmpeg_path
+
+    _, ffprobe_path = find_ffmpeg_path()
+    if not ffprobe_path:
+        print("FFprobe not found. Please install FFmpeg.")
+        return None
+    cmd = [
+        ffprobe_path, "-v", "quiet",
+        "-show_entries", "format=duration,format_name:stream=codec_type,codec_name,sample_rate,channels,width,height",
+        "-of", "json", path
+    ]
+    try:
+        with trace_span("ffprobe", "ffmpeg", path=os.path.basename(path)):
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout)
+        info = {'format': probe['format']['format_name'].split(',')[0], 'duration': float(probe['format']['duration'])}
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError) as e:
+        print(f"Error probing {os.path.basename(path)}: {e}")
+        return None
+
+    for stream in probe.get('streams', []):
+        if stream.get('codec_type') == 'video' and 'video_codec' not in info:
+            info.update(video_codec=stream.get('codec_name'), width=stream.get('width'), height=stream.get('height'))
+        elif stream.get('codec_type') == 'audio' and 'audio_codec' not in info:
+            info.update(audio_codec=stream.get('codec_name'), channels=stream.get('channels'),
+                        sample_rate=int(stream['sample_rate']) if stream.get('sample_rate') else None)
+    info['codec'] = info.get('video_codec') or info.get('audio_codec')
+    return info
+
+def _load_cache():
+    try:
+        with open(MEDIA_INFO_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('version') == CACHE_VERSION:
+            return cache
+    except (OSError, ValueError):
+        pass
+    return {'version': CACHE_VERSION, 'files': {}}
+
+def _save_cache(cache):
+    # Merge with entries other processes saved since this one loaded
+    on_disk = _load_cache()['files']
+    on_disk.update(cache['files'])
+    if len(on_disk) > MAX_CACHE_ENTRIES:
+        newest = sorted(on_disk.items(), key=lambda item: item[1]['probed_at'])[-MAX_CACHE_ENTRIES:]
+        on_disk = dict(newest)
+    cache['files'] = on_disk
+    try:
+        temp_path = f"{MEDIA_INFO_CACHE_PATH}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, MEDIA_INFO_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not save the media info cache: {e}")
+
+def get_media_info(path):
+    """
+    Get duration, codec, sample rate, channels and video size of a media
+    file. MP3, WAV and MP4/MOV headers are read in pure Python; other
+    formats fall back to ffprobe. Results are memoized by path, size and
+    modification time in memory and in an on-disk cache shared by all
+    processes, so a file is only probed once until it changes.
+
+    Args:
+        path (str): Media file.
+
+    Returns:
+        dict: Media info with at least 'duration' and 'codec', or None if
+              the file cannot be read.
+    """
+    global _cache
+
+    key = os.path.abspath(path)
+    try:
+        stat = os.stat(key)
+    except OSError as e:
+        print(f"Error reading media info: {e}")
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = _load_cache()
+        entry = _cache['files'].get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return dict(entry['info'])
+
+    with trace_span("media info", "cache", path=os.path.basename(path)) as span:
+        try:
+            info = read_header_info(key)
+        except (OSError, struct.error, IndexError, UnicodeDecodeError):
+            info = None
+        span['source'] = 'header' if info else 'ffprobe'
+        if not info or not info.get('duration'):
+            info = probe_with_ffprobe(key)
+    if not info:
+        return None
+
+    with _cache_lock:
+        _cache['files'][key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'probed_at': time.time(), 'info': info}
+        _save_cache(_cache)
+    return dict(info)
+
+def get_duration(path):
+    """
+    Get the duration of a media file in seconds.
+
+    Returns:
+        float: Duration in seconds, or None if error.
+    """
+    info = get_media_info(path)
+    return info['duration'] if info else None
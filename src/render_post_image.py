@@ -1,13 +1,18 @@
 
 import json
 import os
-import time
-from playwright.sync_api import sync_playwright
-import sys
+import queue
+import threading
+from concurrent.futures import Future
+from cache_manager import get_story_cache_key, get_cache_paths, cache_exists, copy_from_cache, save_to_cache, generate_job_id
+from tracing import trace_span
 
-# Add src directory to path for imports
-sys.path.append(os.path.dirname(__file__))
-from cache_manager import get_story_cache_key, get_cache_paths, cache_exists, copy_from_cache, save_to_cache
+# HTML template with inlined CSS, kept until one of the files changes
+_template_cache = {}
+_template_lock = threading.Lock()
+
+# Shared Chromium started by start_warm_browser() (used by `main.py serve`)
+_warm_browser = None
 
 def get_latest_story_file():
     """
@@ -32,12 +37,163 @@ def get_latest_story_file():
 
     return max(files, key=os.path.getctime)
 
-def render_post_image(story_data):
+def load_post_template(project_root):
+    """
+    Reads the Reddit post template with the CSS inlined. The result is
+    cached and only read again when the HTML or CSS file changes.
+
+    Args:
+        project_root (str): Project root containing 'templates/'.
+
+    Returns:
+        str: The HTML template with {{placeholders}}.
+    """
+    template_path = os.path.join(project_root, "templates", "reddit_post.html")
+    css_path = os.path.join(project_root, "templates", "reddit_post.css")
+    version = (os.path.getmtime(template_path), os.path.getmtime(css_path))
+    
+    with _template_lock:
+        cached = _template_cache.get(project_root)
+        if cached and cached[0] == version:
+            return cached[1]
+    
+    with open(template_path, "r") as f:
+        html_template = f.read()
+    
+    with open(css_path, "r") as f:
+        css_content = f.read()
+    
+    # Replace the CSS link with inline CSS
+    css_link = '<link rel="stylesheet" type="text/css" href="reddit_post.css">'
+    inline_css = f'<style>{css_content}</style>'
+    html_template = html_template.replace(css_link, inline_css)
+    
+    with _template_lock:
+        _template_cache[project_root] = (version, html_template)
+    return html_template
+
+def _screenshot_post(browser, html, image_path):
+    """Render the post HTML in a new page of a running browser and save the post element."""
+    page = browser.new_page()
+    try:
+        # Set viewport optimized for vertical video content
+        page.set_viewport_size({"width": 1080, "height": 1920})
+        
+        # Set the HTML content
+        page.set_content(html)
+        
+        # Wait for any fonts/styles to load
+        page.wait_for_timeout(2000)
+        
+        # Get the post element to capture just the content area
+        post_element = page.locator('.post')
+        
+        # Take screenshot of just the post element with some padding
+        with trace_span("Playwright screenshot", "browser"):
+            post_element.screenshot(path=image_path)
+    finally:
+        page.close()
+
+class WarmBrowser:
+    """
+    One headless Chromium that stays open between renders.
+
+    Playwright's sync API only works in the thread that started it, so the
+    browser lives in its own thread and render() hands the work over to it.
+    """
+
+    def __init__(self):
+        self._requests = queue.Queue()
+        self._ready = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="warm-browser", daemon=True)
+
+    def start(self):
+        """Launch the browser. Raises the launch error if it fails."""
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+    def _run(self):
+        try:
+            from playwright.sync_api import sync_playwright
+            
+            playwright = sync_playwright().start()
+            with trace_span("Playwright chromium.launch", "browser", warm=True):
+                browser = playwright.chromium.launch(headless=True)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        
+        self._ready.set()
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            
+            html, image_path, future = request
+            try:
+                if not browser.is_connected():
+                    # Chromium crashed since the last render: start a new one
+                    browser = playwright.chromium.launch(headless=True)
+                _screenshot_post(browser, html, image_path)
+                future.set_result(image_path)
+            except Exception as e:
+                future.set_exception(e)
+        
+        browser.close()
+        playwright.stop()
+
+    def render(self, html, image_path):
+        """Render the HTML to image_path in the browser thread and wait for it."""
+        future = Future()
+        self._requests.put((html, image_path, future))
+        return future.result()
+
+    def close(self):
+        """Close the browser and stop its thread."""
+        if self._thread.is_alive():
+            self._requests.put(None)
+            self._thread.join()
+
+def start_warm_browser():
+    """
+    Keeps a Chromium running for all following render_post_image() calls
+    in this process, instead of launching one per image.
+
+    Returns:
+        bool: True if the browser started.
+    """
+    global _warm_browser
+    if _warm_browser:
+        return True
+    
+    browser = WarmBrowser()
+    try:
+        browser.start()
+    except Exception as e:
+        print(f"⚠️  Could not start a shared browser, images will launch their own: {e}")
+        return False
+    
+    _warm_browser = browser
+    return True
+
+def stop_warm_browser():
+    """Close the browser started by start_warm_browser()."""
+    global _warm_browser
+    if _warm_browser:
+        _warm_browser.close()
+        _warm_browser = None
+
+def render_post_image(story_data, job_id=None):
     """
     Renders a Reddit post image from a story.
 
     Args:
         story_data (dict): The story to render.
+        job_id (str): ID of the video, used as the file name. Generated if not given.
     """
     # Get the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -50,8 +206,9 @@ def render_post_image(story_data):
         os.makedirs(images_dir)
 
     # Generate output path
-    timestamp = int(time.time())
-    image_path = os.path.join(images_dir, f"{timestamp}_title.png")
+    if job_id is None:
+        job_id = generate_job_id(story_data)
+    image_path = os.path.join(images_dir, f"{job_id}_title.png")
     
     # Check cache first
     cache_key = get_story_cache_key(story_data)
@@ -65,50 +222,28 @@ def render_post_image(story_data):
         else:
             print("⚠️  Failed to copy from cache, generating new image...")
     
-    # Read the HTML template
-    template_path = os.path.join(project_root, "templates", "reddit_post.html")
-    css_path = os.path.join(project_root, "templates", "reddit_post.css")
-    
-    with open(template_path, "r") as f:
-        html_template = f.read()
-    
-    with open(css_path, "r") as f:
-        css_content = f.read()
+    # Read the HTML template (with inline CSS)
+    html_template = load_post_template(project_root)
 
     # Inject the story data into the template
     html = html_template.replace("{{subreddit}}", story_data["subreddit"])
     html = html.replace("{{username}}", story_data["username"])
     html = html.replace("{{title}}", story_data["title"])
     html = html.replace("{{upvotes}}", str(story_data["upvotes"]))
-    
-    # Replace the CSS link with inline CSS
-    css_link = '<link rel="stylesheet" type="text/css" href="reddit_post.css">'
-    inline_css = f'<style>{css_content}</style>'
-    html = html.replace(css_link, inline_css)
 
     # Render the HTML to a PNG image using Playwright
     try:
-        with sync_playwright() as p:
-            # Launch browser
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            
-            # Set viewport optimized for vertical video content
-            page.set_viewport_size({"width": 1080, "height": 1920})
-            
-            # Set the HTML content
-            page.set_content(html)
-            
-            # Wait for any fonts/styles to load
-            page.wait_for_timeout(2000)
-            
-            # Get the post element to capture just the content area
-            post_element = page.locator('.post')
-            
-            # Take screenshot of just the post element with some padding
-            post_element.screenshot(path=image_path)
+        if _warm_browser:
+            _warm_browser.render(html, image_path)
+        else:
+            from playwright.sync_api import sync_playwright
             
-            browser.close()
+            with sync_playwright() as p:
+                # Launch browser
+                with trace_span("Playwright chromium.launch", "browser"):
+                    browser = p.chromium.launch(headless=True)
+                _screenshot_post(browser, html, image_path)
+                browser.close()
             
         print(f"Image saved to {image_path}")
         
@@ -0,0 +1,62 @@
+# Named encoding settings for compose_final_video. Sizes are in pixels of
+# the vertical output; caption and overlay sizes are designed for 1920
+# pixels of height and scaled to the profile. audio_bitrate is also the
+# bitrate of the AAC voiceover made by the voiceover step, which renders
+# mux without re-encoding.
+RENDER_PROFILES = {
+    # Quick review of the story and caption timing
+    'draft': {
+        'width': 540,
+        'height': 960,
+        'fps': 15,
+        'preset': "ultrafast",
+        'crf': 30,
+        'audio_bitrate': "96k",
+        'use_proxies': True
+    },
+    # Regular uploads
+    'final': {
+        'width': 1080,
+        'height': 1920,
+        'fps': None,            # frame rate of the background (30 fps proxies)
+        'preset': "medium",
+        'crf': 23,
+        'audio_bitrate': "128k",
+        'use_proxies': True
+    },
+    # Hero uploads: full-resolution sources at their own frame rate
+    'hq': {
+        'width': 1080,
+        'height': 1920,
+        'fps': None,
+        'preset': "slow",
+        'crf': 18,
+        'audio_bitrate': "192k",
+        'use_proxies': False
+    }
+}
+
+DEFAULT_PROFILE = 'final'
+
+# Frame height the caption and overlay sizes are designed for
+DESIGN_HEIGHT = 1920
+
+def get_render_profile(name=DEFAULT_PROFILE):
+    """
+    Get the settings of a render profile.
+
+    Args:
+        name (str): 'draft', 'final' or 'hq'.
+
+    Returns:
+        dict: The profile settings with its 'name' and the 'scale' of
+              captions and overlays relative to the 1080x1920 design.
+
+    Raises:
+        ValueError: If there is no profile with that name.
+    """
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"unknown render profile '{name}' (choose from {', '.join(RENDER_PROFILES)})")
+    profile = dict(RENDER_PROFILES[name], name=name)
+    profile['scale'] = profile['height'] / DESIGN_HEIGHT
+    return profile
@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import threading
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Finished jobs kept for status requests before the oldest are forgotten
+MAX_FINISHED_JOBS = 1000
+
+# Job keys reported as outputs, in pipeline order
+OUTPUT_KEYS = ['story_file_path', 'image_path', 'voiceover_paths', 'captions_path', 'output_path']
+
+class _SharedJob(dict):
+    """
+    Job dict whose writes take the service lock, so status requests can copy
+    it while the pipeline threads are still adding outputs to it.
+    """
+
+    def __init__(self, job, lock):
+        super().__init__(job)
+        self._lock = lock
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            return super().setdefault(key, default)
+
+    def pop(self, *args):
+        with self._lock:
+            return super().pop(*args)
+
+    def snapshot(self):
+        """Plain copy of the job, taken under the lock."""
+        with self._lock:
+            return dict(self)
+
+class RenderService:
+    """
+    Runs video requests in a thread pool of a long-running process and
+    keeps their status in memory.
+
+    Args:
+        prepare_job (callable): Called as prepare_job(request, service_id), turns
+                                a request dict into a job dict. Raises ValueError
+                                with a message for invalid requests.
+        run_job (callable): Runs a job dict, returns True on success.
+        workers (int): Number of videos generated at the same time.
+        warm_resources (dict): Description of the warmed-up resources for /health.
+    """
+
+    def __init__(self, prepare_job, run_job, workers=1, warm_resources=None):
+        self.prepare_job = prepare_job
+        self.run_job = run_job
+        self.workers = workers
+        self.warm_resources = warm_resources or {}
+        self.started_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="serve-job")
+        self._records = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def submit(self, request):
+        """
+        Validate a request and queue its video.
+
+        Returns:
+            dict: The new job record.
+        """
+        with self._lock:
+            service_id = self._next_id
+            self._next_id += 1
+
+        job = _SharedJob(self.prepare_job(request, service_id), self._lock)
+        record = {
+            'id': service_id,
+            'status': 'queued',
+            'job': job,
+            'error': None,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'done': threading.Event()
+        }
+        with self._lock:
+            self._records[service_id] = record
+            self._forget_old_jobs()
+        self._executor.submit(self._run, record)
+        return record
+
+    def _run(self, record):
+        record['status'] = 'running'
+        record['started_at'] = time.time()
+        try:
+            success = self.run_job(record['job'])
+        except Exception as e:
+            print(f"❌ Service job {record['id']} crashed: {e}")
+            success = False
+            record['error'] = str(e)
+
+        if not success and not record['error']:
+            record['error'] = "pipeline step failed (see the service log)"
+        record['status'] = 'done' if success else 'failed'
+        record['finished_at'] = time.time()
+        record['done'].set()
+
+    def _forget_old_jobs(self):
+        """Drop the oldest finished jobs once more than MAX_FINISHED_JOBS are kept."""
+        finished = [service_id for service_id, record in self._records.items() if record['done'].is_set()]
+        for service_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._records[service_id]
+
+    def get(self, service_id):
+        """Get a job record by its service ID, or None."""
+        with self._lock:
+            return self._records.get(service_id)
+
+    def describe(self, record):
+        """
+        Build the JSON status of a job.
+
+        Returns:
+            dict: Status, job ID, completed outputs and timings.
+        """
+        job = record['job'].snapshot()
+        now = time.time()
+        started_at = record['started_at']
+        finished_at = record['finished_at']
+        return {
+            'id': record['id'],
+            'status': record['status'],
+            'job_id': job.get('job_id'),
+            'title': (job.get('story_data') or {}).get('title'),
+            'outputs': {key: job[key] for key in OUTPUT_KEYS if job.get(key)},
+            'manifest_path': job.get('manifest_path'),
+            'error': record['error'],
+            'queued_seconds': round((started_at or now) - record['submitted_at'], 3),
+            'run_seconds': round((finished_at or now) - started_at, 3) if started_at else None
+        }
+
+    def list_jobs(self):
+        """Describe all known jobs, oldest first."""
+        with self._lock:
+            records = list(self._records.values())
+        return [self.describe(record) for record in records]
+
+    def health(self):
+        """Describe the service for /health."""
+        counts = {}
+        for job in self.list_jobs():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'status': 'ok',
+            'workers': self.workers,
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'jobs': counts,
+            'warm': self.warm_resources
+        }
+
+    def shutdown(self):
+        """Stop accepting work; queued jobs are dropped, running jobs finish."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """JSON API of the render service (the server object carries `service`)."""
+
+    def address_string(self):
+        # Unix socket clients have no address
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return str(self.client_address[0])
+        return "unix-socket"
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id_from_path(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def do_GET(self):
+        service = self.server.service
+        path = urlparse(self.path).path
+
+        if path == "/health":
+            self._send_json(200, service.health())
+        elif path == "/jobs":
+            self._send_json(200, {'jobs': service.list_jobs()})
+        else:
+            service_id = self._job_id_from_path(path)
+            record = service.get(service_id) if service_id else None
+            if record is None:
+                self._send_json(404, {'error': f"unknown job: {path}"})
+            else:
+                self._send_json(200, service.describe(record))
+
+    def do_POST(self):
+        service = self.server.service
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send_json(404, {'error': f"unknown endpoint: {url.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(request, dict):
+                raise ValueError("request body must be a JSON object")
+            record = service.submit(request)
+        except json.JSONDecodeError as e:
+            self._send_json(400, {'error': f"invalid JSON: {e}"})
+            return
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        # ?wait=1 answers once the video is finished instead of right away
+        if parse_qs(url.query).get('wait', ['0'])[0] not in ('', '0', 'false'):
+            record['done'].wait()
+            self._send_json(200, service.describe(record))
+        else:
+            self._send_json(202, service.describe(record), {'Location': f"/jobs/{record['id']}"})
+
+class _ServiceHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+class _ServiceUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    """
+    Create the HTTP server of a RenderService, on a TCP port or a Unix socket.
+
+    Args:
+        service (RenderService): The service answering the requests.
+        host (str): Interface to listen on (TCP).
+        port (int): Port to listen on (TCP).
+        socket_path (str): Listen on this Unix socket instead of TCP.
+
+    Returns:
+        The server; call serve_forever() on it.
+    """
+    if socket_path:
+        # A socket file left by a killed service would block the bind
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = _ServiceUnixServer(socket_path, _RequestHandler)
+    else:
+        server = _ServiceHTTPServer((host, port), _RequestHandler)
+    server.service = service
+    return server
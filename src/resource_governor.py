@@ -0,0 +1,295 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Per-host ledger of running encodes. Lives in the local temp directory (not
+# the project directory, which may be shared between hosts over NFS).
+LEDGER_DIR = os.path.join(tempfile.gettempdir(), "reels-automator-encodes")
+
+# Number of encodes expected to run at once on this host. main.py sets it from
+# --encode-workers so every process splits the cores the same way.
+PARALLELISM_ENV = "REELS_ENCODE_PARALLELISM"
+
+# Rough libx264 memory use for a 1080x1920 encode
+BASE_ENCODE_RAM = 256 * 1024 * 1024
+RAM_PER_THREAD = 64 * 1024 * 1024
+
+# Keep this much RAM and disk free for the rest of the system
+RAM_HEADROOM = 512 * 1024 * 1024
+DISK_HEADROOM = 1024 * 1024 * 1024
+
+_LOCK_STALE_SECONDS = 30
+
+class EncodeAllocation:
+    """
+    Resources reserved for one FFmpeg encode.
+
+    Attributes:
+        threads (int): Value for -threads and x264 threads.
+        lookahead_threads (int): Value for x264 lookahead-threads.
+        ram_bytes (int): Reserved memory.
+        disk_bytes (int): Reserved scratch/output disk space.
+    """
+
+    def __init__(self, threads, ram_bytes, disk_bytes, reservation_path=None):
+        self.threads = threads
+        self.lookahead_threads = max(1, threads // 4)
+        self.ram_bytes = ram_bytes
+        self.disk_bytes = disk_bytes
+        self.reservation_path = reservation_path
+
+    def ffmpeg_args(self, share=1):
+        """
+        FFmpeg output options that apply the thread budget to libx264.
+
+        Args:
+            share (int): Number of encoders in the FFmpeg run splitting the budget.
+
+        Returns:
+            list: Arguments to put before the output file.
+        """
+        threads = max(1, self.threads // share)
+        lookahead_threads = max(1, threads // 4)
+        return [
+            "-threads", str(threads),
+            "-x264-params", f"threads={threads}:lookahead-threads={lookahead_threads}"
+        ]
+
+def get_available_memory():
+    """
+    Get the memory available to new processes.
+
+    Returns:
+        int: Available bytes, or None if it cannot be determined.
+    """
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) * 1024
+        elif sys.platform == "win32":
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullAvailPhys)
+        else:
+            return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+def get_free_disk(path):
+    """
+    Get the free space of the file system holding `path`.
+
+    Returns:
+        int: Free bytes, or None if it cannot be determined.
+    """
+    try:
+        while path and not os.path.exists(path):
+            path = os.path.dirname(path)
+        return shutil.disk_usage(path or ".").free
+    except OSError:
+        return None
+
+def pid_alive(pid):
+    """Check whether a process that holds a reservation is still running."""
+    if pid == os.getpid():
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+@contextmanager
+def _ledger_lock():
+    """Exclusive lock on the ledger directory, shared by all processes on the host."""
+    os.makedirs(LEDGER_DIR, exist_ok=True)
+    lock_path = os.path.join(LEDGER_DIR, ".lock")
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            break
+        except FileExistsError:
+            # A process killed while holding the lock must not block everyone
+            try:
+                if time.time() - os.path.getmtime(lock_path) > _LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+def _read_reservations():
+    """Read the active reservations, removing those of dead processes."""
+    reservations = []
+    for filename in os.listdir(LEDGER_DIR):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(LEDGER_DIR, filename)
+        try:
+            with open(path, "r") as f:
+                reservation = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not pid_alive(reservation.get("pid", -1)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        reservations.append(reservation)
+    return reservations
+
+def get_total_cores():
+    """Number of CPU cores this process may use."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def get_encode_threads(total_cores=None):
+    """
+    Thread budget of one encode: the host's cores split between the
+    expected number of parallel encodes.
+    """
+    total_cores = total_cores or get_total_cores()
+    try:
+        parallelism = max(1, int(os.environ.get(PARALLELISM_ENV, "1")))
+    except ValueError:
+        parallelism = 1
+    return max(1, total_cores // parallelism)
+
+def acquire_encode(expected_output_bytes, scratch_dir, poll_interval=1.0, threads=None):
+    """
+    Wait until an encode fits into the host's core, RAM and disk budget,
+    then reserve the resources for it.
+
+    Args:
+        expected_output_bytes (int): Estimated size of all files the encode
+                                     writes (temp and final output).
+        scratch_dir (str): Directory the encode writes to.
+        poll_interval (float): Seconds between checks while waiting.
+        threads (int): Thread budget to reserve (default: get_encode_threads()).
+
+    Returns:
+        EncodeAllocation: The reserved resources (pass to release_encode()),
+                          or None if the disk is too small for the encode.
+    """
+    total_cores = get_total_cores()
+    threads = threads or get_encode_threads(total_cores)
+    ram_needed = BASE_ENCODE_RAM + threads * RAM_PER_THREAD
+    disk_needed = int(expected_output_bytes)
+    waiting_since = None
+
+    while True:
+        with _ledger_lock():
+            reservations = _read_reservations()
+            cores_in_use = sum(r["threads"] for r in reservations)
+            ram_reserved = sum(r["ram_bytes"] for r in reservations)
+            disk_reserved = sum(r["disk_bytes"] for r in reservations if r.get("scratch_dir") == os.path.abspath(scratch_dir))
+
+            available_memory = get_available_memory()
+            free_disk = get_free_disk(scratch_dir)
+
+            # Running encodes have not allocated all their memory/disk yet,
+            # so their reservations count against what is free now
+            fits_cores = cores_in_use + threads <= total_cores
+            fits_ram = available_memory is None or available_memory - ram_reserved - RAM_HEADROOM >= ram_needed
+            fits_disk = free_disk is None or free_disk - disk_reserved - DISK_HEADROOM >= disk_needed
+
+            if not reservations and not fits_disk:
+                # Waiting would not help: nothing else is using the disk
+                print(f"❌ Not enough free disk in {scratch_dir} for this encode "
+                      f"(need {disk_needed / 1e9:.1f} GB plus {DISK_HEADROOM / 1e9:.1f} GB headroom)")
+                return None
+
+            # An encode always runs when nothing else does, even on a small host
+            if (fits_cores and fits_ram and fits_disk) or not reservations:
+                reservation_path = os.path.join(LEDGER_DIR, f"{os.getpid()}_{uuid.uuid4().hex[:8]}.json")
+                with open(reservation_path, "w") as f:
+                    json.dump({
+                        "pid": os.getpid(),
+                        "threads": threads,
+                        "ram_bytes": ram_needed,
+                        "disk_bytes": disk_needed,
+                        "scratch_dir": os.path.abspath(scratch_dir),
+                        "created_at": time.time()
+                    }, f)
+                if waiting_since is not None:
+                    print(f"▶️  Encode slot granted after {time.time() - waiting_since:.1f}s")
+                return EncodeAllocation(threads, ram_needed, disk_needed, reservation_path)
+
+        if waiting_since is None:
+            waiting_since = time.time()
+            reasons = []
+            if not fits_cores:
+                reasons.append(f"cores {cores_in_use}/{total_cores} in use")
+            if not fits_ram:
+                reasons.append("not enough free RAM")
+            if not fits_disk:
+                reasons.append(f"not enough free disk in {scratch_dir}")
+            print(f"⏳ Waiting for encode resources ({', '.join(reasons)})...")
+        time.sleep(poll_interval)
+
+def release_encode(allocation):
+    """Release the resources reserved by acquire_encode()."""
+    if allocation and allocation.reservation_path:
+        try:
+            os.remove(allocation.reservation_path)
+        except OSError:
+            pass
+        allocation.reservation_path = None
+
+@contextmanager
+def encode_slot(expected_output_bytes, scratch_dir):
+    """
+    Context manager around acquire_encode()/release_encode().
+
+    Yields:
+        EncodeAllocation: The reserved resources, or None if the disk is too small.
+    """
+    allocation = acquire_encode(expected_output_bytes, scratch_dir)
+    try:
+        yield allocation
+    finally:
+        release_encode(allocation)
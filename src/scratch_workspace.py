@@ -0,0 +1,164 @@
+import os
+import re
+import atexit
+import shutil
+import socket
+import tempfile
+import threading
+import uuid
+from resource_governor import get_free_disk, pid_alive, RAM_HEADROOM, DISK_HEADROOM
+
+# Intermediate files go to RAM (tmpfs) when it has room, so they do not
+# compete with the final outputs for disk bandwidth
+RAM_SCRATCH_ROOT = "/dev/shm"
+
+# Set to a directory to put all scratch workspaces there instead
+SCRATCH_ENV = "REELS_SCRATCH_DIR"
+
+WORKSPACE_PREFIX = "reels-scratch-"
+
+def get_host_tag():
+    """Host name as used in workspace names (no '-', which separates the parts)."""
+    return re.sub(r'[^A-Za-z0-9_.]', '_', socket.gethostname()) or "host"
+
+# Workspaces of this process, removed at exit if their owner did not
+_workspaces = set()
+_workspaces_lock = threading.Lock()
+
+def get_scratch_roots():
+    """
+    Directories scratch files can go to, in order of preference: the
+    REELS_SCRATCH_DIR override, or tmpfs and then the temp directory on disk.
+    """
+    override = os.environ.get(SCRATCH_ENV)
+    if override:
+        return [override]
+    roots = []
+    if os.path.isdir(RAM_SCRATCH_ROOT) and os.access(RAM_SCRATCH_ROOT, os.W_OK):
+        roots.append(RAM_SCRATCH_ROOT)
+    roots.append(tempfile.gettempdir())
+    return roots
+
+class ScratchWorkspace:
+    """
+    Directory for the intermediate files of one job. Each file is placed in
+    tmpfs if its expected size fits there (leaving RAM for the encoders),
+    otherwise on disk. Everything is deleted by cleanup(), which runs when
+    the `with` block ends, whether the job succeeded, failed or timed out.
+
+    Attributes:
+        name (str): Job the workspace belongs to (part of the directory name).
+        reserved_bytes (dict): Expected bytes of the files placed in each root.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.reserved_bytes = {}
+        self._dirs = {}
+        # reels-scratch-{host}-{pid}-{token}-{name}: the host keeps sweeps
+        # of a shared REELS_SCRATCH_DIR to the workspaces of this host
+        self._token = f"{WORKSPACE_PREFIX}{get_host_tag()}-{os.getpid()}-{uuid.uuid4().hex[:8]}-{name}"
+        self._lock = threading.Lock()
+        with _workspaces_lock:
+            _workspaces.add(self)
+
+    def _fits(self, root, expected_bytes):
+        free = get_free_disk(root)
+        if free is None:
+            return False
+        # Files placed earlier may not be written yet
+        pending = self.reserved_bytes.get(root, 0) - self._root_usage(root)
+        headroom = DISK_HEADROOM + (RAM_HEADROOM if root == RAM_SCRATCH_ROOT else 0)
+        return free - max(0, pending) - headroom >= expected_bytes
+
+    def _root_usage(self, root):
+        directory = self._dirs.get(root)
+        if not directory:
+            return 0
+        total = 0
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                total += entry.stat().st_size
+        return total
+
+    def path(self, filename, expected_bytes=0):
+        """
+        Get a path for an intermediate file.
+
+        Args:
+            filename (str): File name, unique within the workspace.
+            expected_bytes (int): Estimated size, used to choose RAM or disk.
+
+        Returns:
+            str: Path in the workspace directory (created on first use).
+        """
+        with self._lock:
+            roots = get_scratch_roots()
+            root = next((r for r in roots[:-1] if self._fits(r, expected_bytes)), roots[-1])
+            if root not in self._dirs:
+                directory = os.path.join(root, self._token)
+                os.makedirs(directory, exist_ok=True)
+                self._dirs[root] = directory
+            self.reserved_bytes[root] = self.reserved_bytes.get(root, 0) + int(expected_bytes)
+            return os.path.join(self._dirs[root], filename)
+
+    def used_bytes(self):
+        """Bytes currently written to the workspace (RAM and disk)."""
+        with self._lock:
+            return sum(self._root_usage(root) for root in self._dirs)
+
+    def in_ram(self, path):
+        """True if the path is in the tmpfs part of the workspace."""
+        return path.startswith(RAM_SCRATCH_ROOT + os.sep)
+
+    def cleanup(self):
+        """Delete the workspace and everything in it."""
+        with self._lock:
+            for directory in self._dirs.values():
+                shutil.rmtree(directory, ignore_errors=True)
+            self._dirs = {}
+            self.reserved_bytes = {}
+        with _workspaces_lock:
+            _workspaces.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+
+def _cleanup_workspaces():
+    """Remove the workspaces still open when the process exits."""
+    with _workspaces_lock:
+        workspaces = list(_workspaces)
+    for workspace in workspaces:
+        workspace.cleanup()
+
+atexit.register(_cleanup_workspaces)
+
+def remove_stale_workspaces():
+    """
+    Delete workspaces left by processes of this host that were killed before
+    they could clean up. Workspaces of other hosts (in a shared
+    REELS_SCRATCH_DIR) are left alone, their processes cannot be checked here.
+
+    Returns:
+        int: Number of workspaces removed.
+    """
+    prefix = f"{WORKSPACE_PREFIX}{get_host_tag()}-"
+    removed = 0
+    for root in get_scratch_roots():
+        try:
+            entries = [e for e in os.scandir(root) if e.is_dir() and e.name.startswith(prefix)]
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                pid = int(entry.name[len(prefix):].split('-', 1)[0])
+            except ValueError:
+                continue
+            if not pid_alive(pid):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+    return removed
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import time
+import uuid
+
+# A spool queue is a directory on a volume shared by several hosts (e.g. the
+# NFS export that holds exports/). Each job is a JSON file in the directory of
+# its status; claims and takeovers are atomic renames, which NFS and SMB
+# guarantee, unlike the file locks SQLite relies on.
+STATUS_DIRS = ('queued', 'running', 'done', 'failed')
+IDS_DIR = "ids"
+MANIFESTS_DIR = "manifests"
+
+# running/{job}.{worker}.lease: its mtime is the last heartbeat of the worker
+# that claimed the job
+LEASE_SUFFIX = ".lease"
+
+def _job_name(queue_id):
+    return f"{int(queue_id):08d}"
+
+def _worker_tag(worker_id):
+    """Worker ID as used in lease names ('.' separates the parts)."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', worker_id)
+
+def _lease_path(spool_dir, queue_id, worker_id):
+    return os.path.join(spool_dir, 'running', f"{_job_name(queue_id)}.{_worker_tag(worker_id)}{LEASE_SUFFIX}")
+
+def _ensure_dirs(spool_dir):
+    for name in STATUS_DIRS + (IDS_DIR, MANIFESTS_DIR):
+        os.makedirs(os.path.join(spool_dir, name), exist_ok=True)
+
+def _write_json(path, data):
+    """Write a file atomically; the temp name is never listed as a job."""
+    temp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex[:8]}.tmp")
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _list_jobs(directory):
+    """Job files of a status directory, oldest job first."""
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith('.json') and not name.startswith('.'))
+    except FileNotFoundError:
+        return []
+
+def _server_now(spool_dir):
+    """
+    Current time of the file server. NFS sets the mtime of a touched file on
+    the server, so leases are compared against one clock for all hosts.
+    """
+    clock_path = os.path.join(spool_dir, ".clock")
+    with open(clock_path, 'a'):
+        pass
+    os.utime(clock_path)
+    return os.stat(clock_path).st_mtime
+
+def _lease_alive(lease_path, now):
+    """True if the lease was renewed within its lease time."""
+    lease = _read_json(lease_path)
+    try:
+        renewed = os.stat(lease_path).st_mtime
+    except FileNotFoundError:
+        return False
+    return lease is not None and renewed + lease['lease_seconds'] >= now
+
+def _job_leases(running_dir, name):
+    try:
+        return [os.path.join(running_dir, entry) for entry in os.listdir(running_dir)
+                if entry.startswith(f"{name}.") and entry.endswith(LEASE_SUFFIX)]
+    except FileNotFoundError:
+        return []
+
+def enqueue_jobs(spool_dir, payloads, max_attempts):
+    """
+    Add jobs to a spool queue. IDs are reserved by creating ids/{id}
+    exclusively, so hosts queueing at the same time never share one.
+
+    Returns:
+        list: IDs of the queued jobs.
+    """
+    _ensure_dirs(spool_dir)
+    ids_dir = os.path.join(spool_dir, IDS_DIR)
+    next_id = len(os.listdir(ids_dir)) + 1
+    now = time.time()
+    ids = []
+    for payload in payloads:
+        while True:
+            try:
+                os.close(os.open(os.path.join(ids_dir, str(next_id)), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                next_id += 1
+        _write_json(os.path.join(spool_dir, 'queued', f"{_job_name(next_id)}.json"), {
+            'id': next_id, 'status': 'queued', 'payload': payload, 'attempts': 0, 'max_attempts': max_attempts,
+            'worker_id': None, 'lease_expires_at': None, 'heartbeat_at': None, 'manifest_path': None,
+            'output_path': None, 'error': None, 'created_at': now, 'updated_at': now
+        })
+        ids.append(next_id)
+        next_id += 1
+    return ids
+
+def _requeue_expired(spool_dir, now):
+    """
+    Give running jobs whose leases all expired back to the queue, or fail
+    them if they used up their attempts. The record is renamed away first,
+    so only one worker takes over each job.
+
+    Returns:
+        int: Number of requeued jobs.
+    """
+    running_dir = os.path.join(spool_dir, 'running')
+    requeued = 0
+    for entry in _list_jobs(running_dir):
+        name = entry[:-len('.json')]
+        record_path = os.path.join(running_dir, entry)
+        leases = _job_leases(running_dir, name)
+        if any(_lease_alive(lease, now) for lease in leases):
+            continue
+        if not leases:
+            # The owner's lease is gone but the record is still here (a
+            # takeover or completion was interrupted): wait one lease time
+            record = _read_json(record_path)
+            try:
+                if record is None or os.stat(record_path).st_mtime + record.get('lease_seconds', 0) >= now:
+                    continue
+            except FileNotFoundError:
+                continue
+
+        taken_path = os.path.join(running_dir, f".{name}.{uuid.uuid4().hex[:8]}.requeue")
+        try:
+            os.rename(record_path, taken_path)
+        except FileNotFoundError:
+            # Another worker took it over or its owner finished it
+            continue
+        # A heartbeat may have arrived since the check
+        if any(_lease_alive(lease, now) for lease in _job_leases(running_dir, name)):
+            os.rename(taken_path, record_path)
+            continue
+
+        for lease in leases:
+            try:
+                os.remove(lease)
+            except FileNotFoundError:
+                pass
+        record = _read_json(taken_path)
+        exhausted = record['attempts'] >= record['max_attempts']
+        record.update({
+            'status': 'failed' if exhausted else 'queued',
+            'worker_id': None, 'lease_expires_at': None, 'updated_at': time.time()
+        })
+        if exhausted:
+            record['error'] = "lease expired after last attempt"
+        _write_json(os.path.join(spool_dir, record['status'], entry), record)
+        os.remove(taken_path)
+        if not exhausted:
+            requeued += 1
+    return requeued
+
+def claim_job(spool_dir, worker_id, lease_seconds):
+    """
+    Claim the oldest queued job: the lease is written first, then the job
+    file is renamed from queued/ to running/. Only one rename can succeed.
+
+    Returns:
+        dict: The claimed job, or None if the queue is empty.
+    """
+    _ensure_dirs(spool_dir)
+    now = _server_now(spool_dir)
+    requeued = _requeue_expired(spool_dir, now)
+    if requeued:
+        print(f"♻️  Requeued {requeued} job(s) with expired leases")
+
+    for entry in _list_jobs(os.path.join(spool_dir, 'queued')):
+        queue_id = int(entry[:-len('.json')])
+        lease_path = _lease_path(spool_dir, queue_id, worker_id)
+        _write_json(lease_path, {'worker_id': worker_id, 'lease_seconds': lease_seconds})
+        record_path = os.path.join(spool_dir, 'running', entry)
+        try:
+            os.rename(os.path.join(spool_dir, 'queued', entry), record_path)
+        except (FileNotFoundError, FileExistsError):
+            # Another worker was faster
+            os.remove(lease_path)
+            continue
+
+        record = _read_json(record_path)
+        manifest = _read_json(os.path.join(spool_dir, MANIFESTS_DIR, entry)) or {}
+        record.update({
+            'status': 'running', 'worker_id': worker_id, 'attempts': record['attempts'] + 1,
+            'lease_seconds': lease_seconds, 'lease_expires_at': now + lease_seconds, 'heartbeat_at': now,
+            'manifest_path': manifest.get('manifest_path'), 'updated_at': time.time()
+        })
+        _write_json(record_path, record)
+        return record
+    return None
+
+def heartbeat(spool_dir, queue_id, worker_id, lease_seconds):
+    """
+    Renew the lease by touching it.
+
+    Returns:
+        bool: False if the lease was taken away (the job was requeued).
+    """
+    try:
+        os.utime(_lease_path(spool_dir, queue_id, worker_id))
+        return True
+    except FileNotFoundError:
+        return False
+
+def set_job_manifest(spool_dir, queue_id, manifest_path):
+    """Remember the manifest of a job for the worker that takes it over."""
+    _write_json(os.path.join(spool_dir, MANIFESTS_DIR, f"{_job_name(queue_id)}.json"),
+                {'manifest_path': manifest_path})
+
+def _take_record(spool_dir, queue_id, worker_id):
+    """
+    Move the running record of a job out of reach of takeovers, if this
+    worker still owns the job.
+
+    Returns:
+        tuple: (record, path it was moved to), or None if the job is not ours.
+    """
+    if not os.path.exists(_lease_path(spool_dir, queue_id, worker_id)):
+        return None
+    running_dir = os.path.join(spool_dir, 'running')
+    record_path = os.path.join(running_dir, f"{_job_name(queue_id)}.json")
+    taken_path = os.path.join(running_dir, f".{_job_name(queue_id)}.{uuid.uuid4().hex[:8]}.taken")
+    try:
+        os.rename(record_path, taken_path)
+    except FileNotFoundError:
+        return None
+    record = _read_json(taken_path)
+    if record is None or record.get('worker_id') != worker_id:
+        os.rename(taken_path, record_path)
+        return None
+    return record, taken_path
+
+def _finish(spool_dir, queue_id, worker_id, record, taken_path):
+    """Write the record to its status directory and drop the claim."""
+    record.update({'lease_expires_at': None, 'updated_at': time.time()})
+    _write_json(os.path.join(spool_dir, record['status'], f"{_job_name(queue_id)}.json"), record)
+    os.remove(taken_path)
+    try:
+        os.remove(_lease_path(spool_dir, queue_id, worker_id))
+    except FileNotFoundError:
+        pass
+
+def complete_job(spool_dir, queue_id, worker_id, output_path=None):
+    """Mark a job as done (nothing happens if the worker lost it)."""
+    taken = _take_record(spool_dir, queue_id, worker_id)
+    if taken is None:
+        return
+    record, taken_path = taken
+    record.update({'status': 'done', 'output_path': output_path, 'error': None})
+    _finish(spool_dir, queue_id, worker_id, record, taken_path)
+
+def fail_job(spool_dir, queue_id, worker_id, error):
+    """
+    Record a failed attempt.
+
+    Returns:
+        str: The new status ('queued' or 'failed'), or None if the worker lost the job.
+    """
+    taken = _take_record(spool_dir, queue_id, worker_id)
+    if taken is None:
+        return None
+    record, taken_path = taken
+    record.update({'status': 'queued' if record['attempts'] < record['max_attempts'] else 'failed',
+                   'error': error, 'worker_id': None})
+    _finish(spool_dir, queue_id, worker_id, record, taken_path)
+    return record['status']
+
+def get_queue_stats(spool_dir):
+    """
+    Count the jobs per status.
+
+    Returns:
+        dict: Mapping of status to number of jobs.
+    """
+    stats = {}
+    for status in STATUS_DIRS:
+        count = len(_list_jobs(os.path.join(spool_dir, status)))
+        if count:
+            stats[status] = count
+    return stats
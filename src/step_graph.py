@@ -0,0 +1,98 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+class PipelineStep:
+    """
+    One node of the per-video step graph.
+
+    Args:
+        name (str): Name of the step for logging.
+        function (callable): Takes the job dict and returns the step output,
+                             or None/False if the step failed.
+        requires (list): Job keys that must exist before the step can start.
+        provides (str): Job key the step output is stored under.
+        optional (bool): If True, a failure is reported but does not stop the graph.
+    """
+
+    def __init__(self, name, function, requires=(), provides=None, optional=False):
+        self.name = name
+        self.function = function
+        self.requires = list(requires)
+        self.provides = provides
+        self.optional = optional
+
+def _missing_inputs(steps, job):
+    """
+    Find steps whose inputs can never be produced.
+
+    Returns:
+        list: Names of steps with a requirement that is neither in the job
+              nor provided by another step.
+    """
+    provided = set(job.keys()) | {step.provides for step in steps if step.provides}
+    return [step.name for step in steps if any(key not in provided for key in step.requires)]
+
+def run_step_graph(steps, job, run_step=None):
+    """
+    Runs the steps as a dependency graph, starting each step as soon as all
+    of its required job keys exist. Independent steps run in parallel threads.
+
+    Args:
+        steps (list): PipelineStep objects. Order only matters for display.
+        job (dict): The job dict. Step outputs are written into it.
+        run_step (callable): Optional wrapper called as run_step(name, function, job),
+                             e.g. main.run_pipeline_step for logging and timing.
+
+    Returns:
+        dict: The updated job, or None if a required step failed.
+    """
+    unresolvable = _missing_inputs(steps, job)
+    if unresolvable:
+        print(f"❌ Step graph has unsatisfiable inputs: {', '.join(unresolvable)}")
+        return None
+
+    if run_step is None:
+        run_step = lambda name, function, job: function(job)
+
+    pending = list(steps)
+    running = {}
+    failed = False
+
+    with ThreadPoolExecutor(max_workers=max(1, len(steps))) as executor:
+        while pending or running:
+            if not failed:
+                # Start everything whose inputs are available
+                ready = [step for step in pending if all(key in job for key in step.requires)]
+                for step in ready:
+                    pending.remove(step)
+                    # Copy the caller's context so trace tags follow the step into its thread
+                    context = contextvars.copy_context()
+                    running[executor.submit(context.run, run_step, step.name, step.function, job)] = step
+
+            if not running:
+                # Nothing left that can start (a required step failed upstream)
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Failed: {step.name}")
+                    print(f"   Error: {str(e)}")
+                    result = None
+
+                if result is None or result is False:
+                    if step.optional:
+                        print(f"⚠️  Warning: Optional step '{step.name}' failed, but continuing...")
+                        continue
+                    failed = True
+                    continue
+
+                if step.provides:
+                    job[step.provides] = result
+
+    if failed or pending:
+        return None
+    return job
@@ -0,0 +1,256 @@
+import os
+import json
+import importlib.util
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+from tracing import trace_span
+
+# Capabilities of every FFmpeg build seen on this host, keyed by executable.
+# An entry is reused while the executable's size and modification time match.
+TOOLCHAIN_CACHE_PATH = os.path.join(tempfile.gettempdir(), "reels-automator-toolchain.json")
+CACHE_VERSION = 1
+
+# Directory with ffmpeg/ffprobe to use instead of the ones found on PATH
+FFMPEG_DIR_ENV = "REELS_FFMPEG_DIR"
+
+# Install locations checked when FFmpeg is not on PATH
+_local_app_data = os.environ.get('LOCALAPPDATA')
+COMMON_DIRS = ([
+    # WinGet installation path
+    os.path.join(_local_app_data, 'Microsoft', 'WinGet', 'Links'),
+    os.path.join(_local_app_data, 'Microsoft', 'WinGet', 'Packages', 'Gyan.FFmpeg_Microsoft.Winget.Source_8wekyb3d8bbwe', 'ffmpeg-7.1.1-full_build', 'bin'),
+] if _local_app_data else []) + [
+    # Program Files locations
+    r'C:\Program Files\ffmpeg\bin',
+    r'C:\Program Files (x86)\ffmpeg\bin',
+    r'C:\ffmpeg\bin',
+    # Homebrew, manual installs, distribution packages, snaps
+    '/opt/homebrew/bin',
+    '/usr/local/bin',
+    '/usr/bin',
+    '/snap/bin',
+]
+
+# Caption fonts for the drawtext fallback, in order of preference
+FONT_CANDIDATES = [
+    r'C:\Windows\Fonts\arial.ttf',
+    '/System/Library/Fonts/Supplemental/Arial.ttf',
+    '/Library/Fonts/Arial.ttf',
+    '/usr/share/fonts/truetype/msttcorefonts/Arial.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+]
+
+# Ways to burn in captions, in order of preference
+CAPTION_ENGINES = ['ass', 'drawtext', 'sprites']
+
+_toolchain = None
+_toolchain_lock = threading.Lock()
+
+class Toolchain:
+    """
+    The FFmpeg executables of this host and what their build supports.
+
+    Attributes:
+        ffmpeg (str): FFmpeg executable.
+        ffprobe (str): FFprobe executable.
+        version (str): First line of `ffmpeg -version`.
+        encoders (set): Names of the available encoders.
+        filters (set): Names of the available filters.
+        font_file (str): Font for drawtext captions, or None.
+    """
+
+    def __init__(self, ffmpeg, ffprobe, version, encoders, filters, font_file=None):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.version = version
+        self.encoders = set(encoders)
+        self.filters = set(filters)
+        self.font_file = font_file
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def caption_engine(self):
+        """
+        Pick how captions are burned in: 'ass' (one libass filter for all
+        captions), 'drawtext' (one filter per caption, needs a font file),
+        'sprites' (captions rasterized with Pillow and overlaid as an image
+        sequence) or None if none of them is available.
+        """
+        for engine in CAPTION_ENGINES:
+            if self.supports_caption_engine(engine):
+                return engine
+        return None
+
+    def supports_caption_engine(self, engine):
+        """True if captions can be burned in with this engine."""
+        if engine == 'ass':
+            return self.has_filter('ass')
+        if engine == 'drawtext':
+            return self.has_filter('drawtext') and bool(self.font_file)
+        if engine == 'sprites':
+            # Pillow is checked on every call: it can be installed at any time
+            return self.has_filter('overlay') and importlib.util.find_spec("PIL") is not None
+        return False
+
+    def describe(self):
+        """Summary for logs and the render service's /health."""
+        return {
+            'ffmpeg': self.ffmpeg,
+            'version': self.version,
+            'libx264': self.has_encoder('libx264'),
+            'captions': self.caption_engine(),
+            'font_file': self.font_file
+        }
+
+def find_font_file():
+    """Find a TrueType font for drawtext captions, or None."""
+    for font_file in FONT_CANDIDATES:
+        if os.path.exists(font_file):
+            return font_file
+    return None
+
+def locate_executables():
+    """
+    Find ffmpeg and ffprobe without running them: in $REELS_FFMPEG_DIR,
+    then on PATH, then in the common install locations.
+
+    Returns:
+        tuple: (ffmpeg_path, ffprobe_path) or (None, None) if not found.
+    """
+    # None searches PATH
+    search_dirs = [None] + COMMON_DIRS
+    if os.environ.get(FFMPEG_DIR_ENV):
+        search_dirs.insert(0, os.environ[FFMPEG_DIR_ENV])
+    for directory in search_dirs:
+        ffmpeg = shutil.which('ffmpeg', path=directory)
+        ffprobe = shutil.which('ffprobe', path=directory)
+        if ffmpeg and ffprobe:
+            return os.path.abspath(ffmpeg), os.path.abspath(ffprobe)
+    return None, None
+
+def _parse_names(output, marker=None, io_column=False):
+    """
+    Read the names from `ffmpeg -encoders` / `ffmpeg -filters` output: the
+    second column of the lines after the marker line, or of the lines
+    whose third column is an input->output description.
+    """
+    names = set()
+    started = marker is None
+    for line in output.splitlines():
+        parts = line.split()
+        if not started:
+            started = bool(parts) and parts[0] == marker
+            continue
+        if len(parts) >= 3 and (not io_column or '->' in parts[2]):
+            names.add(parts[1])
+    return names
+
+def probe_toolchain(ffmpeg, ffprobe):
+    """
+    Ask an FFmpeg build for its version, encoders and filters.
+
+    Returns:
+        Toolchain: The probed toolchain, or None if ffmpeg does not run.
+    """
+    def run(*args):
+        return subprocess.run([ffmpeg, "-hide_banner", *args], capture_output=True, text=True, check=True).stdout
+
+    try:
+        with trace_span("ffmpeg probe", "ffmpeg", ffmpeg=ffmpeg):
+            version = run("-version").splitlines()[0]
+            encoders = _parse_names(run("-encoders"), marker="------")
+            filters = _parse_names(run("-filters"), io_column=True)
+    except (OSError, subprocess.CalledProcessError, IndexError) as e:
+        print(f"Error probing FFmpeg at {ffmpeg}: {e}")
+        return None
+    return Toolchain(ffmpeg, ffprobe, version, encoders, filters, find_font_file())
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _load_cache():
+    try:
+        with open(TOOLCHAIN_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if cache.get('version') == CACHE_VERSION else {'version': CACHE_VERSION}
+    except (OSError, ValueError):
+        return {'version': CACHE_VERSION}
+
+def _save_cache(cache):
+    try:
+        temp_path = f"{TOOLCHAIN_CACHE_PATH}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, TOOLCHAIN_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not save the FFmpeg capabilities: {e}")
+
+def get_toolchain():
+    """
+    Get the FFmpeg toolchain of this host. The first call in a process
+    locates the executables (no process is spawned) and reads their
+    capabilities from the on-disk cache; FFmpeg is only run to probe a
+    build that has not been seen before or has changed.
+
+    Returns:
+        Toolchain: The toolchain, or None if FFmpeg is not installed.
+    """
+    global _toolchain
+
+    with _toolchain_lock:
+        if _toolchain:
+            return _toolchain
+
+        ffmpeg, ffprobe = locate_executables()
+        if not ffmpeg:
+            return None
+
+        cache = _load_cache()
+        entry = cache.get('toolchains', {}).get(ffmpeg)
+        try:
+            fingerprint = [_fingerprint(ffmpeg), _fingerprint(ffprobe)]
+        except OSError:
+            return None
+
+        if entry and entry['fingerprint'] == fingerprint:
+            # Fonts can be installed or removed without touching FFmpeg
+            font_file = entry['font_file'] if entry['font_file'] and os.path.exists(entry['font_file']) else find_font_file()
+            toolchain = Toolchain(ffmpeg, ffprobe, entry['version'], entry['encoders'], entry['filters'], font_file)
+        else:
+            toolchain = probe_toolchain(ffmpeg, ffprobe)
+            if not toolchain:
+                return None
+            cache.setdefault('toolchains', {})[ffmpeg] = {
+                'fingerprint': fingerprint,
+                'ffprobe': ffprobe,
+                'version': toolchain.version,
+                'encoders': sorted(toolchain.encoders),
+                'filters': sorted(toolchain.filters),
+                'font_file': toolchain.font_file
+            }
+            _save_cache(cache)
+
+        _toolchain = toolchain
+        return toolchain
+
+def find_ffmpeg_path():
+    """
+    Find the FFmpeg/ffprobe executables.
+
+    Returns:
+        tuple: (ffmpeg_path, ffprobe_path) or (None, None) if not found
+    """
+    toolchain = get_toolchain()
+    if not toolchain:
+        return None, None
+    return toolchain.ffmpeg, toolchain.ffprobe
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import shutil
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Directory with per-process event files. Set through the environment so that
+# worker processes (fork or spawn) pick it up automatically.
+TRACE_DIR_ENV = "REELS_TRACE_DIR"
+
+_trace_context = contextvars.ContextVar("trace_context", default={})
+_lock = threading.Lock()
+_event_file = None
+_event_file_pid = None
+_named_threads = set()
+
+def _reset_after_fork():
+    """
+    Give a forked child its own lock and part file. Another thread of the
+    parent may have held the lock at the fork, and the child would wait for
+    it forever on its first event.
+    """
+    global _lock, _event_file, _event_file_pid, _named_threads
+    _lock = threading.Lock()
+    # The parent's file object is dropped, not closed: its buffer is the parent's
+    _event_file = None
+    _event_file_pid = None
+    _named_threads = set()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def is_tracing_enabled():
+    """Check whether trace events are being recorded in this process."""
+    return bool(os.environ.get(TRACE_DIR_ENV))
+
+def enable_tracing(output_path):
+    """
+    Start recording Chrome trace events for this process and its workers.
+
+    Args:
+        output_path (str): Path of the trace JSON written by finalize_trace().
+    """
+    parts_dir = os.path.abspath(output_path) + ".parts"
+    if os.path.exists(parts_dir):
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir, exist_ok=True)
+    os.environ[TRACE_DIR_ENV] = parts_dir
+
+def set_trace_context(**tags):
+    """
+    Tag all events of the current thread/context, e.g. set_trace_context(video=3).
+    Steps started by the step graph inherit the tags of the thread that started them.
+    """
+    context = dict(_trace_context.get())
+    context.update(tags)
+    _trace_context.set(context)
+
+def _write_event(event):
+    """Append one event to this process's part file."""
+    global _event_file, _event_file_pid
+
+    parts_dir = os.environ.get(TRACE_DIR_ENV)
+    if not parts_dir:
+        return
+
+    with _lock:
+        pid = os.getpid()
+        if _event_file is None or _event_file_pid != pid:
+            # First event in this process (or a forked child)
+            _event_file = open(os.path.join(parts_dir, f"{pid}.jsonl"), "a", encoding="utf-8")
+            _event_file_pid = pid
+            _named_threads.clear()
+            _event_file.write(json.dumps({
+                "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                "args": {"name": f"reels-automator ({pid})"}
+            }) + "\n")
+
+        thread = threading.current_thread()
+        if thread.ident not in _named_threads:
+            _named_threads.add(thread.ident)
+            _event_file.write(json.dumps({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": thread.ident,
+                "args": {"name": thread.name}
+            }) + "\n")
+
+        _event_file.write(json.dumps(event) + "\n")
+        _event_file.flush()
+
+@contextmanager
+def trace_span(name, category="pipeline", **args):
+    """
+    Record the wrapped block as a complete ("X") trace event.
+
+    Args:
+        name (str): Event name shown in the trace viewer.
+        category (str): Event category (step, ffmpeg, tts, browser, cache, ...).
+        **args: Extra values shown with the event. The block can add more
+                by updating the yielded dict.
+    """
+    if not is_tracing_enabled():
+        yield {}
+        return
+
+    event_args = dict(_trace_context.get())
+    event_args["worker"] = threading.current_thread().name
+    event_args.update(args)
+    start = time.time()
+    try:
+        yield event_args
+    except BaseException as e:
+        event_args["error"] = str(e)
+        raise
+    finally:
+        end = time.time()
+        _write_event({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": int(start * 1_000_000),
+            "dur": int((end - start) * 1_000_000),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": event_args
+        })
+
+def finalize_trace(output_path):
+    """
+    Merge the event files of all processes into one Chrome/Perfetto trace JSON.
+
+    Args:
+        output_path (str): Path of the trace JSON to write.
+
+    Returns:
+        int: Number of events written, or None if tracing was not enabled.
+    """
+    global _event_file
+
+    parts_dir = os.environ.get(TRACE_DIR_ENV)
+    if not parts_dir or not os.path.exists(parts_dir):
+        return None
+
+    with _lock:
+        if _event_file is not None:
+            _event_file.close()
+            _event_file = None
+
+    events = []
+    for filename in sorted(os.listdir(parts_dir)):
+        with open(os.path.join(parts_dir, filename), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Partial line from a killed worker
+                    continue
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    del os.environ[TRACE_DIR_ENV]
+    return len(events)
@@ -1,9 +1,11 @@
 # Alternative TTS Services Configuration
 
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import shutil
+from api_clients import get_openai_client
+from environment import load_environment
+from tracing import trace_span
+from scratch_workspace import ScratchWorkspace
 
 def get_available_tts_service():
     """
@@ -12,6 +14,7 @@ def get_available_tts_service():
     Returns:
         str: 'elevenlabs', 'openai', or 'offline'
     """
+    load_environment()
     elevenlabs_key = os.environ.get("ELEVENLABS_API_KEY")
     openai_key = os.environ.get("OPENAI_API_KEY")
     
@@ -35,17 +38,16 @@ def generate_tts_openai(text, output_path):
         bool: True if successful, False otherwise
     """
     try:
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        client = get_openai_client(os.environ.get("OPENAI_API_KEY"))
         
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",  # Available voices: alloy, echo, fable, onyx, nova, shimmer
-            input=text
-        )
-        
-        response.stream_to_file(output_path)
+        with trace_span("OpenAI audio.speech", "tts", characters=len(text)):
+            response = client.audio.speech.create(
+                model="tts-1",
+                voice="alloy",  # Available voices: alloy, echo, fable, onyx, nova, shimmer
+                input=text
+            )
+            
+            response.stream_to_file(output_path)
         return True
         
     except Exception as e:
@@ -79,25 +81,27 @@ def generate_tts_offline(text, output_path):
             sample = math.sin(2 * math.pi * frequency * i / sample_rate)
             frames.append(struct.pack('<h', int(sample * 32767)))
         
-        # Write WAV file
-        with wave.open(output_path.replace('.mp3', '.wav'), 'wb') as wav_file:
-            wav_file.setnchannels(1)  # Mono
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(sample_rate)
-            wav_file.writeframes(b''.join(frames))
-        
-        # Convert to MP3 if ffmpeg is available
-        from . import compose_video
-        ffmpeg_path, _ = compose_video.find_ffmpeg_path()
-        if ffmpeg_path:
-            import subprocess
-            subprocess.run([
-                ffmpeg_path, "-y", "-i", output_path.replace('.mp3', '.wav'),
-                "-c:a", "mp3", "-b:a", "128k", output_path
-            ], capture_output=True)
-            # Clean up WAV file
-            if os.path.exists(output_path.replace('.mp3', '.wav')):
-                os.remove(output_path.replace('.mp3', '.wav'))
+        # Write WAV file in the scratch workspace (deleted with it)
+        with ScratchWorkspace("offline-tts") as workspace:
+            wav_path = workspace.path("tone.wav", len(frames) * 2 + 44)
+            with wave.open(wav_path, 'wb') as wav_file:
+                wav_file.setnchannels(1)  # Mono
+                wav_file.setsampwidth(2)  # 16-bit
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(b''.join(frames))
+            
+            # Convert to MP3 if ffmpeg is available
+            from toolchain import find_ffmpeg_path
+            ffmpeg_path, _ = find_ffmpeg_path()
+            if ffmpeg_path:
+                import subprocess
+                subprocess.run([
+                    ffmpeg_path, "-y", "-i", wav_path,
+                    "-c:a", "mp3", "-b:a", "128k", output_path
+                ], capture_output=True)
+            else:
+                # Keep the WAV next to the output if it cannot be converted
+                shutil.move(wav_path, output_path.replace('.mp3', '.wav'))
         
         return True
         
@@ -0,0 +1,69 @@
+import os
+import json
+import uuid
+
+# Word timings returned by the TTS provider together with the audio, stored
+# next to the voiceover as {job_id}.alignment.json
+ALIGNMENT_SUFFIX = ".alignment.json"
+
+def get_alignment_path(voice_path):
+    """Alignment file belonging to a voiceover."""
+    return os.path.splitext(voice_path)[0] + ALIGNMENT_SUFFIX
+
+def words_from_characters(characters, starts, ends):
+    """
+    Group a character alignment (one start/end time per character, as
+    returned by ElevenLabs with timestamps) into words split on whitespace.
+
+    Returns:
+        list: {'word', 'start', 'end'} dicts in spoken order.
+    """
+    words = []
+    current = None
+    for char, start, end in zip(characters, starts, ends):
+        if char.isspace():
+            if current:
+                words.append(current)
+            current = None
+            continue
+        if current is None:
+            current = {'word': char, 'start': start, 'end': end}
+        else:
+            current['word'] += char
+            current['end'] = end
+    if current:
+        words.append(current)
+    return words
+
+def save_alignment(alignment_path, words, source):
+    """
+    Write word timings as JSON (atomically, other processes may read it).
+
+    Args:
+        alignment_path (str): File to write.
+        words (list): {'word', 'start', 'end'} dicts.
+        source (str): Where the timings come from, e.g. 'elevenlabs'.
+    """
+    temp_path = f"{alignment_path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'source': source, 'words': words}, f, ensure_ascii=False)
+    os.replace(temp_path, alignment_path)
+
+def load_alignment(voice_path):
+    """
+    Get the word timings stored next to a voiceover.
+
+    Returns:
+        list: {'word', 'start', 'end'} dicts, or None if the voiceover has no
+              alignment (its provider returned no timestamps).
+    """
+    alignment_path = get_alignment_path(voice_path)
+    if not os.path.exists(alignment_path):
+        return None
+    try:
+        with open(alignment_path, 'r', encoding='utf-8') as f:
+            words = json.load(f).get('words')
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not read {alignment_path}: {e}")
+        return None
+    return words or None
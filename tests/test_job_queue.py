@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import multiprocessing
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from job_queue import enqueue_jobs, claim_job, heartbeat, complete_job, fail_job, get_queue_stats, set_job_manifest
+
+@pytest.fixture(params=["sqlite", "spool"])
+def queue_path(request, tmp_path):
+    """A SQLite queue and a spool directory queue, for every test."""
+    if request.param == "sqlite":
+        return str(tmp_path / "queue.db")
+    return str(tmp_path / "spool") + os.sep
+
+def _worker(queue_path, worker_id, claimed):
+    """Claim and complete jobs until the queue is empty."""
+    while True:
+        job = claim_job(queue_path, worker_id, 60)
+        if job is None:
+            return
+        claimed.put((job['id'], worker_id))
+        assert heartbeat(queue_path, job['id'], worker_id, 60)
+        complete_job(queue_path, job['id'], worker_id, f"exports/{job['id']}.mp4")
+
+def test_workers_claim_each_job_once(queue_path):
+    ids = enqueue_jobs(queue_path, [{'video': i} for i in range(20)])
+    claimed = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_worker, args=(queue_path, f"host-{i}", claimed)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    claims = [claimed.get(timeout=5) for _ in ids]
+    assert claimed.empty()
+    assert sorted(queue_id for queue_id, _ in claims) == sorted(ids)
+    assert get_queue_stats(queue_path) == {'done': len(ids)}
+
+def test_expired_lease_is_requeued(queue_path):
+    [queue_id] = enqueue_jobs(queue_path, [{'video': 1}])
+    first = claim_job(queue_path, "host-a", 0.5)
+    assert first['id'] == queue_id and first['attempts'] == 1
+    set_job_manifest(queue_path, queue_id, "jobs/manifest.json")
+
+    # Still leased: nothing to claim
+    assert claim_job(queue_path, "host-b", 60) is None
+
+    time.sleep(1.5)
+    second = claim_job(queue_path, "host-b", 60)
+    assert second['id'] == queue_id
+    assert second['attempts'] == 2
+    assert second['manifest_path'] == "jobs/manifest.json"
+
+    # The stale worker lost the job and cannot finish it
+    assert heartbeat(queue_path, queue_id, "host-a", 60) is False
+    assert fail_job(queue_path, queue_id, "host-a", "stale") is None
+    complete_job(queue_path, queue_id, "host-a")
+    assert get_queue_stats(queue_path) == {'running': 1}
+
+    assert heartbeat(queue_path, queue_id, "host-b", 60) is True
+    complete_job(queue_path, queue_id, "host-b")
+    assert get_queue_stats(queue_path) == {'done': 1}
+
+def test_failed_job_is_retried_until_attempts_are_used(queue_path):
+    [queue_id] = enqueue_jobs(queue_path, [{'video': 1}], max_attempts=2)
+    claim_job(queue_path, "host-a", 60)
+    assert fail_job(queue_path, queue_id, "host-a", "encode failed") == 'queued'
+
+    job = claim_job(queue_path, "host-b", 0.5)
+    assert job['attempts'] == 2
+    time.sleep(1.5)
+    # The last attempt's lease expired: failed for good
+    assert claim_job(queue_path, "host-c", 60) is None
+    assert get_queue_stats(queue_path) == {'failed': 1}